@@ -2,10 +2,16 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from backtester import Backtester
+import contextlib
+import json
+import os
+import time
+import compute
+import pipeline
+import profiling
+import report
+import service
 import utils
-from strategies import sma_crossover, rsi_meanrev, market_mood
 
 # Page configuration
 st.set_page_config(
@@ -93,105 +99,125 @@ with st.sidebar:
     if "Market Mood Detector" in selected_strategies:
         pair_asset = st.selectbox("Pair Asset (for Market Mood)", asset_options, index=2)
 
+    profile_run = st.checkbox("⏱️ Profile this run",
+                              help="Time every pipeline stage that runs; cached stages are skipped")
+
+# Cache every pipeline stage (downloads, indicators, positions, backtests) across
+# reruns and sessions; entries are evicted LRU past max_entries or after the TTL
+pipeline.use_cache(st.cache_data(max_entries=256, ttl=3600, show_spinner=False))
+
+
+# one background renderer shared by every session: matplotlib isn't thread-safe,
+# and its pooled figures are reused instead of piling up on each rerun
+@st.cache_resource
+def renderer():
+    return report.Renderer()
+
+
+# charts are cached as PNG bytes, so a rerun with unchanged results draws nothing
+@st.cache_data(max_entries=64, show_spinner=False)
+def equity_png(equity, name):
+    return renderer().equity(equity, name).result()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def comparison_png(results):
+    return renderer().comparison(results).result()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def report_page(results, metrics):
+    return report.html_report(results, metrics, renderer())
+
+
+# backtests run in this process by default, through the cached pipeline above, so a
+# slider change only recomputes the stages it affects. With QUANT_GYM_SERVICE_URL set
+# they are queued on that running `python service.py` instead: for deployments where
+# heavy runs shouldn't block the script thread, at the cost of IPC on every rerun
+SERVICE_URL = os.environ.get('QUANT_GYM_SERVICE_URL')
+
+
+@st.cache_resource
+def backtest_service():
+    return service.ServiceClient(SERVICE_URL)
+
+
+# pipeline strategy name -> compute.py / service name
+SERVICE_NAMES = {name: key for key, (name, _, _) in compute.STRATEGIES.items()}
+
+
+def service_results(runs):
+    """{name: (equity, metrics)} once the service has finished ``runs``; until then
+    shows the job's progress and reruns the script, returning None if it's cancelled or fails."""
+    svc = backtest_service()
+    specs = [service.spec(SERVICE_NAMES[name], symbols, start_date, end_date, params, initial_capital,
+                          commission/100) for name, (symbols, params) in runs.items()]
+    request = json.dumps(specs)
+    try:
+        if st.session_state.get('job_request') != request:
+            raise LookupError(request)
+        status = svc.status(st.session_state['job'])
+    except LookupError:
+        # new parameters, or a job the service has since forgotten
+        st.session_state['job'] = svc.submit(specs)
+        st.session_state['job_request'] = request
+        status = svc.status(st.session_state['job'])
+    job = st.session_state['job']
+
+    if status['status'] in service.ACTIVE:
+        st.progress(status['done'] / status['total'],
+                    text=f"Running backtests... {status['done']}/{status['total']} done")
+        if st.button("✖️ Cancel"):
+            svc.cancel(job)
+        else:
+            time.sleep(0.5)
+        st.rerun()
+    if status['status'] != 'done':
+        st.session_state['run_backtest'] = False
+        st.session_state.pop('job_request', None)
+        st.warning(f"Backtest {status['status']}" + (f": {status['error']}" if status['error'] else ""))
+        return None
+    return dict(zip(runs, svc.result(job)))
+
 # Run strategies button
 if st.sidebar.button("🚀 Run Backtest", type="primary"):
+    # keep showing (cached) results as parameters change after the first run
+    st.session_state['run_backtest'] = True
+
+if st.session_state.get('run_backtest'):
     results = {}
     metrics_data = {}
     
-    # Create tabs for results
-    tab1, tab2, tab3 = st.tabs(["📊 Performance", "📈 Equity Curves", "📋 Detailed Results"])
+    # (symbols, params) for each selected strategy, see pipeline.positions
+    runs = {}
+    if "SMA Crossover" in selected_strategies:
+        runs["SMA Crossover"] = ((selected_asset,), (sma_short, sma_long))
+    if "RSI Mean Reversion" in selected_strategies:
+        runs["RSI Mean Reversion"] = ((selected_asset,), (rsi_oversold, rsi_overbought, rsi_period))
+    if "Market Mood Detector" in selected_strategies:
+        runs["Market Mood Detector"] = ((selected_asset, pair_asset), (mm_window, mm_entry, mm_exit))
     
-    with st.spinner("Running backtests..."):
-        # Run selected strategies
-        if "SMA Crossover" in selected_strategies:
-            with st.expander("SMA Crossover Results", expanded=True):
-                df = utils.download_data(selected_asset, start=start_date, end=end_date)
-                price = df['close']
-                
-                # Generate signals with custom parameters
-                def sma_strategy(p):
-                    return sma_crossover.generate_signals(p, short_window=sma_short, long_window=sma_long)
-                
-                signals = sma_strategy(price)
-                bt = Backtester(price, cash=initial_capital, commission=commission/100)
-                equity = bt.run_signals(signals)
-                results['SMA Crossover'] = equity
-                metrics = Backtester.performance_metrics(equity)
-                metrics_data['SMA Crossover'] = metrics
-                
-                # Display metrics
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    st.metric("Total Return", f"{metrics['total_return']:.2%}")
-                with col2:
-                    st.metric("Annual Return", f"{metrics['ann_return']:.2%}")
-                with col3:
-                    st.metric("Sharpe Ratio", f"{metrics['sharpe']:.2f}")
-                with col4:
-                    st.metric("Max Drawdown", f"{metrics['max_drawdown']:.2%}")
-                
-                # Plot
-                fig, ax = plt.subplots(figsize=(10, 4))
-                equity.plot(ax=ax)
-                ax.set_title("SMA Crossover Equity Curve")
-                ax.set_ylabel("Equity ($)")
-                ax.grid(True, alpha=0.3)
-                st.pyplot(fig)
-        
-        if "RSI Mean Reversion" in selected_strategies:
-            with st.expander("RSI Mean Reversion Results", expanded=True):
-                df = utils.download_data(selected_asset, start=start_date, end=end_date)
-                price = df['close']
-                
-                # Generate signals with custom parameters
-                def rsi_strategy(p):
-                    return rsi_meanrev.generate_signals(p, low=rsi_oversold, high=rsi_overbought, period=rsi_period)
-                
-                signals = rsi_strategy(price)
-                bt = Backtester(price, cash=initial_capital, commission=commission/100)
-                equity = bt.run_signals(signals)
-                results['RSI Mean Reversion'] = equity
-                metrics = Backtester.performance_metrics(equity)
-                metrics_data['RSI Mean Reversion'] = metrics
-                
-                # Display metrics
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    st.metric("Total Return", f"{metrics['total_return']:.2%}")
-                with col2:
-                    st.metric("Annual Return", f"{metrics['ann_return']:.2%}")
-                with col3:
-                    st.metric("Sharpe Ratio", f"{metrics['sharpe']:.2f}")
-                with col4:
-                    st.metric("Max Drawdown", f"{metrics['max_drawdown']:.2%}")
-                
-                # Plot
-                fig, ax = plt.subplots(figsize=(10, 4))
-                equity.plot(ax=ax)
-                ax.set_title("RSI Mean Reversion Equity Curve")
-                ax.set_ylabel("Equity ($)")
-                ax.grid(True, alpha=0.3)
-                st.pyplot(fig)
+    if SERVICE_URL and not profile_run:
+        outputs = service_results(runs)
+    else:
+        # profiled runs stay in this process, where the stage timings are recorded
+        with st.spinner("Running backtests..."), \
+                (profiling.profile() if profile_run else contextlib.nullcontext()) as stage_profile:
+            # download the primary and pair assets concurrently; the pipeline stages then read the price cache
+            utils.download_many({s for symbols, _ in runs.values() for s in symbols}, start=start_date, end=end_date)
+            outputs = {name: pipeline.backtest(name, symbols, start_date, end_date, params,
+                                               initial_capital, commission/100)
+                       for name, (symbols, params) in runs.items()}
+
+    if outputs is not None:
+        # Create tabs for results
+        tab1, tab2, tab3, *profile_tab = st.tabs(["📊 Performance", "📈 Equity Curves", "📋 Detailed Results"]
+                                                 + (["⏱️ Profiling"] if profile_run else []))
         
-        if "Market Mood Detector" in selected_strategies:
-            with st.expander("Market Mood Detector Results", expanded=True):
-                a = utils.download_data(selected_asset, start=start_date, end=end_date)
-                b = utils.download_data(pair_asset, start=start_date, end=end_date)
-                price_a = a['close']
-                price_b = b['close']
-                
-                # Generate signals with custom parameters
-                dfpos = market_mood.generate_pairs_signals(price_a, price_b, window=mm_window, entry_z=mm_entry, exit_z=mm_exit)
-                
-                # Calculate equity
-                notional = initial_capital / 2
-                eq_a = (notional * (price_a.reindex(dfpos.index) / price_a.reindex(dfpos.index).iloc[0]) * dfpos['pos_a'])
-                eq_b = (notional * (price_b.reindex(dfpos.index) / price_b.reindex(dfpos.index).iloc[0]) * dfpos['pos_b'])
-                combined = eq_a.fillna(0) + eq_b.fillna(0)
-                combined.index = dfpos.index
-                results['Market Mood Detector'] = combined
-                metrics = Backtester.performance_metrics(combined)
-                metrics_data['Market Mood Detector'] = metrics
+        for name, (equity, metrics) in outputs.items():
+            with st.expander(f"{name} Results", expanded=True):
+                results[name] = equity
+                metrics_data[name] = metrics
                 
                 # Display metrics
                 col1, col2, col3, col4 = st.columns(4)
@@ -204,13 +230,8 @@ if st.sidebar.button("🚀 Run Backtest", type="primary"):
                 with col4:
                     st.metric("Max Drawdown", f"{metrics['max_drawdown']:.2%}")
                 
-                # Plot
-                fig, ax = plt.subplots(figsize=(10, 4))
-                combined.plot(ax=ax)
-                ax.set_title("Market Mood Detector Equity Curve")
-                ax.set_ylabel("Equity ($)")
-                ax.grid(True, alpha=0.3)
-                st.pyplot(fig)
+                # Plot (drawn once, shown again in the Equity Curves tab)
+                st.image(equity_png(equity, name))
         
         # Comparison tab
         with tab1:
@@ -218,16 +239,7 @@ if st.sidebar.button("🚀 Run Backtest", type="primary"):
             
             if len(results) > 1:
                 # Normalized comparison
-                fig, ax = plt.subplots(figsize=(12, 6))
-                for name, equity in results.items():
-                    normalized = equity / equity.iloc[0]
-                    normalized.plot(ax=ax, label=name, linewidth=2)
-                
-                ax.legend()
-                ax.set_title("Normalized Equity Curve Comparison")
-                ax.set_ylabel("Normalized Equity")
-                ax.grid(True, alpha=0.3)
-                st.pyplot(fig)
+                st.image(comparison_png(results))
             
             # Metrics comparison table
             st.subheader("Performance Metrics Comparison")
@@ -237,24 +249,33 @@ if st.sidebar.button("🚀 Run Backtest", type="primary"):
                 'ann_return': '{:.2%}', 
                 'ann_vol': '{:.2%}',
                 'max_drawdown': '{:.2%}',
-                'sharpe': '{:.2f}'
+                'sharpe': '{:.2f}',
+                'sortino': '{:.2f}',
+                'calmar': '{:.2f}'
             }))
         
         with tab2:
             st.header("Individual Equity Curves")
             for name, equity in results.items():
-                fig, ax = plt.subplots(figsize=(10, 4))
-                equity.plot(ax=ax)
-                ax.set_title(f"{name} Equity Curve")
-                ax.set_ylabel("Equity ($)")
-                ax.grid(True, alpha=0.3)
-                st.pyplot(fig)
+                st.image(equity_png(equity, name))
         
         with tab3:
             st.header("Detailed Results")
             for name, metrics in metrics_data.items():
                 st.subheader(name)
                 st.json(metrics)
+            if results:
+                st.download_button("📄 Download HTML report",
+                                   report_page(results, pd.DataFrame(metrics_data).T),
+                                   file_name="quant_gym_report.html", mime="text/html")
+    
+        if profile_tab:
+            with profile_tab[0]:
+                st.header("Stage Timings")
+                st.caption("Wall time per pipeline stage on this rerun; cache hits don't appear.")
+                st.dataframe(stage_profile.report().style.format({'seconds': '{:.4f}', 'ms_per_call': '{:.2f}'}))
+                st.download_button("Download folded stacks (flamegraph)", stage_profile.folded(),
+                                   file_name="quant_gym.folded")
 
 else:
     # Welcome screen
@@ -1,19 +1,169 @@
 import numpy as np
 import pandas as pd
 
+import metrics
+import precision
+import profiling
+from execution import ExecutionModel, simulate as simulate_execution
+from ledger import Side, TradeLedger
+
+ENGINES = ('vectorized', 'loop')
+BAR_COLUMNS = ('open', 'high', 'low', 'volume')
+
+
+def _signal_array(signals, dates, dtype: np.dtype, columns=None) -> np.ndarray:
+    """``signals`` aligned to ``dates`` (and ``columns``) as an array, missing
+    values as 0. Signals already on that index are used in place, without a
+    copy, unless their dtype doesn't fit in ``dtype`` (e.g. float64 signals in
+    float32 mode, see precision.py).
+    """
+    aligned = signals.index.equals(dates) and (columns is None or signals.columns.equals(columns))
+    if not aligned:
+        signals = signals.reindex(dates) if columns is None else signals.reindex(index=dates, columns=columns)
+    values = signals.to_numpy()
+    if values.dtype.kind not in 'biuf':
+        # object or nullable columns
+        values = signals.fillna(0).to_numpy(dtype=dtype)
+    if np.result_type(values.dtype, dtype) != dtype:
+        values = values.astype(dtype)
+    if values.dtype.kind == 'f' and np.isnan(values).any():
+        values = np.nan_to_num(values, nan=0.0)
+    return values
+
+
+def _bar_arrays(bars, dates, columns=None) -> dict:
+    """OHLCV columns of ``bars`` aligned to ``dates`` for the execution models.
+
+    ``bars`` is a DataFrame with open/high/low/volume columns, or for a
+    portfolio a dict of (dates x assets) DataFrames keyed by column name.
+    """
+    if bars is None:
+        return {}
+    out = {}
+    for name in BAR_COLUMNS:
+        if name in bars:
+            values = bars[name].reindex(dates)
+            if columns is not None:
+                values = values.reindex(columns=columns)
+            out[name] = values.to_numpy(dtype=float)
+    return out
+
+
+def _simulate(price: np.ndarray, signals: np.ndarray, cash: float, notional: float, commission: float,
+              prev_signal=0.0, prev_position=0.0):
+    """Vectorized equivalent of the run_signals bar loop.
+
+    A position is opened on the first non-zero signal after a flat bar and held
+    (at its entry size) until the signal returns to zero, exactly as the loop
+    does. ``signals`` may be 2-D (bars x columns) or 3-D to run many independent
+    backtests in one pass; ``price`` broadcasts over its trailing axes.
+
+    Cash flows are accumulated in the same order as the loop (trade value, then
+    commission) so the resulting cash and equity are bit-for-bit identical.
+    ``prev_signal`` and ``prev_position`` are the signal and position of the
+    bar before ``signals[0]`` (and ``cash`` the cash after it), so a long run
+    can be simulated in consecutive pieces; by default it starts flat.
+    """
+    price = price.reshape(price.shape + (1,) * (signals.ndim - price.ndim))
+    # float32 prices keep every intermediate in float32 (see precision.py)
+    dtype = np.result_type(price, signals, np.float32)
+    active = signals != 0
+    was_active = np.zeros_like(active)
+    was_active[0] = np.not_equal(prev_signal, 0)
+    was_active[1:] = active[:-1]
+    entries = active & ~was_active
+    exits = was_active & ~active
+
+    # entry size is fixed at the entry bar and carried until the exit
+    size = np.where(entries, (notional / price) * signals, 0.0)
+    bar = np.arange(len(signals)).reshape((-1,) + (1,) * (signals.ndim - 1))
+    last_entry = np.maximum.accumulate(np.where(entries, bar, 0), axis=0)
+    held = np.take_along_axis(size, last_entry, axis=0)
+    if np.any(prev_position):
+        # until the first entry, keep holding the carried position
+        held = np.where(np.logical_or.accumulate(entries, axis=0), held, prev_position)
+    position = np.where(active, held, 0.0)
+    closed = np.zeros_like(position)
+    closed[0] = prev_position
+    closed[1:] = position[:-1]
+    closed = np.where(exits, closed, 0.0)
+
+    flows = np.empty((2 * len(signals) + 1,) + signals.shape[1:], dtype=dtype)
+    flows[0] = cash
+    flows[1::2] = np.where(entries, -(size * price), np.where(exits, closed * price, 0.0))
+    # fees, -(|traded| * commission), and the running cash are written in place
+    np.multiply(np.abs(size + closed), -commission, out=flows[2::2])
+    cash_path = np.cumsum(flows, axis=0, out=flows)[2::2]
+    equity = cash_path + position * price
+    return equity, position, cash_path, entries, exits
+
+
 class Backtester:
-    def __init__(self, price: pd.Series, cash: float = 100000, commission: float = 0.0):
+    def __init__(self, price: pd.Series = None, cash: float = 100000, commission: float = 0.0,
+                 bars: pd.DataFrame = None):
+        if price is None:
+            # live use through on_bar
+            price = pd.Series(dtype=float)
         self.price = price
         self.dates = price.index
         self.cash = cash
         self.init_cash = cash
         self.position = 0.0
         self.position_price = 0.0
+        self.live_cash = cash
         self.commission = commission
-        self.history = []
+        # OHLCV frame for execution models (see execution.py)
+        self.bars = bars
+        self.history = TradeLedger()
+
+    def on_bar(self, t, p: float, s: float, pct_risk: float = 0.1) -> float:
+        """Process one live bar with price ``p`` and signal ``s``; returns equity.
 
-    def run_signals(self, signals: pd.Series, pct_risk: float = 0.1):
-        """signals aligned with price index. pct_risk controls max notional per trade."""
+        Runs the same per-bar logic as ``run_signals(engine='loop')`` on the
+        instance's running state, so feeding it a series bar by bar reproduces
+        the batch equity curve and ``history`` exactly.
+        """
+        # Exit condition
+        if self.position != 0 and s == 0:
+            self.live_cash += self.position * p
+            self.live_cash -= abs(self.position) * self.commission
+            self.history.append(t, Side.EXIT, self.position, p, self.live_cash, abs(self.position) * self.commission)
+            self.position = 0
+            self.position_price = 0
+        # Entry
+        if self.position == 0 and s != 0:
+            size = (self.init_cash * pct_risk / p) * s # signed
+            self.position = size
+            self.position_price = p
+            self.live_cash -= size * p
+            self.live_cash -= abs(size) * self.commission
+            self.history.append(t, Side.ENTER, size, p, self.live_cash, abs(size) * self.commission)
+        # mark-to-market
+        return self.live_cash + self.position * p
+
+    @profiling.stage('run_signals')
+    def run_signals(self, signals: pd.Series, pct_risk: float = 0.1, engine: str = 'vectorized',
+                    execution: ExecutionModel = None):
+        """signals aligned with price index. pct_risk controls max notional per trade.
+
+        engine='vectorized' computes the whole run on NumPy arrays; engine='loop'
+        is the reference bar-by-bar implementation. Both return the same equity
+        curve and record the same trades in ``history``, which is reset per run.
+
+        By default orders fill at the signal bar's close and ``commission`` is
+        charged per share. Pass an ``execution`` model for next-open fills,
+        notional commissions, slippage or compounding sizing; it replaces
+        ``commission`` and runs on the vectorized engine only.
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine {engine!r}, expected one of {ENGINES}")
+        self.history.clear()
+        if execution is not None:
+            if engine != 'vectorized':
+                raise ValueError("execution models run on the vectorized engine")
+            return self._run_model(signals, pct_risk, execution)
+        if engine == 'vectorized':
+            return self._run_vectorized(signals, pct_risk)
         signals = signals.reindex(self.dates).fillna(0).astype(float)
         equity_series = []
         cash = self.cash
@@ -27,7 +177,7 @@ class Backtester:
                 # close
                 cash += position * p
                 cash -= abs(position) * self.commission
-                self.history.append((t, 'exit', position, p, cash))
+                self.history.append(t, Side.EXIT, position, p, cash, abs(position) * self.commission)
                 position = 0
                 position_price = 0
             # Entry
@@ -38,28 +188,177 @@ class Backtester:
                 position_price = p
                 cash -= size * p
                 cash -= abs(size) * self.commission
-                self.history.append((t, 'enter', position, p, cash))
+                self.history.append(t, Side.ENTER, position, p, cash, abs(position) * self.commission)
             # mark-to-market
             equity = cash + position * p
             equity_series.append((t, equity))
         eq = pd.Series([v for _, v in equity_series], index=[d for d, _ in equity_series])
         return eq
 
+    def _run_vectorized(self, signals: pd.Series, pct_risk: float):
+        price = self.price.to_numpy(dtype=precision.float_dtype())
+        equity, position, cash, entries, exits = _simulate(
+            price, _signal_array(signals, self.dates, price.dtype), self.cash, self.init_cash * pct_risk,
+            self.commission)
+        bars = np.flatnonzero(entries | exits)
+        is_exit = exits[bars]
+        traded = np.where(is_exit, position[np.maximum(bars - 1, 0)], position[bars])
+        self.history.extend(self.dates[bars], np.where(is_exit, Side.EXIT, Side.ENTER), traded, price[bars],
+                            cash[bars], np.abs(traded) * self.commission)
+        return pd.Series(equity, index=self.dates.rename(None), copy=False)
+
+    def _run_model(self, signals: pd.Series, pct_risk: float, model: ExecutionModel):
+        price = self.price.to_numpy(dtype=precision.float_dtype())
+        position, cash_flow, entries, exits, traded, fill, fee = simulate_execution(
+            model, price, _signal_array(signals, self.dates, price.dtype), self.cash, self.init_cash * pct_risk,
+            pct_risk, _bar_arrays(self.bars, self.dates))
+        cash = self.cash + cash_flow
+        bars = np.flatnonzero(entries | exits)
+        is_exit = exits[bars]
+        # exits record the position that was closed, as in the default engine
+        self.history.extend(self.dates[bars], np.where(is_exit, Side.EXIT, Side.ENTER),
+                            np.where(is_exit, -traded[bars], traded[bars]), fill[bars], cash[bars], fee[bars])
+        return pd.Series(cash + position * price, index=self.dates.rename(None), copy=False)
+
+    @profiling.stage('run_signals_matrix')
+    def run_signals_matrix(self, signals: pd.DataFrame, pct_risk: float = 0.1,
+                           execution: ExecutionModel = None) -> pd.DataFrame:
+        """Backtest every column of ``signals`` together on this price series.
+
+        Each column gives the same equity as ``run_signals`` would for it alone.
+        Trades are not recorded in ``history``.
+        """
+        price = self.price.to_numpy(dtype=precision.float_dtype())
+        values = _signal_array(signals, self.dates, price.dtype)
+        if execution is None:
+            equity = _simulate(price, values, self.cash, self.init_cash * pct_risk, self.commission)[0]
+        else:
+            position, cash_flow = simulate_execution(
+                execution, price, values, self.cash, self.init_cash * pct_risk, pct_risk,
+                _bar_arrays(self.bars, self.dates))[:2]
+            equity = self.cash + cash_flow + position * price[:, None]
+        return pd.DataFrame(equity, index=self.dates.rename(None), columns=signals.columns, copy=False)
+
     @staticmethod
-    def performance_metrics(equity: pd.Series):
-        returns = equity.pct_change().fillna(0)
-        total_return = equity.iloc[-1] / equity.iloc[0] - 1.0
-        ann_ret = (1 + total_return) ** (252 / len(equity)) - 1 if len(equity) > 1 else 0.0
-        ann_vol = returns.std() * np.sqrt(252)
-        sharpe = ann_ret / ann_vol if ann_vol != 0 else np.nan
-        # max drawdown
-        running_max = equity.cummax()
-        drawdown = (equity - running_max) / running_max
-        max_dd = drawdown.min()
-        return {
-            'total_return': float(total_return),
-            'ann_return': float(ann_ret),
-            'ann_vol': float(ann_vol),
-            'sharpe': float(sharpe),
-            'max_drawdown': float(max_dd)
-        }
\ No newline at end of file
+    def performance_metrics(equity: pd.Series, history=None):
+        """Metrics for one equity curve (see metrics.py for the definitions).
+        Pass ``history`` to include trade statistics."""
+        return metrics.compute_metrics(equity, history)
+
+    @staticmethod
+    def performance_metrics_matrix(equity: pd.DataFrame) -> pd.DataFrame:
+        """performance_metrics for every column of ``equity``, one row per column."""
+        return metrics.compute_metrics(equity)
+
+
+class PortfolioBacktester:
+    """Backtest a (dates x assets) price matrix against one shared cash balance.
+
+    Prices are forward-filled, so assets trading on different calendars are
+    marked at their last close; bars before an asset's first price hold no
+    position in it. Positions, cash and equity are computed for all assets at
+    once, without a per-bar loop.
+    """
+
+    def __init__(self, prices: pd.DataFrame, cash: float = 100000, commission: float = 0.0, bars: dict = None):
+        self.prices = prices.ffill()
+        self.dates = prices.index
+        self.assets = prices.columns
+        self.cash = cash
+        self.init_cash = cash
+        self.commission = commission
+        # {'open'|'high'|'low'|'volume': (dates x assets) DataFrame} for execution models
+        self.bars = bars
+        self.positions = None
+        self.cash_path = None
+        self.history = TradeLedger(assets=self.assets)
+
+    def _signals(self, signals: pd.DataFrame, dtype: np.dtype) -> np.ndarray:
+        values = _signal_array(signals, self.dates, dtype, self.assets)
+        return np.where(self.prices.notna().to_numpy(), values, values.dtype.type(0))
+
+    def _mark(self, price: np.ndarray, position: np.ndarray, cash_flow: np.ndarray) -> np.ndarray:
+        """Equity from per-asset positions and cumulative per-asset cash flows."""
+        # positions are zero wherever the price is still missing
+        value = np.where(position != 0, position * price, 0.0).sum(axis=1)
+        return self.cash + cash_flow.sum(axis=1) + value
+
+    def _simulate_model(self, model: ExecutionModel, price: np.ndarray, signals: np.ndarray, pct_risk: float):
+        if model.sizing != 'fixed':
+            raise ValueError("portfolio backtests share one cash balance and only support fixed sizing")
+        return simulate_execution(model, price, signals, 0.0, self.init_cash * pct_risk, pct_risk,
+                                  _bar_arrays(self.bars, self.dates, self.assets))
+
+    @profiling.stage('portfolio.run_signals')
+    def run_signals(self, signals: pd.DataFrame, pct_risk: float = 0.1,
+                    execution: ExecutionModel = None) -> pd.Series:
+        """Per-asset signals with Backtester.run_signals semantics: each asset
+        opens ``init_cash * pct_risk`` of notional on a non-zero signal and holds
+        it until its signal returns to zero. All legs draw on the same cash.
+        An ``execution`` model (fixed sizing only) replaces ``commission``.
+
+        ``history`` records every trade with the portfolio cash at the end of
+        its bar; it is reset per run.
+        """
+        price = self.prices.to_numpy(dtype=precision.float_dtype())
+        if execution is None:
+            _, position, cash_flow, entries, exits = _simulate(
+                price, self._signals(signals, price.dtype), 0.0, self.init_cash * pct_risk, self.commission)
+            fill, fee = price, None
+        else:
+            position, cash_flow, entries, exits, _, fill, fee = self._simulate_model(
+                execution, price, self._signals(signals, price.dtype), pct_risk)
+        equity = self._mark(price, position, cash_flow)
+        self.positions = pd.DataFrame(position, index=self.dates, columns=self.assets, copy=False)
+        self.cash_path = pd.Series(self.cash + cash_flow.sum(axis=1), index=self.dates, copy=False)
+        rows, cols = np.nonzero(entries | exits)
+        is_exit = exits[rows, cols]
+        traded = np.where(is_exit, position[np.maximum(rows - 1, 0), cols], position[rows, cols])
+        fees = np.abs(traded) * self.commission if fee is None else fee[rows, cols]
+        self.history.clear()
+        self.history.extend(self.dates[rows], np.where(is_exit, Side.EXIT, Side.ENTER), traded, fill[rows, cols],
+                            self.cash_path.to_numpy()[rows], fees, cols)
+        return pd.Series(equity, index=self.dates.rename(None), copy=False)
+
+    @profiling.stage('portfolio.run_signals_matrix')
+    def run_signals_matrix(self, signals: dict, pct_risk: float = 0.1,
+                           execution: ExecutionModel = None) -> pd.DataFrame:
+        """run_signals for many independent runs at once.
+
+        ``signals`` maps each asset to a (dates x runs) DataFrame; all of them
+        share the same run columns. Returns one equity column per run.
+        """
+        columns = signals[self.assets[0]].columns
+        price = self.prices.to_numpy(dtype=precision.float_dtype())
+        stacked = np.stack([_signal_array(signals[a], self.dates, price.dtype, columns) for a in self.assets], axis=1)
+        stacked = np.where(self.prices.notna().to_numpy()[:, :, None], stacked, stacked.dtype.type(0))
+        if execution is None:
+            _, position, cash_flow, _, _ = _simulate(price, stacked, 0.0, self.init_cash * pct_risk, self.commission)
+        else:
+            position, cash_flow = self._simulate_model(execution, price, stacked, pct_risk)[:2]
+        equity = self._mark(price[:, :, None], position, cash_flow)
+        return pd.DataFrame(equity, index=self.dates.rename(None), columns=columns, copy=False)
+
+    @profiling.stage('portfolio.run_weights')
+    def run_weights(self, weights: pd.DataFrame) -> pd.Series:
+        """Rebalance to target weights of ``init_cash``.
+
+        Whenever an asset's weight changes, its holding is resized to
+        ``weight * init_cash / price`` at that bar's close and then held; a
+        weight of zero closes it. Commission is charged per share traded.
+        """
+        price = self.prices.to_numpy(dtype=precision.float_dtype())
+        w = self._signals(weights, price.dtype)
+        prev = np.zeros_like(w)
+        prev[1:] = w[:-1]
+        change = w != prev
+        bar = np.arange(len(w))[:, None]
+        last_change = np.maximum.accumulate(np.where(change, bar, 0), axis=0)
+        target = np.where(change, w * self.init_cash / np.where(change, price, 1.0), 0.0)
+        position = np.where(w != 0, np.take_along_axis(target, last_change, axis=0), 0.0)
+        trades = np.diff(position, axis=0, prepend=0.0)
+        cash_flow = np.cumsum(-np.where(trades != 0, trades * price + np.abs(trades) * self.commission, 0.0), axis=0)
+        equity = self._mark(price, position, cash_flow)
+        self.positions = pd.DataFrame(position, index=self.dates, columns=self.assets, copy=False)
+        self.cash_path = pd.Series(self.cash + cash_flow.sum(axis=1), index=self.dates, copy=False)
+        return pd.Series(equity, index=self.dates.rename(None), copy=False)
@@ -0,0 +1,320 @@
+# batch.py
+"""Run many (symbol, strategy, params) backtests over a process pool.
+
+    python batch.py --symbols QQQ SPY AAPL --strategies sma_crossover rsi_meanrev --workers 8
+    python batch.py --symbols-file universe.txt --pairs BTC-USD/QQQ --out outputs/batch_metrics.csv
+    python batch.py --symbols QQQ SPY --service http://127.0.0.1:8765
+
+Close prices are loaded once in the parent and handed to the workers through a
+single shared-memory block; each worker returns one row of metrics (or the
+error it hit) per job. With ``--service`` the jobs are queued on a running
+backtest service (service.py) instead and polled until they finish.
+"""
+import argparse
+import inspect
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import compute
+import report
+import results
+import service
+import utils
+from backtester import Backtester, PortfolioBacktester
+from strategies import sma_crossover, rsi_meanrev, market_mood
+
+STRATEGIES = {
+    'sma_crossover': sma_crossover.generate_signals,
+    'rsi_meanrev': rsi_meanrev.generate_signals,
+    'market_mood': market_mood.generate_pairs_signals,
+}
+PAIR_STRATEGIES = {'market_mood'}
+
+# worker-side view of the shared price block, set by _attach
+_shared = {}
+
+
+def _symbols(job):
+    symbol = job[0]
+    return tuple(symbol) if isinstance(symbol, (tuple, list)) else (symbol,)
+
+
+def _pack(prices: dict):
+    """Copy close series into one shared-memory block: all values, then all timestamps."""
+    total = sum(len(p) for p in prices.values())
+    shm = shared_memory.SharedMemory(create=True, size=max(16 * total, 1))
+    values = np.ndarray(total, dtype=np.float64, buffer=shm.buf)
+    stamps = np.ndarray(total, dtype=np.int64, buffer=shm.buf, offset=8 * total)
+    layout = {}
+    offset = 0
+    for symbol, price in prices.items():
+        n = len(price)
+        index = pd.DatetimeIndex(price.index)
+        values[offset:offset + n] = price.to_numpy(dtype=float)
+        stamps[offset:offset + n] = index.as_unit('ns').asi8
+        layout[symbol] = (offset, n, None if index.tz is None else str(index.tz))
+        offset += n
+    del values, stamps
+    return shm, total, layout
+
+
+def _attach(name: str, total: int, layout: dict):
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: workers share the parent's resource tracker, so the
+        # duplicate registration is dropped when the parent unlinks the block
+        shm = shared_memory.SharedMemory(name=name)
+    _shared['shm'] = shm
+    _shared['values'] = np.ndarray(total, dtype=np.float64, buffer=shm.buf)
+    _shared['stamps'] = np.ndarray(total, dtype=np.int64, buffer=shm.buf, offset=8 * total)
+    _shared['layout'] = layout
+
+
+def _shared_price(symbol: str) -> pd.Series:
+    offset, n, tz = _shared['layout'][symbol]
+    index = pd.to_datetime(_shared['stamps'][offset:offset + n], utc=tz is not None)
+    if tz is not None:
+        index = index.tz_convert(tz)
+    return pd.Series(_shared['values'][offset:offset + n], index=index, copy=False)
+
+
+def run_job(job, cash: float = 100000, commission: float = 0.0, pct_risk: float = 0.1, equity_points: int = None,
+            results_dir: str = None):
+    """Backtest one (symbol, strategy, params) job against the shared prices.
+
+    Pair strategies take a (symbol_a, symbol_b) tuple and are backtested as a
+    two-asset portfolio. With ``equity_points`` the row also carries the
+    equity curve, downsampled to that many points for the report. With
+    ``results_dir`` the run is memoized in that result store (see
+    results.py) and the row carries its ``key``.
+    """
+    symbol, strategy, params = job
+    row = {'symbol': '/'.join(_symbols(job)), 'strategy': strategy, 'params': repr(params)}
+    start = time.perf_counter()
+    try:
+        generate = STRATEGIES[strategy]
+        if strategy in PAIR_STRATEGIES:
+            price_a, price_b = (_shared_price(s) for s in _symbols(job))
+            data = pd.DataFrame({'a': price_a, 'b': price_b})
+
+            def _execute():
+                dfpos = generate(price_a, price_b, **params)
+                bt = PortfolioBacktester(data.reindex(dfpos.index), cash, commission)
+                equity = bt.run_signals(dfpos.set_axis(['a', 'b'], axis=1), pct_risk)
+                return equity, bt.history, Backtester.performance_metrics(equity)
+        else:
+            data = _shared_price(symbol)
+
+            def _execute():
+                bt = Backtester(data, cash=cash, commission=commission)
+                equity = bt.run_signals(generate(data, **params), pct_risk)
+                return equity, bt.history, Backtester.performance_metrics(equity)
+        if results_dir:
+            row['key'] = results.run_key(data, generate, params,
+                                         {'cash': cash, 'commission': commission, 'pct_risk': pct_risk})
+            info = {'strategy': strategy, 'symbols': _symbols(job), 'params': params}
+            equity, _, metrics = results.ResultStore(results_dir).run(row['key'], _execute, info)
+        else:
+            equity, _, metrics = _execute()
+        row.update(metrics)
+        if equity_points:
+            row['equity'] = report.downsample(equity, equity_points)
+        row['error'] = None
+    except Exception as exc:
+        row['error'] = f'{type(exc).__name__}: {exc}'
+    row['seconds'] = time.perf_counter() - start
+    return row
+
+
+def iter_batch(jobs, prices: dict = None, max_workers: int = None, start='2020-01-01', end='2025-01-01',
+               cash: float = 100000, commission: float = 0.0, pct_risk: float = 0.1, equity_points: int = None,
+               results_dir: str = None):
+    """Yield one result row per job as soon as it finishes.
+
+    ``prices`` maps symbol -> close Series; symbols missing from it are loaded
+    concurrently with utils.download_many. At most ``max_workers`` processes run and at most
+    twice that many jobs are queued at once. A failing job (or symbol that
+    can't be loaded) yields a row with ``error`` set and doesn't affect others.
+    ``equity_points`` and ``results_dir`` are passed on to run_job.
+    """
+    jobs = [(tuple(j[0]) if isinstance(j[0], list) else j[0], j[1], dict(j[2]) if len(j) > 2 else {})
+            for j in jobs]
+    max_workers = max_workers or min(os.cpu_count() or 1, 8)
+    prices = dict(prices or {})
+    failed = {}
+    needed = sorted({s for job in jobs for s in _symbols(job)} - set(prices))
+    for symbol, bars in utils.download_many(needed, start=start, end=end, return_exceptions=True).items():
+        if isinstance(bars, Exception):
+            failed[symbol] = f'{type(bars).__name__}: {bars}'
+        else:
+            prices[symbol] = bars['close']
+
+    runnable = []
+    for job in jobs:
+        missing = [s for s in _symbols(job) if s in failed]
+        if missing:
+            yield {'symbol': '/'.join(_symbols(job)), 'strategy': job[1], 'params': repr(job[2]),
+                   'error': failed[missing[0]], 'seconds': 0.0}
+        else:
+            runnable.append(job)
+    if not runnable:
+        return
+
+    shm, total, layout = _pack({s: p for s, p in prices.items() if s not in failed})
+    try:
+        with ProcessPoolExecutor(max_workers, initializer=_attach, initargs=(shm.name, total, layout)) as pool:
+            pending = {}
+            queue = iter(runnable)
+            while True:
+                for job in queue:
+                    pending[pool.submit(run_job, job, cash, commission, pct_risk, equity_points, results_dir)] = job
+                    if len(pending) >= 2 * max_workers:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = pending.pop(future)
+                    try:
+                        yield future.result()
+                    except Exception as exc:
+                        # the worker itself died (e.g. BrokenProcessPool)
+                        yield {'symbol': '/'.join(_symbols(job)), 'strategy': job[1], 'params': repr(job[2]),
+                               'error': f'{type(exc).__name__}: {exc}', 'seconds': 0.0}
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _service_params(strategy: str, params: dict):
+    """compute.run's positional parameters for a job's keyword ones (None: the defaults)."""
+    if not params:
+        return None
+    legs = 2 if strategy in PAIR_STRATEGIES else 1
+    names = list(inspect.signature(STRATEGIES[strategy]).parameters.values())
+    names = names[legs:legs + len(compute.STRATEGIES[strategy][2])]
+    unknown = set(params) - {p.name for p in names}
+    if unknown:
+        raise ValueError(f"{strategy} has no parameter(s) {sorted(unknown)}")
+    return [params.get(p.name, p.default) for p in names]
+
+
+def iter_service(jobs, url: str, start='2020-01-01', end='2025-01-01', cash: float = 100000,
+                 commission: float = 0.0, equity_points: int = None, window: int = 64, poll: float = 0.5):
+    """Like iter_batch, but every job is submitted to the backtest service at
+    ``url`` (see service.py) as a job of its own and polled until it finishes.
+
+    The service runs jobs through compute.run, i.e. the dashboard's backtests:
+    sized at ``pct_risk=0.1`` like run_job, but with ``commission`` a fraction
+    of traded notional rather than an amount per share. At most ``window``
+    jobs are in flight at once.
+    """
+    client = service.ServiceClient(url)
+    queue = iter((tuple(j[0]) if isinstance(j[0], list) else j[0], j[1], dict(j[2]) if len(j) > 2 else {})
+                 for j in jobs)
+    pending = {}
+    while True:
+        for job in queue:
+            row = {'symbol': '/'.join(_symbols(job)), 'strategy': job[1], 'params': repr(job[2])}
+            try:
+                run = service.spec(job[1], _symbols(job), start, end, _service_params(job[1], job[2]),
+                                   cash, commission)
+                pending[client.submit([run])] = (row, time.perf_counter())
+            except (ValueError, LookupError, KeyError) as exc:
+                row.update(error=f'{type(exc).__name__}: {exc}', seconds=0.0)
+                yield row
+            if len(pending) >= window:
+                break
+        if not pending:
+            break
+        finished = False
+        for job_id, (row, started) in list(pending.items()):
+            status = client.status(job_id)
+            if status['status'] in service.ACTIVE:
+                continue
+            finished = True
+            del pending[job_id]
+            if status['status'] == 'done':
+                equity, metrics = client.result(job_id, points=equity_points)[0]
+                row.update(metrics)
+                if equity_points:
+                    row['equity'] = equity
+                row['error'] = None
+            else:
+                row['error'] = status['error'] or status['status']
+            row['seconds'] = time.perf_counter() - started
+            yield row
+        if not finished:
+            time.sleep(poll)
+
+
+def run_batch(jobs, **kwargs) -> pd.DataFrame:
+    """Run every job and collect the results into one metrics table."""
+    return pd.DataFrame(list(iter_batch(jobs, **kwargs)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Batch backtests over a process pool.')
+    parser.add_argument('--symbols', nargs='*', default=[])
+    parser.add_argument('--symbols-file', help='file with one ticker per line')
+    parser.add_argument('--strategies', nargs='*', default=['sma_crossover', 'rsi_meanrev'],
+                        choices=sorted(set(STRATEGIES) - PAIR_STRATEGIES))
+    parser.add_argument('--pairs', nargs='*', default=[], help='A/B pairs for market_mood')
+    parser.add_argument('--start', default='2020-01-01')
+    parser.add_argument('--end', default='2025-01-01')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cash', type=float, default=100000)
+    parser.add_argument('--commission', type=float, default=0.0, help='per share traded')
+    parser.add_argument('--out', default='outputs/batch_metrics.csv')
+    parser.add_argument('--report', metavar='PATH', help='also write an HTML report with the equity curves')
+    parser.add_argument('--results', default=results.DEFAULT_ROOT, metavar='DIR',
+                        help='result store to reuse and save runs in (empty to disable)')
+    parser.add_argument('--service', metavar='URL',
+                        help='submit the jobs to a running backtest service (service.py) instead')
+    args = parser.parse_args(argv)
+    if args.service and args.commission:
+        # the service charges a fraction of notional (see iter_service), so the
+        # same number would run a different backtest
+        parser.error('--commission is per share, which --service does not support')
+
+    symbols = list(args.symbols)
+    if args.symbols_file:
+        with open(args.symbols_file) as f:
+            symbols += [line.strip() for line in f if line.strip()]
+    jobs = [(s, strategy, {}) for s in symbols for strategy in args.strategies]
+    jobs += [(tuple(pair.split('/')), 'market_mood', {}) for pair in args.pairs]
+
+    rows, curves = [], {}
+    points = report.DEFAULT_POINTS // 4 if args.report else None
+    if args.service:
+        rows_iter = iter_service(jobs, args.service, start=args.start, end=args.end, cash=args.cash,
+                                 commission=args.commission, equity_points=points)
+    else:
+        rows_iter = iter_batch(jobs, max_workers=args.workers, start=args.start, end=args.end, cash=args.cash,
+                               commission=args.commission, equity_points=points, results_dir=args.results)
+    for i, row in enumerate(rows_iter, 1):
+        status = row['error'] or f"sharpe={row['sharpe']:.2f}"
+        print(f"[{i}/{len(jobs)}] {row['symbol']} {row['strategy']}: {status}")
+        equity = row.pop('equity', None)
+        if equity is not None:
+            curves[f"{row['symbol']} {row['strategy']}"] = equity
+        rows.append(row)
+    table = pd.DataFrame(rows)
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    table.to_csv(args.out, index=False)
+    print(f'\n{len(table)} jobs, {table["error"].notna().sum()} failed. Metrics saved to {args.out}')
+    if args.report:
+        # one chart per curve would dominate the run; the report draws them all as a single grid
+        metrics = table.set_index(table['symbol'] + ' ' + table['strategy']).drop(columns=['symbol', 'strategy'])
+        report.write_html(args.report, curves, metrics, title='Batch Backtest Report')
+        print(f'Report saved to {args.report}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""Peak-memory benchmark for the float64 and float32 (reduced) precision modes.
+
+Run from the repository root:
+
+    python -m benchmarks.memory
+    python -m benchmarks.memory --bars 100000 1000000 --columns 64 --out memory.json --min-reduction 0.3
+
+Each case runs in a fresh interpreter per precision mode (see precision.py).
+Close prices are read from a memory-mapped price cache, then go through the
+strategy, the backtester and the metrics:
+
+* backtest  one SMA crossover run with its trade ledger
+* sweep     a grid of --columns SMA crossover runs in one run_signals_matrix pass
+
+The peak resident set size reached during the run is reported, minus the
+resident size at its start, so imports and the price data don't count
+(/proc/self/clear_refs resets the peak on Linux; elsewhere tracemalloc's peak
+of Python/NumPy allocations is used instead). With --min-reduction the run
+fails if float32 mode doesn't cut a case's peak by at least that fraction.
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+import precision
+
+DEFAULT_BARS = (10**5, 10**6)
+DEFAULT_COLUMNS = 32
+CASES = ('backtest', 'sweep')
+# (short_window, long_window) pairs for the sweep case
+GRID = [(s, l) for l in range(30, 190, 10) for s in (5, 10, 15, 20)]
+
+_PROBE = """
+import json
+from benchmarks import memory
+print(json.dumps(memory.probe({case!r}, {bars}, {columns})))
+"""
+
+
+def _status() -> dict:
+    """Current (VmRSS) and peak (VmHWM) resident set size in bytes."""
+    out = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            name, value = line.split(':', 1)
+            if name in ('VmRSS', 'VmHWM'):
+                out[name] = int(value.split()[0]) * 1024
+    return out
+
+
+def _reset_peak() -> bool:
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _price_cache(root: str, bars: int, symbol: str):
+    """A price cache holding ``bars`` GBM bars of ``symbol``, and their [start, end)."""
+    from benchmarks import suite
+    from price_cache import FrameSource, PriceCache
+    close = suite.gbm(bars)
+    start, end = close.index[0], close.index[-1] + close.index.freq
+    cache = PriceCache(root, source=FrameSource({symbol: close.to_frame('close')}))
+    cache.get(symbol, start, end)
+    return cache, start, end
+
+
+def _workload(case: str, symbol: str, cache, start, end, columns: int):
+    import metrics
+    from backtester import Backtester
+    from strategies import sma_crossover
+
+    def run():
+        price = cache.get(symbol, start, end)['close']
+        bt = Backtester(price, commission=0.001)
+        if case == 'backtest':
+            equity = bt.run_signals(sma_crossover.generate_signals(price))
+            metrics.compute_metrics(equity, bt.history)
+        else:
+            equity = bt.run_signals_matrix(sma_crossover.generate_signals_grid(price, GRID[:columns]))
+            metrics.compute_metrics(equity)
+    return run
+
+
+def probe(case: str, bars: int, columns: int = DEFAULT_COLUMNS) -> dict:
+    """Peak memory of one ``case`` run in this process, in the current precision mode."""
+    if case not in CASES:
+        raise ValueError(f"unknown case {case!r}, expected one of {CASES}")
+    with tempfile.TemporaryDirectory() as root:
+        # warm up first, so numba compilation and pandas caches aren't measured
+        _workload(case, 'WARM', *_price_cache(os.path.join(root, 'warm'), 1000, 'WARM'), columns)()
+        run = _workload(case, 'GBM', *_price_cache(os.path.join(root, 'prices'), bars, 'GBM'), columns)
+        gc.collect()
+        if _reset_peak():
+            method = 'rss'
+            before = _status()['VmRSS']
+            run()
+            peak = _status()['VmHWM'] - before
+        else:
+            method = 'tracemalloc'
+            tracemalloc.start()
+            try:
+                run()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return {'case': case, 'mode': precision.mode(), 'bars': bars, 'columns': columns, 'peak_bytes': peak,
+            'method': method}
+
+
+def measure(case: str, bars: int, columns: int = DEFAULT_COLUMNS, mode: str = 'float64') -> dict:
+    """``probe`` in a fresh interpreter running in precision ``mode``."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', _PROBE.format(case=case, bars=bars, columns=columns)],
+                            cwd=root, capture_output=True, text=True, check=True,
+                            env={**os.environ, 'QUANT_GYM_PRECISION': mode})
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_memory(cases=CASES, bars=DEFAULT_BARS, columns: int = DEFAULT_COLUMNS, log=None):
+    """One record per (case, bars): the peak bytes in each precision mode and
+    float32's reduction of the float64 peak."""
+    records = []
+    for case in cases:
+        for n in bars:
+            peaks = {mode: measure(case, n, columns, mode) for mode in precision.MODES}
+            full, reduced = peaks['float64']['peak_bytes'], peaks['float32']['peak_bytes']
+            record = {'case': case, 'bars': n, 'columns': columns if case == 'sweep' else 1,
+                      'float64_bytes': full, 'float32_bytes': reduced,
+                      'reduction': 1 - reduced / full if full else 0.0, 'method': peaks['float64']['method']}
+            records.append(record)
+            if log:
+                log(record)
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cases', nargs='+', default=list(CASES), choices=CASES)
+    parser.add_argument('--bars', type=int, nargs='+', default=list(DEFAULT_BARS))
+    parser.add_argument('--columns', type=int, default=DEFAULT_COLUMNS, help=f'sweep runs (at most {len(GRID)})')
+    parser.add_argument('--out', help='write the results as JSON')
+    parser.add_argument('--min-reduction', type=float, help='fail if float32 saves less than this fraction')
+    args = parser.parse_args(argv)
+
+    print(f"{'case':>10} {'bars':>10} {'runs':>5} {'float64 MiB':>12} {'float32 MiB':>12} {'reduction':>10}")
+    records = run_memory(args.cases, args.bars, args.columns, log=lambda r: print(
+        f"{r['case']:>10} {r['bars']:>10} {r['columns']:>5} {r['float64_bytes'] / 2**20:>12.1f} "
+        f"{r['float32_bytes'] / 2**20:>12.1f} {r['reduction']:>10.0%}"))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'results': records}, f, indent=1)
+
+    failures = []
+    if args.min_reduction is not None:
+        failures = [r for r in records if r['reduction'] < args.min_reduction]
+    for r in failures:
+        print(f"TOO LITTLE SAVED {r['case']} {r['bars']} bars: {r['reduction']:.0%} < {args.min_reduction:.0%}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Startup-time benchmark for the CLI and worker entry points.
+
+Run from the repository root:
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 10 --out startup.json --max-overhead 0.2
+
+Each module is imported in a fresh interpreter (best of --repeat) and timed
+against a bare ``import numpy, pandas``; the difference is the overhead the
+repo itself adds. The run fails if a compute-only module pulls in one of the
+HEAVY packages (plotting, UI, JIT, download backends), or, with
+--max-overhead, if any module adds more than that many seconds.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# imported by every entry point below; their cost is the floor
+BASELINE = 'numpy, pandas'
+# modules that must start without any HEAVY package
+COMPUTE_MODULES = ('compute', 'backtester', 'pipeline', 'batch', 'sweep', 'walkforward', 'chunked', 'utils')
+HEAVY = ('matplotlib', 'streamlit', 'numba', 'yfinance', 'scipy')
+
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {modules}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'modules': sorted({{m.split('.')[0] for m in sys.modules}})}}))
+"""
+
+
+def measure(modules: str, repeat: int = 5) -> dict:
+    """Best-of-``repeat`` cold import time of ``modules`` (a comma-separated
+    import list) and the top-level packages it loaded."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', _PROBE.format(modules=modules)], cwd=root,
+                                capture_output=True, text=True, check=True)
+        record = json.loads(result.stdout.strip().splitlines()[-1])
+        if best is None or record['seconds'] < best['seconds']:
+            best = record
+    return best
+
+
+def run_startup(modules=COMPUTE_MODULES, repeat: int = 5, log=None):
+    """One record per module: import seconds, overhead over BASELINE and the HEAVY packages loaded."""
+    floor = measure(BASELINE, repeat)['seconds']
+    records = []
+    for module in modules:
+        m = measure(module, repeat)
+        record = {'module': module, 'seconds': m['seconds'], 'overhead': m['seconds'] - floor,
+                  'heavy': [h for h in HEAVY if h in m['modules']]}
+        records.append(record)
+        if log:
+            log(record)
+    return floor, records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modules', nargs='+', default=list(COMPUTE_MODULES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', help='write the results as JSON')
+    parser.add_argument('--max-overhead', type=float, help='fail if a module adds more than this many seconds')
+    args = parser.parse_args(argv)
+
+    print(f"{'module':>12} {'seconds':>9} {'overhead':>9}  heavy imports")
+    floor, records = run_startup(args.modules, args.repeat, log=lambda r: print(
+        f"{r['module']:>12} {r['seconds']:>9.3f} {r['overhead']:>9.3f}  {', '.join(r['heavy']) or '-'}"))
+    print(f"{'(' + BASELINE + ')':>12} {floor:>9.3f}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'baseline_seconds': floor, 'results': records}, f, indent=1)
+
+    failures = [r for r in records if r['heavy']]
+    if args.max_overhead is not None:
+        failures += [r for r in records if r['overhead'] > args.max_overhead and not r['heavy']]
+    for r in failures:
+        print(f"TOO SLOW {r['module']}: {r['overhead']:.3f}s over baseline, heavy imports: {r['heavy'] or '-'}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
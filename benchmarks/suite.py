@@ -0,0 +1,218 @@
+"""Benchmark suite for the backtest, strategy and metrics hot paths.
+
+Run from the repository root:
+
+    python -m benchmarks.suite                                  # 10^3 .. 10^6 bars
+    python -m benchmarks.suite --sizes 1000 10000000 --out results.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+
+Every case runs on fixed-seed geometric Brownian motion prices and is timed
+(best of --repeat) and traced for peak Python/NumPy memory, once per engine
+mode: the vectorized and loop backtest engines, and the NumPy and numba
+kernel backends (the chunked backtest runs on numba only). With --baseline
+the run exits non-zero if any case got slower or hungrier than the baseline
+by more than --tolerance.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import chunked
+import kernels
+import metrics
+from backtester import Backtester
+from strategies import sma_crossover, rsi_meanrev, market_mood
+
+DEFAULT_SIZES = (10**3, 10**4, 10**5, 10**6)
+SEED = 42
+
+
+def gbm(n: int, seed: int = SEED, s0: float = 100.0, mu: float = 0.05, sigma: float = 0.2,
+        periods: int = 252 * 390, shocks: np.ndarray = None) -> pd.Series:
+    """Geometric Brownian motion close series of ``n`` bars.
+
+    ``mu`` and ``sigma`` are annual and each bar is ``1 / periods`` of a year
+    (a trading minute by default), so 10^7 bars span about a century.
+    """
+    if shocks is None:
+        shocks = np.random.default_rng(seed).standard_normal(n)
+    dt = 1.0 / periods
+    log_returns = (mu - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * shocks
+    index = pd.date_range('2000-01-01', periods=n, freq='min')
+    return pd.Series(s0 * np.exp(np.cumsum(log_returns)), index=index)
+
+
+def gbm_pair(n: int, seed: int = SEED, rho: float = 0.8):
+    """Two GBM series whose shocks have correlation ``rho``."""
+    z = np.random.default_rng(seed).standard_normal((2, n))
+    return gbm(n, shocks=z[0]), gbm(n, s0=90.0, shocks=rho * z[0] + np.sqrt(1 - rho ** 2) * z[1])
+
+
+def _backtest(engine):
+    def setup(n):
+        price = gbm(n)
+        signals = sma_crossover.generate_signals(price)
+        return lambda: Backtester(price, commission=0.001).run_signals(signals, engine=engine)
+    return setup
+
+
+def _signals(generate):
+    def setup(n):
+        price = gbm(n)
+        return lambda: generate(price)
+    return setup
+
+
+def _pairs(n):
+    price_a, price_b = gbm_pair(n)
+    return lambda: market_mood.generate_pairs_signals(price_a, price_b)
+
+
+def _chunked(n):
+    close = gbm(n).to_numpy()
+    return lambda: chunked.run_chunked(close, sma_crossover.SMACrossoverChunks(), chunk_size=CHUNK_SIZE,
+                                       commission=0.001)
+
+
+def _metrics(n):
+    price = gbm(n)
+    equity = Backtester(price).run_signals(sma_crossover.generate_signals(price))
+    return lambda: metrics.compute_metrics(equity)
+
+
+KERNEL_MODES = ('numpy', 'numba')
+CHUNK_SIZE = 10**4
+
+# (case, mode) -> (setup(n) returning the timed callable, largest size or None)
+CASES = {
+    ('run_signals', 'vectorized'): (_backtest('vectorized'), None),
+    ('run_signals', 'loop'): (_backtest('loop'), 10**5),
+}
+for _mode in KERNEL_MODES:
+    CASES[('sma_crossover', _mode)] = (_signals(sma_crossover.generate_signals), None)
+    CASES[('rsi_meanrev', _mode)] = (_signals(rsi_meanrev.generate_signals), None)
+    CASES[('market_mood', _mode)] = (_pairs, None)
+    CASES[('performance_metrics', _mode)] = (_metrics, None)
+# the stateful rolling kernels have no NumPy version (see kernels.py)
+CASES[('run_chunked', 'numba')] = (_chunked, None)
+
+
+def _measure(fn, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run_suite(sizes=DEFAULT_SIZES, repeat: int = 3, cases=None, loop_max: int = None, log=None):
+    """Run every case at every size; returns one record dict per (case, mode, bars)."""
+    records = []
+    available = kernels.numba
+    try:
+        for (case, mode), (setup, max_bars) in (cases or CASES).items():
+            if mode == 'numba' and available is None:
+                continue
+            # 'numpy' forces the pure NumPy kernels; other modes use the default backend
+            kernels.numba = None if mode == 'numpy' else available
+            setup(1000)()  # warm up (numba compilation, pandas caches)
+            limit = loop_max if mode == 'loop' and loop_max is not None else max_bars
+            for n in sizes:
+                if limit is not None and n > limit:
+                    continue
+                seconds, peak = _measure(setup(n), repeat)
+                record = {'case': case, 'mode': mode, 'bars': n, 'seconds': seconds, 'peak_bytes': peak}
+                records.append(record)
+                if log:
+                    log(record)
+    finally:
+        kernels.numba = available
+    return records
+
+
+def environment() -> dict:
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'numba': getattr(kernels.numba, '__version__', None),
+        'machine': platform.machine(),
+        'seed': SEED,
+    }
+
+
+def compare(records, baseline, tolerance: float = 0.25, min_seconds: float = 0.01):
+    """Regressions against ``baseline`` records: one row per (case, mode, bars)
+    whose time or peak memory grew by more than ``tolerance``. Timings below
+    ``min_seconds`` in the baseline are too noisy to compare and are skipped."""
+    reference = {(r['case'], r['mode'], r['bars']): r for r in baseline}
+    regressions = []
+    for r in records:
+        old = reference.get((r['case'], r['mode'], r['bars']))
+        if old is None:
+            continue
+        for field in ('seconds', 'peak_bytes'):
+            if field == 'seconds' and old[field] < min_seconds:
+                continue
+            ratio = r[field] / old[field] if old[field] else 1.0
+            if ratio > 1 + tolerance:
+                regressions.append({'case': r['case'], 'mode': r['mode'], 'bars': r['bars'],
+                                    'field': field, 'baseline': old[field], 'current': r[field], 'ratio': ratio})
+    return regressions
+
+
+def _print_record(r):
+    print(f"{r['case']:>20} {r['mode']:>10} {r['bars']:>10} {r['seconds']:>12.5f} {r['peak_bytes'] / 2**20:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--loop-max', type=int, default=None, help='largest size for the loop engine (default 10^5)')
+    parser.add_argument('--cases', nargs='+', help='only run these cases, e.g. run_signals rsi_meanrev')
+    parser.add_argument('--out', help='write the results as JSON')
+    parser.add_argument('--baseline', help='compare against this JSON results file')
+    parser.add_argument('--save-baseline', help='write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown / memory growth ratio')
+    parser.add_argument('--min-seconds', type=float, default=0.01, help='skip timings faster than this')
+    args = parser.parse_args(argv)
+
+    cases = {k: v for k, v in CASES.items() if not args.cases or k[0] in args.cases}
+    print(f"{'case':>20} {'mode':>10} {'bars':>10} {'seconds':>12} {'peak MiB':>10}")
+    records = run_suite(args.sizes, args.repeat, cases, args.loop_max, log=_print_record)
+    result = {'environment': environment(), 'results': records}
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(result, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(records, baseline, args.tolerance, args.min_seconds)
+        for r in regressions:
+            print(f"REGRESSION {r['case']} [{r['mode']}] {r['bars']} bars: {r['field']} "
+                  f"{r['baseline']:.4g} -> {r['current']:.4g} ({r['ratio']:.2f}x)")
+        if regressions:
+            return 1
+        print(f"no regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
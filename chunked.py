@@ -0,0 +1,179 @@
+# chunked.py
+"""Out-of-core backtests over memory-mapped price columns.
+
+``save_columns`` writes a price frame as one ``.npy`` file per column (plus
+the index) and ``open_columns`` memory-maps them back, so multi-year minute
+or tick history never has to be loaded whole. ``run_chunked`` streams
+fixed-size windows of those arrays through a chunked strategy
+(``SMACrossoverChunks``, ``RSIMeanRevChunks``, ``PairsChunks``) and the
+vectorized engine, carrying indicator, position and cash state across chunk
+boundaries. Peak memory depends on ``chunk_size``, not on the length of the
+history, and the equity curve and trades are exactly those of the in-memory
+Backtester / PortfolioBacktester run. The indicators are numba kernels (see
+indicators.py); without numba they give the same results far more slowly.
+
+    columns = chunked.open_columns('data/AAPL-1m')
+    times, equity, history = chunked.run_chunked(
+        columns['close'], SMACrossoverChunks(20, 50), index=columns['index'], out='runs/aapl')
+"""
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+import profiling
+from backtester import _simulate
+from ledger import Side, TradeLedger
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+INDEX_FILE = 'index.npy'
+
+
+def save_columns(directory: str, frame: pd.DataFrame):
+    """Write each column of ``frame`` to ``<directory>/<column>.npy`` and its
+    index to ``index.npy`` (timezone-aware indexes are stored in UTC)."""
+    os.makedirs(directory, exist_ok=True)
+    index = frame.index
+    if isinstance(index, pd.DatetimeIndex) and index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    np.save(os.path.join(directory, INDEX_FILE), index.to_numpy())
+    for name in frame.columns:
+        np.save(os.path.join(directory, f'{name}.npy'), frame[name].to_numpy(dtype=float))
+
+
+def open_columns(directory: str) -> dict:
+    """Memory-mapped (read-only) arrays written by save_columns, keyed by
+    column name; the index is under ``'index'``."""
+    return {name[:-len('.npy')]: np.load(os.path.join(directory, name), mmap_mode='r')
+            for name in sorted(os.listdir(directory)) if name.endswith('.npy')}
+
+
+class _NpyWriter:
+    """Appends chunks to a 1-D .npy file whose final length isn't known up front."""
+    HEADER_BYTES = 128
+
+    def __init__(self, path: str, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self.file = open(path, 'wb')
+        self.file.write(b'\0' * self.HEADER_BYTES)
+
+    def write(self, values: np.ndarray):
+        np.ascontiguousarray(values, dtype=self.dtype).tofile(self.file)
+        self.length += len(values)
+
+    def close(self) -> np.ndarray:
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(header, {
+            'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False, 'shape': (self.length,)})
+        if len(header.getvalue()) != self.HEADER_BYTES:
+            raise ValueError(f"unexpected .npy header size for {self.path}")
+        self.file.seek(0)
+        self.file.write(header.getvalue())
+        self.file.close()
+        return np.load(self.path, mmap_mode='r')
+
+
+class _ListWriter:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, values: np.ndarray):
+        self.chunks.append(np.array(values))
+
+    def close(self) -> np.ndarray:
+        return np.concatenate(self.chunks) if self.chunks else np.empty(0)
+
+
+def _record(history, times, price, position, prev_position, cash, entries, exits, commission):
+    """Append one chunk's trades the way the in-memory engines record them."""
+    if entries.ndim == 1:
+        bars = np.flatnonzero(entries | exits)
+        cols = None
+    else:
+        bars, cols = np.nonzero(entries | exits)
+    if len(bars) == 0:
+        return
+    before = np.concatenate([np.asarray(prev_position)[None], position[:-1]])
+    at = bars if cols is None else (bars, cols)
+    is_exit = exits[at]
+    traded = np.where(is_exit, before[at], position[at])
+    history.extend(times[bars], np.where(is_exit, Side.EXIT, Side.ENTER), traded, price[at], cash[bars],
+                   np.abs(traded) * commission, 0 if cols is None else cols)
+
+
+@profiling.stage('chunked.run_chunked')
+def run_chunked(close, strategy, chunk_size: int = DEFAULT_CHUNK_SIZE, index=None, cash: float = 100000,
+                commission: float = 0.0, pct_risk: float = 0.1, out: str = None):
+    """Backtest ``strategy`` over ``close`` one ``chunk_size`` window at a time.
+
+    ``close`` is a 1-D array (typically a memmap from open_columns), or an
+    ``(a, b)`` pair of aligned arrays for a pair strategy; pair bars where
+    either price is missing are skipped, like the batch strategy does.
+    ``strategy`` is a chunked strategy whose ``update`` takes one array per
+    price. Single-asset runs match ``Backtester(...).run_signals``; pairs
+    match ``PortfolioBacktester`` on long/short legs.
+
+    Returns ``(times, equity, history)``: ``times`` comes from ``index`` (bar
+    numbers without one) and ``history`` is the run's TradeLedger. With
+    ``out``, ``times`` and ``equity`` are streamed to ``out/index.npy`` and
+    ``out/equity.npy`` and returned memory-mapped, so no output grows with
+    the length of the run either.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be >= 1")
+    prices = close if isinstance(close, tuple) else (close,)
+    n = len(prices[0])
+    if any(len(p) != n for p in prices) or (index is not None and len(index) != n):
+        raise ValueError("price arrays and index must have the same length")
+    pairs = len(prices) == 2
+    notional = cash * pct_risk
+
+    if out is not None:
+        os.makedirs(out, exist_ok=True)
+        time_dtype = index.dtype if index is not None else np.int64
+        time_writer = _NpyWriter(os.path.join(out, INDEX_FILE), time_dtype)
+        equity_writer = _NpyWriter(os.path.join(out, 'equity.npy'), float)
+    else:
+        time_writer, equity_writer = _ListWriter(), _ListWriter()
+    history = TradeLedger(assets=['a', 'b'] if pairs else None)
+
+    # state carried from the last bar of the previous chunk
+    shape = (2,) if pairs else ()
+    prev_signal, prev_position = np.zeros(shape), np.zeros(shape)
+    carried_cash = np.zeros(shape) if pairs else float(cash)
+    try:
+        for start in range(0, n, chunk_size):
+            stop = min(start + chunk_size, n)
+            chunk = [np.asarray(p[start:stop], dtype=float) for p in prices]
+            times = np.asarray(index[start:stop]) if index is not None else np.arange(start, stop)
+            if pairs:
+                keep = ~(np.isnan(chunk[0]) | np.isnan(chunk[1]))
+                chunk, times = [c[keep] for c in chunk], times[keep]
+                if not len(times):
+                    continue
+            signal = strategy.update(*chunk).astype(float)
+            if pairs:
+                price = np.column_stack(chunk)
+                signals = np.column_stack([signal, -signal])
+                # each leg's cash flow is carried separately, as PortfolioBacktester sums them
+                _, position, flows, entries, exits = _simulate(
+                    price, signals, carried_cash, notional, commission, prev_signal, prev_position)
+                value = np.where(position != 0, position * price, 0.0).sum(axis=1)
+                account = cash + flows.sum(axis=1)
+                equity = account + value
+                carried_cash = flows[-1]
+            else:
+                price, signals = chunk[0], signal
+                equity, position, account, entries, exits = _simulate(
+                    price, signals, carried_cash, notional, commission, prev_signal, prev_position)
+                carried_cash = account[-1]
+            _record(history, pd.Index(times), price, position, prev_position, account, entries, exits, commission)
+            prev_signal, prev_position = signals[-1], position[-1]
+            time_writer.write(times)
+            equity_writer.write(equity)
+    finally:
+        times, equity = time_writer.close(), equity_writer.close()
+    return times, equity, history
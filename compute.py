@@ -0,0 +1,85 @@
+# compute.py
+"""Headless, compute-only entry point: backtest one strategy and print its metrics.
+
+Only NumPy, pandas and the compute modules are imported (no matplotlib,
+Streamlit, numba or yfinance until a run actually needs them), so this
+starts fast in scripts, schedulers and short-lived worker processes.
+``python -m benchmarks.startup`` checks that it stays that way.
+
+    python compute.py sma_crossover QQQ --params 20 50 --start 2020-01-01
+    python compute.py market_mood BTC-USD QQQ --json --equity-out equity.csv
+"""
+import argparse
+import json
+import math
+import sys
+
+import pipeline
+
+# CLI name -> (pipeline strategy, number of symbols, default parameters)
+STRATEGIES = {
+    'sma_crossover': ('SMA Crossover', 1, (20, 50)),
+    'rsi_meanrev': ('RSI Mean Reversion', 1, (30, 70, 14)),
+    'market_mood': ('Market Mood Detector', 2, (20, 2.0, 0.5)),
+}
+
+
+def run(strategy: str, symbols, start='2020-01-01', end='2025-01-01', params: tuple = None,
+        cash: float = 100000, commission: float = 0.0):
+    """(equity, metrics) for ``strategy`` (a STRATEGIES key) on ``symbols``;
+    ``commission`` is a fraction of traded notional."""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"unknown strategy {strategy!r}, expected one of {sorted(STRATEGIES)}")
+    name, legs, _ = STRATEGIES[strategy]
+    symbols = tuple(symbols)
+    if len(symbols) != legs:
+        raise ValueError(f"{strategy} trades {legs} symbol(s), got {len(symbols)}")
+    return pipeline.backtest(name, symbols, start, end, check_params(strategy, params), cash, commission)
+
+
+def check_params(strategy: str, params) -> tuple:
+    """``params`` for ``strategy`` (its defaults when empty), with the types of
+    the defaults: windows are ints, z levels floats. Integer parameters accept
+    integral floats (20.0) but not fractional ones, which would be truncated."""
+    defaults = STRATEGIES[strategy][2]
+    params = tuple(params) if params else defaults
+    if len(params) != len(defaults):
+        raise ValueError(f"{strategy} takes {len(defaults)} parameters, got {len(params)}")
+    for i, (d, p) in enumerate(zip(defaults, params)):
+        if not math.isfinite(p):
+            raise ValueError(f"{strategy} parameter {i + 1} must be finite, got {p!r}")
+        if isinstance(d, int) and int(p) != p:
+            raise ValueError(f"{strategy} parameter {i + 1} must be an integer, got {p!r}")
+    return tuple(type(d)(p) for d, p in zip(defaults, params))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('strategy', choices=sorted(STRATEGIES))
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--params', type=float, nargs='+', help='strategy parameters (default: the dashboard defaults)')
+    parser.add_argument('--start', default='2020-01-01')
+    parser.add_argument('--end', default='2025-01-01')
+    parser.add_argument('--cash', type=float, default=100000)
+    parser.add_argument('--commission', type=float, default=0.0, help='fraction of traded notional')
+    parser.add_argument('--json', action='store_true', help='print the metrics as JSON')
+    parser.add_argument('--equity-out', metavar='PATH', help='write the equity curve as CSV')
+    args = parser.parse_args(argv)
+
+    try:
+        equity, metrics = run(args.strategy, args.symbols, args.start, args.end, args.params,
+                              args.cash, args.commission)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.equity_out:
+        equity.rename('equity').to_csv(args.equity_out)
+    if args.json:
+        print(json.dumps({k: float(v) for k, v in metrics.items()}))
+    else:
+        for k, v in metrics.items():
+            print(f"{k}: {v}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
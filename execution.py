@@ -0,0 +1,214 @@
+# execution.py
+"""Execution models for the vectorized backtest engine.
+
+An ``ExecutionModel`` decides when orders fill (this bar's close or the
+next bar's open), what they cost (commission and slippage) and how large
+they are (a fixed share of the starting cash, or of the cash at entry).
+
+    model = ExecutionModel(fill='next_open', commission=Bps(5),
+                           slippage=[HighLowSpread(0.5), VolumeImpact(0.1)], sizing='compound')
+    Backtester(price, bars=ohlcv).run_signals(signals, execution=model)
+
+Slippage models that need OHLCV data read it from the ``bars`` passed to the
+backtester (the ``open``/``high``/``low``/``volume`` columns download_data
+returns). Everything is evaluated on whole arrays; no model adds a per-bar
+Python loop.
+"""
+import numpy as np
+
+FILLS = ('close', 'next_open')
+SIZINGS = ('fixed', 'compound')
+
+
+class PerShare:
+    """Commission of ``rate`` per share traded."""
+    linear = True
+
+    def __init__(self, rate: float):
+        self.rate = rate
+
+    def fee(self, shares, price):
+        return np.abs(shares) * self.rate
+
+
+class Percent:
+    """Commission as a fraction of traded notional (0.001 = 0.1%)."""
+    linear = True
+
+    def __init__(self, rate: float):
+        self.rate = rate
+
+    def fee(self, shares, price):
+        return np.abs(shares * price) * self.rate
+
+
+def Bps(bps: float) -> Percent:
+    """Commission in basis points of traded notional."""
+    return Percent(bps / 1e4)
+
+
+class FixedSpread:
+    """Cross half of a constant ``bps`` bid/ask spread on every fill."""
+    linear = True
+    needs = ()
+
+    def __init__(self, bps: float):
+        self.bps = bps
+
+    def cost(self, shares, price, bars):
+        return price * self.bps / 2e4
+
+
+class HighLowSpread:
+    """Cross ``fraction`` of half the bar's high-low range on every fill, a
+    spread proxy for bars without quotes."""
+    linear = True
+    needs = ('high', 'low')
+
+    def __init__(self, fraction: float = 0.5):
+        self.fraction = fraction
+
+    def cost(self, shares, price, bars):
+        return self.fraction * (bars['high'] - bars['low']) / 2
+
+
+class VolumeImpact:
+    """Square-root market impact: ``coefficient * range * sqrt(|shares| / volume)``
+    per share, so larger orders relative to the bar's volume fill worse."""
+    linear = False
+    needs = ('high', 'low', 'volume')
+
+    def __init__(self, coefficient: float = 0.1):
+        self.coefficient = coefficient
+
+    def cost(self, shares, price, bars):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            participation = np.where(bars['volume'] > 0, np.abs(shares) / bars['volume'], 0.0)
+        return self.coefficient * (bars['high'] - bars['low']) * np.sqrt(participation)
+
+
+class ExecutionModel:
+    """Fill timing, costs and sizing for ``run_signals(execution=...)``.
+
+    fill:       'close' fills on the signal bar's close; 'next_open' fills on
+                the following bar's open (needs an ``open`` column).
+    commission: PerShare, Percent/Bps, or None.
+    slippage:   one model or a list of them; their per-share costs add up and
+                move each fill against the trade.
+    sizing:     'fixed' trades ``init_cash * pct_risk`` of notional per entry;
+                'compound' trades ``pct_risk`` of the cash at entry, so gains
+                and losses compound. Compounding needs costs proportional to
+                the order size, so it can't be combined with VolumeImpact.
+    """
+
+    def __init__(self, fill: str = 'close', commission=None, slippage=(), sizing: str = 'fixed'):
+        if fill not in FILLS:
+            raise ValueError(f"unknown fill {fill!r}, expected one of {FILLS}")
+        if sizing not in SIZINGS:
+            raise ValueError(f"unknown sizing {sizing!r}, expected one of {SIZINGS}")
+        self.fill = fill
+        self.commission = commission
+        self.slippage = [slippage] if hasattr(slippage, 'cost') else list(slippage)
+        self.sizing = sizing
+        if sizing == 'compound' and not all(s.linear for s in self.slippage):
+            raise ValueError("compound sizing needs slippage proportional to order size")
+
+    @property
+    def needs(self):
+        """OHLCV columns the model reads."""
+        fields = {'open'} if self.fill == 'next_open' else set()
+        for s in self.slippage:
+            fields.update(s.needs)
+        return fields
+
+    def fill_price(self, shares, price, bars):
+        """Price each order in ``shares`` fills at, slippage included."""
+        if not self.slippage:
+            return price
+        cost = sum(s.cost(shares, price, bars) for s in self.slippage)
+        return price + np.sign(shares) * cost
+
+    def fee(self, shares, price):
+        if self.commission is None:
+            return np.zeros(np.shape(shares), dtype=np.result_type(shares, np.float32))
+        return self.commission.fee(shares, price)
+
+
+def _expand(values, ndim):
+    return values.reshape(values.shape + (1,) * (ndim - values.ndim))
+
+
+def _carry(values, entries, active):
+    """Value set at each entry bar, held while the position is active."""
+    bar = np.arange(len(values)).reshape((-1,) + (1,) * (values.ndim - 1))
+    last_entry = np.maximum.accumulate(np.where(entries, bar, 0), axis=0)
+    return np.where(active, np.take_along_axis(values, last_entry, axis=0), 0.0)
+
+
+def _trades(model, signals, trade_price, unit_notional, bars):
+    """Positions and per-bar cash flows for entries sized at ``unit_notional``
+    (an array broadcast over the entry bars)."""
+    active = signals != 0
+    was_active = np.zeros_like(active)
+    was_active[1:] = active[:-1]
+    entries = active & ~was_active
+    exits = was_active & ~active
+    size = np.where(entries, unit_notional * signals / np.where(entries, trade_price, 1.0), 0.0)
+    position = _carry(size, entries, active)
+    closed = np.zeros_like(position)
+    closed[1:] = position[:-1]
+    traded = size - np.where(exits, closed, 0.0)
+    fill = model.fill_price(traded, trade_price, bars)
+    fee = model.fee(traded, fill)
+    flow = np.where(traded != 0, -traded * fill - fee, 0.0)
+    return position, flow, entries, exits, traded, fill, fee
+
+
+def simulate(model: ExecutionModel, close, signals, cash: float, notional: float, pct_risk: float, bars: dict):
+    """Vectorized backtest of ``signals`` under ``model``.
+
+    ``close`` is marked to market and used for close fills; ``bars`` maps
+    OHLCV column names to arrays shaped like ``close``. Like the default
+    engine, 2-D ``signals`` run one independent backtest per column and
+    ``close``/``bars`` broadcast over the trailing axes.
+
+    Returns ``(position, cash_flow, entries, exits, traded, fill, fee)``
+    where ``cash_flow`` is cumulative from zero.
+    """
+    missing = model.needs - set(bars)
+    if missing:
+        raise ValueError(f"execution model needs bar columns {sorted(missing)}")
+    ndim = signals.ndim
+    # signals and bars follow the dtype of ``close`` (float32 in precision.py's reduced mode)
+    dtype = np.result_type(close, np.float32)
+    signals = np.asarray(signals, dtype=dtype)
+    bars = {name: _expand(np.asarray(values, dtype=dtype), ndim) for name, values in bars.items()}
+    close = _expand(close, ndim)
+    if model.fill == 'next_open':
+        # orders from a bar's signal fill at the next bar's open
+        shifted = np.zeros_like(signals)
+        shifted[1:] = signals[:-1]
+        signals, trade_price = shifted, bars['open']
+    else:
+        trade_price = close
+
+    if model.sizing == 'fixed':
+        return _cumulative(_trades(model, signals, trade_price, notional, bars))
+
+    # compound: costs are linear in size, so size every trip per $1 of cash,
+    # read off each trip's return and chain them to get the cash at each entry
+    position, flow, entries, exits, *_ = _trades(model, signals, trade_price, pct_risk, bars)
+    trip = np.cumsum(entries, axis=0)
+    columns = np.arange(int(np.prod(signals.shape[1:], dtype=int))).reshape(signals.shape[1:])
+    key = (trip + columns * (len(signals) + 1)).ravel()
+    trip_return = np.bincount(key, weights=flow.ravel(), minlength=columns.size * (len(signals) + 1))
+    growth = np.cumprod(1 + trip_return.reshape(-1, len(signals) + 1), axis=1)
+    # cash before trip k is cash times the growth of trips 1..k-1 (trip 0 is the flat lead-in)
+    before = cash * np.concatenate([np.ones((len(growth), 1)), growth[:, :-1]], axis=1)
+    scale = before.ravel()[key].reshape(signals.shape)
+    return _cumulative(_trades(model, signals, trade_price, pct_risk * scale, bars))
+
+
+def _cumulative(result):
+    position, flow, *rest = result
+    return (position, np.cumsum(flow, axis=0), *rest)
@@ -0,0 +1,471 @@
+# indicators.py
+"""Incremental (one value at a time) indicator state.
+
+Each class reproduces the corresponding pandas computation step for step,
+including its Kahan-compensated rolling sums and Welford variance updates,
+so feeding a series through ``update`` gives bit-for-bit the same values as
+the batch pandas call. Updates are O(1) (amortized for RollingVar, which
+rarely recomputes its window the same way pandas does).
+
+The ``*Chunks`` classes do the same for consecutive arrays: ``update(chunk)``
+returns the indicator for that chunk, carrying the window across calls, so
+a long series can be processed a bounded piece at a time. They run the
+single-pass kernels in kernels.py on 1-D or 2-D input (many symbols, or
+many windows over one series, in one call) and keep their running sums in
+a public ``state`` array. ``rolling_mean``, ``rolling_var``,
+``rolling_zscore``, ``ewm_mean`` and ``rsi`` are the one-call versions the
+strategies use.
+
+numba is a requirement for the ``*Chunks`` classes: without it the same
+kernels run as plain Python loops, with the same results, far more slowly.
+"""
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+import kernels
+
+NAN = float('nan')
+# pandas recomputes a rolling variance from scratch when an update loses this
+# much precision (see pandas/_libs/window/aggregations.pyx)
+_INV_COND_TOL = 2.220446049250313e-16 * 1e3
+
+
+def _divide(a: float, b: float) -> float:
+    """a / b with NumPy semantics for a zero denominator."""
+    if b == 0:
+        if a == 0 or a != a:
+            return NAN
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+class RollingMean:
+    """``Series.rolling(window).mean()``"""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.reset()
+
+    def reset(self):
+        self.values.clear()
+        self.sum = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.nobs = 0
+        self.neg_ct = 0
+        self.same_count = 0
+        self.prev_value = None
+
+    def _add(self, val: float):
+        if val == val:
+            self.nobs += 1
+            y = val - self.compensation_add
+            t = self.sum + y
+            self.compensation_add = t - self.sum - y
+            self.sum = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct += 1
+            # pandas GH#42064: a run of identical values returns that value exactly
+            if val == self.prev_value:
+                self.same_count += 1
+            else:
+                self.same_count = 1
+            self.prev_value = val
+
+    def _remove(self, val: float):
+        if val == val:
+            self.nobs -= 1
+            y = -val - self.compensation_remove
+            t = self.sum + y
+            self.compensation_remove = t - self.sum - y
+            self.sum = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct -= 1
+
+    def update(self, val: float) -> float:
+        val = float(val)
+        if self.window == 1 or self.prev_value is None:
+            # pandas starts from scratch when consecutive windows don't overlap
+            self.reset()
+            self.prev_value = val
+        elif len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(val)
+        self._add(val)
+        if self.nobs < self.window or self.nobs == 0:
+            return NAN
+        result = self.sum / self.nobs
+        if self.same_count >= self.nobs:
+            return self.prev_value
+        if self.neg_ct == 0 and result < 0:
+            return 0.0
+        if self.neg_ct == self.nobs and result > 0:
+            return 0.0
+        return result
+
+
+class RollingVar:
+    """``Series.rolling(window).var()`` (ddof=1); ``std`` gives ``.std()``."""
+
+    def __init__(self, window: int, ddof: int = 1):
+        self.window = window
+        self.ddof = ddof
+        self.values = deque()
+        self.started = False
+        self._clear()
+
+    def _clear(self):
+        self.nobs = 0.0
+        self.mean = 0.0
+        self.ssqdm = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.unstable = False
+
+    def _add(self, val: float):
+        if val != val:
+            return
+        prev_m2 = self.ssqdm
+        self.nobs += 1
+        prev_mean = self.mean - self.compensation_add
+        y = val - self.compensation_add
+        t = y - self.mean
+        self.compensation_add = t + self.mean - y
+        self.mean = self.mean + t / self.nobs if self.nobs else 0.0
+        self.ssqdm = self.ssqdm + (val - prev_mean) * (val - self.mean)
+        if prev_m2 * _INV_COND_TOL > self.ssqdm:
+            self.unstable = True
+
+    def _remove(self, val: float):
+        if val != val:
+            return
+        prev_m2 = self.ssqdm
+        self.nobs -= 1
+        if self.nobs:
+            prev_mean = self.mean - self.compensation_remove
+            y = val - self.compensation_remove
+            t = y - self.mean
+            self.compensation_remove = t + self.mean - y
+            self.mean = self.mean - t / self.nobs
+            self.ssqdm = self.ssqdm - (val - prev_mean) * (val - self.mean)
+            if prev_m2 * _INV_COND_TOL > self.ssqdm:
+                self.unstable = True
+        else:
+            self.mean = 0.0
+            self.ssqdm = 0.0
+            self.unstable = False
+
+    def update(self, val: float) -> float:
+        val = float(val)
+        recompute = self.window == 1 or not self.started
+        self.started = True
+        if len(self.values) == self.window:
+            removed = self.values.popleft()
+            if not recompute:
+                self._remove(removed)
+        self.values.append(val)
+        if not recompute:
+            self._add(val)
+        if recompute or self.unstable:
+            # catastrophic cancellation: rebuild from the window like pandas does
+            self._clear()
+            for v in self.values:
+                self._add(v)
+            self.unstable = False
+        if self.nobs >= max(self.window, 1) and self.nobs > self.ddof:
+            return self.ssqdm / (self.nobs - self.ddof)
+        return NAN
+
+    @staticmethod
+    def std(var: float) -> float:
+        if var != var:
+            return NAN
+        return math.sqrt(var) if var >= 0 else 0.0
+
+
+class EWMMean:
+    """``Series.ewm(span=span, adjust=False).mean()``"""
+
+    def __init__(self, span: float):
+        com = (span - 1) / 2.0
+        self.com = com
+        self.alpha = 1.0 / (1.0 + com)
+        self.old_wt_factor = 1.0 - self.alpha
+        self.weighted = None
+        self.old_wt = 1.0
+        self.nobs = 0
+
+    def update(self, cur: float) -> float:
+        cur = float(cur)
+        is_observation = cur == cur
+        if self.weighted is None:
+            self.weighted = cur
+            self.nobs = int(is_observation)
+            return self.weighted if self.nobs >= 1 else NAN
+        self.nobs += is_observation
+        weighted = self.weighted
+        if weighted == weighted:
+            # ignore_na=False: a missing value still decays the old weight
+            self.old_wt *= self.old_wt_factor
+            if is_observation:
+                # avoid numerical errors on constant series
+                if weighted != cur:
+                    new_wt = 1.0 - self.old_wt if self.com == 1 else self.alpha
+                    weighted = self.old_wt * weighted + new_wt * cur
+                    weighted /= (self.old_wt + new_wt)
+                self.old_wt = 1.0
+        elif is_observation:
+            weighted = cur
+        self.weighted = weighted
+        return weighted if self.nobs >= 1 else NAN
+
+
+class RSI:
+    """``strategies.rsi_meanrev.rsi(series, period)``"""
+
+    def __init__(self, period: int = 14):
+        self.up = EWMMean(period)
+        self.down = EWMMean(period)
+        self.prev = None
+
+    def update(self, price: float) -> float:
+        price = float(price)
+        delta = NAN if self.prev is None else price - self.prev
+        self.prev = price
+        if delta != delta:
+            up = down = NAN
+        else:
+            up = delta if delta >= 0 else 0.0
+            down = -(delta if delta <= 0 else 0.0)
+        rs = _divide(self.up.update(up), self.down.update(down))
+        return 100 - (100 / (1 + rs))
+
+
+class RollingZScore:
+    """``(x - rolling mean) / rolling std`` with a zero std replaced by 1, as
+    in ``strategies.market_mood``."""
+
+    def __init__(self, window: int):
+        self.mean = RollingMean(window)
+        self.var = RollingVar(window)
+
+    def update(self, val: float) -> float:
+        mean = self.mean.update(val)
+        std = RollingVar.std(self.var.update(val))
+        if std == 0:
+            std = 1.0
+        return (float(val) - mean) / std
+
+
+def _columns(values, param):
+    """``values`` as a 2-D (rows, columns) array, ``param`` (a window, span,
+    ...) as one value per output column, and whether the result is 1-D.
+
+    A scalar ``param`` applies to every column; a sequence gives one output
+    column per entry, over the matching column of 2-D ``values`` or over
+    1-D ``values`` for all of them.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim not in (1, 2):
+        raise ValueError(f"expected a 1-D or 2-D array, got {values.ndim} dimensions")
+    table = values.reshape(len(values), -1)
+    params = np.atleast_1d(np.asarray(param))
+    if params.ndim != 1 or len(params) == 0:
+        raise ValueError("expected one parameter or a flat sequence of them")
+    if np.ndim(param) == 0:
+        params = np.repeat(params, table.shape[1])
+    elif table.shape[1] not in (1, len(params)):
+        raise ValueError(f"{table.shape[1]} columns but {len(params)} parameters")
+    return table, params, values.ndim == 1 and np.ndim(param) == 0
+
+
+def _result(out: np.ndarray, flat: bool) -> np.ndarray:
+    return out[:, 0] if flat else out
+
+
+class _WindowChunks:
+    """Keeps the last ``max(window)`` rows seen, ahead of each new chunk.
+
+    ``window`` is an int or one window per output column (see _columns);
+    ``state`` holds the running sums, one row per output column (laid out
+    as in kernels.py), allocated by the first update and advanced by every
+    one after it, with or without numba.
+    """
+    STATE = 0
+
+    def __init__(self, window):
+        self.window = window
+        self.tail = None
+        self.state = None
+
+    def _extend(self, values):
+        table, windows, flat = _columns(values, self.window)
+        windows = windows.astype(np.int64)
+        if windows.min() < 1:
+            raise ValueError("window must be >= 1")
+        if self.tail is None:
+            self.state = np.zeros((len(windows), self.STATE))
+        elif self.tail.shape[1] != table.shape[1]:
+            raise ValueError("every chunk must have the same number of columns")
+        else:
+            table = np.concatenate([self.tail, table])
+        start = 0 if self.tail is None else len(self.tail)
+        self.tail = table[max(0, len(table) - windows.max()):].copy()
+        return table, start, windows, np.empty((len(table) - start, len(windows))), flat
+
+
+class RollingMeanChunks(_WindowChunks):
+    """``rolling(window).mean()``, one chunk at a time."""
+    STATE = kernels.ROLLING_MEAN_STATE
+
+    def update(self, values) -> np.ndarray:
+        table, start, windows, out, flat = self._extend(values)
+        kernels.rolling_mean_chunk(table, start, windows, self.state, out)
+        return _result(out, flat)
+
+
+class RollingVarChunks(_WindowChunks):
+    """``rolling(window).var(ddof)``, one chunk at a time."""
+    STATE = kernels.ROLLING_VAR_STATE
+
+    def __init__(self, window, ddof: int = 1):
+        super().__init__(window)
+        self.ddof = ddof
+
+    def update(self, values) -> np.ndarray:
+        table, start, windows, out, flat = self._extend(values)
+        kernels.rolling_var_chunk(table, start, windows, self.ddof, self.state, out)
+        return _result(out, flat)
+
+
+class RollingZScoreChunks(_WindowChunks):
+    """``RollingZScore``, one chunk at a time; ``state`` is the mean's and
+    ``var_state`` the variance's."""
+    STATE = kernels.ROLLING_MEAN_STATE
+
+    def update(self, values) -> np.ndarray:
+        first = self.tail is None
+        table, start, windows, out, flat = self._extend(values)
+        if first:
+            self.var_state = np.zeros((len(windows), kernels.ROLLING_VAR_STATE))
+        kernels.rolling_zscore_chunk(table, start, windows, self.state, self.var_state, out)
+        return _result(out, flat)
+
+
+class EWMMeanChunks:
+    """``ewm(span=span, adjust=False).mean()``, one chunk at a time; ``span``
+    is a number or one per output column (see _columns). ``state`` is kept
+    like _WindowChunks'."""
+
+    def __init__(self, span):
+        self.span = span
+        self.state = None
+
+    def update(self, values) -> np.ndarray:
+        table, spans, flat = _columns(values, self.span)
+        if self.state is None:
+            self.state = np.zeros((len(spans), kernels.EWM_STATE))
+        elif len(self.state) != len(spans):
+            raise ValueError("every chunk must have the same number of columns")
+        out = np.empty((len(table), len(spans)))
+        kernels.ewm_mean_chunk(table, (spans.astype(float) - 1) / 2.0, self.state, out)
+        return _result(out, flat)
+
+
+def _moves(price: np.ndarray, prev: np.ndarray):
+    """Up and down moves of ``price`` (rows), ``prev`` being the row before it."""
+    delta = np.diff(price, axis=0, prepend=prev)
+    # same signed zeros as Series.clip: a rise has a down move of -0.0
+    return np.where(delta < 0, 0.0, delta), -np.where(delta > 0, 0.0, delta)
+
+
+def _rsi(up_ema: np.ndarray, down_ema: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 - (100 / (1 + up_ema / down_ema))
+
+
+class RSIChunks:
+    """``RSI``, one chunk at a time; ``period`` is an int or one per output column."""
+
+    def __init__(self, period=14):
+        self.up = EWMMeanChunks(period)
+        self.down = EWMMeanChunks(period)
+        self.prev = None
+
+    def update(self, price) -> np.ndarray:
+        price = np.asarray(price, dtype=float)
+        if self.prev is None:
+            self.prev = np.full((1,) + price.shape[1:], NAN)
+        up, down = _moves(price, self.prev)
+        if len(price):
+            self.prev = price[-1:]
+        return _rsi(self.up.update(up), self.down.update(down))
+
+
+# One-call versions of the chunked indicators, down axis 0 of a 1-D or 2-D
+# array: pass one window (period, span) for every column, or a sequence of
+# them for one output column each, e.g. rolling_mean(close, [20, 50]) or
+# rolling_zscore(spreads, 30). Without numba the same pandas computations run
+# instead of the (then pure Python) kernels; the results are identical.
+
+def _pandas(values, param, compute) -> np.ndarray:
+    """``compute(frame, param)`` once per distinct parameter."""
+    table, params, flat = _columns(values, param)
+    out = np.empty((len(table), len(params)))
+    for p in np.unique(params):
+        cols = np.flatnonzero(params == p)
+        frame = pd.DataFrame(table if table.shape[1] == 1 else table[:, cols], copy=False)
+        out[:, cols] = compute(frame, p.item()).to_numpy()
+    return _result(out, flat)
+
+
+def _zscore_frame(frame, window):
+    std = frame.rolling(window).std()
+    return (frame - frame.rolling(window).mean()) / std.mask(std == 0, 1.0)
+
+
+def rolling_mean(values, window) -> np.ndarray:
+    """``rolling(window).mean()``"""
+    if kernels.load_numba() is None:
+        return _pandas(values, window, lambda f, w: f.rolling(w).mean())
+    return RollingMeanChunks(window).update(values)
+
+
+def rolling_var(values, window, ddof: int = 1) -> np.ndarray:
+    """``rolling(window).var(ddof)``"""
+    if kernels.load_numba() is None:
+        return _pandas(values, window, lambda f, w: f.rolling(w).var(ddof))
+    return RollingVarChunks(window, ddof).update(values)
+
+
+def rolling_std(values, window, ddof: int = 1) -> np.ndarray:
+    """``rolling(window).std(ddof)``"""
+    var = rolling_var(values, window, ddof)
+    return np.sqrt(np.maximum(var, 0.0))
+
+
+def rolling_zscore(values, window) -> np.ndarray:
+    """``(x - rolling mean) / rolling std`` with a zero std replaced by 1, in one pass."""
+    if kernels.load_numba() is None:
+        return _pandas(values, window, _zscore_frame)
+    return RollingZScoreChunks(window).update(values)
+
+
+def ewm_mean(values, span) -> np.ndarray:
+    """``ewm(span=span, adjust=False).mean()``"""
+    if kernels.load_numba() is None:
+        return _pandas(values, span, lambda f, s: f.ewm(span=s, adjust=False).mean())
+    return EWMMeanChunks(span).update(values)
+
+
+def rsi(values, period=14) -> np.ndarray:
+    """``strategies.rsi_meanrev.rsi``"""
+    if kernels.load_numba() is None:
+        values = np.asarray(values, dtype=float)
+        up, down = _moves(values, np.full((1,) + values.shape[1:], NAN))
+        return _rsi(ewm_mean(up, period), ewm_mean(down, period))
+    return RSIChunks(period).update(values)
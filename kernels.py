@@ -0,0 +1,376 @@
+# kernels.py
+"""Array kernels shared by the strategies.
+
+numba is optional: when it is installed the sequential kernels are JIT
+compiled, otherwise the pure NumPy versions (or, for the stateful rolling
+kernels, the same loops in plain Python) are used. Both give identical
+results. The chunked backtests run the stateful kernels on every bar, so they
+need numba (it is in requirements.txt) to be fast. numba is slow to import, so
+it is only loaded the first time a kernel needs it (``kernels.numba`` triggers
+the import).
+"""
+import functools
+import math
+
+import numpy as np
+
+# functions decorated with @jit that haven't been swapped for their compiled versions yet
+_pending = []
+
+
+def __getattr__(name):
+    if name == 'numba':
+        return load_numba()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@functools.lru_cache(maxsize=None)
+def _import_numba():
+    try:
+        import numba
+    except ImportError:  # pragma: no cover - depends on the environment
+        return None
+    return numba
+
+
+def load_numba():
+    """``kernels.numba``: the numba module, or None when it isn't installed
+    (or has been set to None to force the NumPy kernels). Imported on first use."""
+    if 'numba' not in globals():
+        globals()['numba'] = _import_numba()
+    return globals()['numba']
+
+
+def _compile_pending():
+    numba = _import_numba()
+    while _pending:
+        fn = _pending.pop()
+        # rebinding the module global lets jitted kernels call each other
+        fn.__globals__[fn.__name__] = fn if numba is None else numba.njit(cache=True, nogil=True)(fn)
+
+
+def jit(fn):
+    """``numba.njit`` when numba is available, otherwise ``fn`` unchanged.
+
+    Nothing is imported or compiled until the first call of any jitted
+    function, which replaces every pending one in its module.
+    """
+    _pending.append(fn)
+
+    @functools.wraps(fn)
+    def lazy(*args):
+        _compile_pending()
+        return fn.__globals__[fn.__name__](*args)
+    return lazy
+
+
+def shift(values: np.ndarray) -> np.ndarray:
+    """values shifted down one row with a NaN first row, like ``Series.shift(1)``."""
+    values = np.asarray(values, dtype=float)
+    out = np.empty(values.shape)
+    out[:1] = np.nan
+    out[1:] = values[:-1]
+    return out
+
+
+def crossed_above(a, b) -> np.ndarray:
+    """True where ``a > b`` and ``a <= b`` on the previous bar.
+
+    ``b`` is either a series shaped like ``a`` or a level (scalar, or one value
+    per column) broadcast against it. Comparisons with NaN are False, so the
+    first bar and indicator warm-up never cross.
+    """
+    return _crossed(a, b, np.greater, np.less_equal)
+
+
+def crossed_below(a, b) -> np.ndarray:
+    """True where ``a < b`` and ``a >= b`` on the previous bar (see crossed_above)."""
+    return _crossed(a, b, np.less, np.greater_equal)
+
+
+def _crossed(a, b, now, before) -> np.ndarray:
+    # compares row i with row i - 1 through offset views instead of shifted copies
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    series = b.shape == a.shape
+    out = np.zeros(np.broadcast_shapes(a.shape, b.shape), dtype=bool)
+    out[1:] = now(a[1:], b[1:] if series else b) & before(a[:-1], b[:-1] if series else b)
+    return out
+
+
+def _hold_positions_numpy(changes: np.ndarray) -> np.ndarray:
+    bar = np.arange(len(changes)).reshape((-1,) + (1,) * (changes.ndim - 1))
+    last = np.maximum.accumulate(np.where(changes != 0, bar, 0), axis=0)
+    return np.take_along_axis(changes, last, axis=0)
+
+
+@jit
+def _hold_positions_loop(changes, out):
+    for j in range(changes.shape[1]):
+        current = changes[0, j]
+        for i in range(changes.shape[0]):
+            if changes[i, j] != 0:
+                current = changes[i, j]
+            out[i, j] = current
+
+
+def hold_positions(changes: np.ndarray) -> np.ndarray:
+    """Carry each non-zero signal change forward until the next one.
+
+    This is the "hold until next signal" state machine shared by the
+    strategies. Works along axis 0, so a 2-D array holds every column at once.
+    """
+    changes = np.asarray(changes)
+    if load_numba() is None or changes.size == 0:
+        return _hold_positions_numpy(changes)
+    out = np.empty_like(changes)
+    _hold_positions_loop(changes.reshape(len(changes), -1), out.reshape(len(changes), -1))
+    return out
+
+
+# Stateful rolling kernels. Each one continues a computation over
+# ``values[start:]``, where ``values[:start]`` is the tail of the data already
+# seen (at least the largest window's worth of rows, or all of it) and
+# ``state`` holds the running sums; both are updated so the next chunk can
+# pick up where this one left off. The recurrences follow pandas' window
+# aggregations step for step (see indicators.py), so running a series in
+# chunks gives exactly the batch pandas result.
+#
+# All of them work down the rows of a 2-D ``values`` array and write one
+# ``out`` column per entry of ``windows`` (``coms`` for the EWM), with one
+# ``state`` row each. ``values`` has either one column per output column or a
+# single column shared by all of them (many windows over one series).
+
+ROLLING_MEAN_STATE = 8  # sum, comp_add, comp_remove, nobs, neg_ct, same_count, prev_value, started
+ROLLING_VAR_STATE = 7  # nobs, mean, ssqdm, comp_add, comp_remove, unstable, started
+EWM_STATE = 4  # weighted, old_wt, nobs, started
+# pandas recomputes a rolling variance from scratch when an update loses this much precision
+_INV_COND_TOL = 2.220446049250313e-16 * 1e3
+
+
+@jit
+def _mean_step(val, old, reset, total, comp_add, comp_remove, nobs, neg_ct, same, prev):
+    """Slide a Kahan-summed window: drop ``old`` (NaN when nothing leaves), add ``val``."""
+    if reset:
+        # pandas starts from scratch when consecutive windows don't overlap
+        total = comp_add = comp_remove = nobs = neg_ct = same = 0.0
+        prev = val
+    elif old == old:
+        nobs -= 1
+        y = -old - comp_remove
+        t = total + y
+        comp_remove = t - total - y
+        total = t
+        if math.copysign(1.0, old) < 0:
+            neg_ct -= 1
+    if val == val:
+        nobs += 1
+        y = val - comp_add
+        t = total + y
+        comp_add = t - total - y
+        total = t
+        if math.copysign(1.0, val) < 0:
+            neg_ct += 1
+        # a run of identical values returns that value exactly
+        same = same + 1 if val == prev else 1.0
+        prev = val
+    return total, comp_add, comp_remove, nobs, neg_ct, same, prev
+
+
+@jit
+def _mean_value(window, total, nobs, neg_ct, same, prev):
+    if nobs < window or nobs == 0:
+        return np.nan
+    if same >= nobs:
+        return prev
+    result = total / nobs
+    if (neg_ct == 0 and result < 0) or (neg_ct == nobs and result > 0):
+        return 0.0
+    return result
+
+
+@jit
+def _var_add(val, nobs, mean, ssqdm, comp, unstable):
+    if val == val:
+        prev_m2 = ssqdm
+        nobs += 1
+        prev_mean = mean - comp
+        y = val - comp
+        t = y - mean
+        comp = t + mean - y
+        mean = mean + t / nobs
+        ssqdm = ssqdm + (val - prev_mean) * (val - mean)
+        if prev_m2 * _INV_COND_TOL > ssqdm:
+            unstable = 1.0
+    return nobs, mean, ssqdm, comp, unstable
+
+
+@jit
+def _var_remove(val, nobs, mean, ssqdm, comp, unstable):
+    if val == val:
+        prev_m2 = ssqdm
+        nobs -= 1
+        if nobs != 0:
+            prev_mean = mean - comp
+            y = val - comp
+            t = y - mean
+            comp = t + mean - y
+            mean = mean - t / nobs
+            ssqdm = ssqdm - (val - prev_mean) * (val - mean)
+            if prev_m2 * _INV_COND_TOL > ssqdm:
+                unstable = 1.0
+        else:
+            mean = ssqdm = unstable = 0.0
+    return nobs, mean, ssqdm, comp, unstable
+
+
+@jit
+def _var_step(values, i, c, window, reset, nobs, mean, ssqdm, comp_add, comp_remove, unstable):
+    """Slide the Welford window of column ``c`` on to row ``i``."""
+    if not reset:
+        if i >= window:
+            nobs, mean, ssqdm, comp_remove, unstable = _var_remove(
+                values[i - window, c], nobs, mean, ssqdm, comp_remove, unstable)
+        nobs, mean, ssqdm, comp_add, unstable = _var_add(values[i, c], nobs, mean, ssqdm, comp_add, unstable)
+    if reset or unstable != 0:
+        # catastrophic cancellation: rebuild from the window like pandas does
+        nobs = mean = ssqdm = comp_add = comp_remove = unstable = 0.0
+        for r in range(max(0, i - window + 1), i + 1):
+            nobs, mean, ssqdm, comp_add, unstable = _var_add(values[r, c], nobs, mean, ssqdm, comp_add, unstable)
+        unstable = 0.0
+    return nobs, mean, ssqdm, comp_add, comp_remove, unstable
+
+
+@jit
+def rolling_mean_chunk(values, start, windows, state, out):
+    """``rolling(window).mean()`` for ``values[start:]`` into ``out``."""
+    shared = values.shape[1] == 1
+    for j in range(out.shape[1]):
+        c = 0 if shared else j
+        window = windows[j]
+        total, comp_add, comp_remove, nobs, neg_ct, same, prev, started = state[j, 0], state[j, 1], \
+            state[j, 2], state[j, 3], state[j, 4], state[j, 5], state[j, 6], state[j, 7]
+        for i in range(start, values.shape[0]):
+            old = values[i - window, c] if i >= window else np.nan
+            total, comp_add, comp_remove, nobs, neg_ct, same, prev = _mean_step(
+                values[i, c], old, window == 1 or started == 0, total, comp_add, comp_remove, nobs, neg_ct, same, prev)
+            started = 1.0
+            out[i - start, j] = _mean_value(window, total, nobs, neg_ct, same, prev)
+        state[j, 0] = total
+        state[j, 1] = comp_add
+        state[j, 2] = comp_remove
+        state[j, 3] = nobs
+        state[j, 4] = neg_ct
+        state[j, 5] = same
+        state[j, 6] = prev
+        state[j, 7] = started
+
+
+@jit
+def rolling_var_chunk(values, start, windows, ddof, state, out):
+    """``rolling(window).var(ddof)`` for ``values[start:]`` into ``out``."""
+    shared = values.shape[1] == 1
+    for j in range(out.shape[1]):
+        c = 0 if shared else j
+        window = windows[j]
+        nobs, mean, ssqdm, comp_add, comp_remove, unstable, started = state[j, 0], state[j, 1], state[j, 2], \
+            state[j, 3], state[j, 4], state[j, 5], state[j, 6]
+        for i in range(start, values.shape[0]):
+            nobs, mean, ssqdm, comp_add, comp_remove, unstable = _var_step(
+                values, i, c, window, window == 1 or started == 0, nobs, mean, ssqdm, comp_add, comp_remove, unstable)
+            started = 1.0
+            if nobs >= max(window, 1) and nobs > ddof:
+                out[i - start, j] = ssqdm / (nobs - ddof)
+            else:
+                out[i - start, j] = np.nan
+        state[j, 0] = nobs
+        state[j, 1] = mean
+        state[j, 2] = ssqdm
+        state[j, 3] = comp_add
+        state[j, 4] = comp_remove
+        state[j, 5] = unstable
+        state[j, 6] = started
+
+
+@jit
+def rolling_zscore_chunk(values, start, windows, mean_state, var_state, out):
+    """``(x - rolling mean) / rolling std`` (a zero std counts as 1) for
+    ``values[start:]`` into ``out``, with the mean and variance windows slid
+    together in one pass."""
+    shared = values.shape[1] == 1
+    for j in range(out.shape[1]):
+        c = 0 if shared else j
+        window = windows[j]
+        total, comp_add, comp_remove, nobs, neg_ct, same, prev, started = mean_state[j, 0], mean_state[j, 1], \
+            mean_state[j, 2], mean_state[j, 3], mean_state[j, 4], mean_state[j, 5], mean_state[j, 6], mean_state[j, 7]
+        v_nobs, v_mean, ssqdm, v_comp_add, v_comp_remove, unstable = var_state[j, 0], var_state[j, 1], \
+            var_state[j, 2], var_state[j, 3], var_state[j, 4], var_state[j, 5]
+        for i in range(start, values.shape[0]):
+            val = values[i, c]
+            reset = window == 1 or started == 0
+            old = values[i - window, c] if i >= window else np.nan
+            total, comp_add, comp_remove, nobs, neg_ct, same, prev = _mean_step(
+                val, old, reset, total, comp_add, comp_remove, nobs, neg_ct, same, prev)
+            v_nobs, v_mean, ssqdm, v_comp_add, v_comp_remove, unstable = _var_step(
+                values, i, c, window, reset, v_nobs, v_mean, ssqdm, v_comp_add, v_comp_remove, unstable)
+            started = 1.0
+            var = ssqdm / (v_nobs - 1) if v_nobs >= max(window, 1) and v_nobs > 1 else np.nan
+            # rolling std is sqrt(var) clipped at zero
+            std = math.sqrt(var) if var > 0 else (0.0 if var == var else np.nan)
+            if std == 0:
+                std = 1.0
+            out[i - start, j] = (val - _mean_value(window, total, nobs, neg_ct, same, prev)) / std
+        mean_state[j, 0] = total
+        mean_state[j, 1] = comp_add
+        mean_state[j, 2] = comp_remove
+        mean_state[j, 3] = nobs
+        mean_state[j, 4] = neg_ct
+        mean_state[j, 5] = same
+        mean_state[j, 6] = prev
+        mean_state[j, 7] = started
+        var_state[j, 0] = v_nobs
+        var_state[j, 1] = v_mean
+        var_state[j, 2] = ssqdm
+        var_state[j, 3] = v_comp_add
+        var_state[j, 4] = v_comp_remove
+        var_state[j, 5] = unstable
+        var_state[j, 6] = started
+
+
+@jit
+def ewm_mean_chunk(values, coms, state, out):
+    """``ewm(com=com, adjust=False).mean()`` for ``values`` into ``out``."""
+    shared = values.shape[1] == 1
+    for j in range(out.shape[1]):
+        c = 0 if shared else j
+        com = coms[j]
+        weighted, old_wt, nobs, started = state[j, 0], state[j, 1], state[j, 2], state[j, 3]
+        alpha = 1.0 / (1.0 + com)
+        old_wt_factor = 1.0 - alpha
+        for i in range(values.shape[0]):
+            cur = values[i, c]
+            is_observation = cur == cur
+            if started == 0:
+                weighted = cur
+                old_wt = 1.0
+                nobs = 1.0 if is_observation else 0.0
+                started = 1.0
+            else:
+                if is_observation:
+                    nobs += 1
+                if weighted == weighted:
+                    # ignore_na=False: a missing value still decays the old weight
+                    old_wt *= old_wt_factor
+                    if is_observation:
+                        # avoid numerical errors on constant series
+                        if weighted != cur:
+                            new_wt = 1.0 - old_wt if com == 1 else alpha
+                            weighted = old_wt * weighted + new_wt * cur
+                            weighted /= (old_wt + new_wt)
+                        old_wt = 1.0
+                elif is_observation:
+                    weighted = cur
+            out[i, j] = weighted if nobs >= 1 else np.nan
+        state[j, 0] = weighted
+        state[j, 1] = old_wt
+        state[j, 2] = nobs
+        state[j, 3] = started
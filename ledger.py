@@ -0,0 +1,211 @@
+# ledger.py
+"""Columnar, array-backed trade ledger.
+
+Every field lives in its own preallocated NumPy array that doubles when
+full, so appends are O(1) amortized and a run of millions of trades never
+creates a Python object per trade. Sides are stored as int8 ``Side`` codes
+and assets as int32 codes into ``assets``. ``to_frame`` and ``to_arrow``
+wrap the filled part of the arrays without copying them.
+"""
+import enum
+
+import numpy as np
+import pandas as pd
+
+
+class Side(enum.IntEnum):
+    ENTER = 0
+    EXIT = 1
+
+
+SIDE_NAMES = ['enter', 'exit']
+
+# one row per trade; ``time`` is datetime64[ns] or int64 depending on the index traded
+TRADE_DTYPE = np.dtype([
+    ('time', 'M8[ns]'),
+    ('asset', 'i4'),
+    ('side', 'i1'),
+    ('position', 'f8'),
+    ('price', 'f8'),
+    ('cash', 'f8'),
+    ('fee', 'f8'),
+])
+
+
+def _time_values(times):
+    """(values, tz) for an array-like of timestamps, or of plain numbers."""
+    times = pd.Index(times) if not isinstance(times, pd.Index) else times
+    if isinstance(times, pd.DatetimeIndex):
+        tz = None if times.tz is None else str(times.tz)
+        if tz is not None:
+            times = times.tz_convert('UTC').tz_localize(None)
+        return times.as_unit('ns').to_numpy(), tz
+    return times.to_numpy(dtype='i8'), None
+
+
+class TradeLedger:
+    """Trades recorded by a backtest; see the module docstring."""
+
+    def __init__(self, capacity: int = 64, assets=None):
+        self.assets = list(assets) if assets is not None else None
+        self.tz = None
+        self._n = 0
+        self._columns = {name: np.empty(capacity, dtype=TRADE_DTYPE[name]) for name in TRADE_DTYPE.names}
+        self._time_set = False
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """View of one column over the recorded trades."""
+        return self._columns[name][:self._n]
+
+    def clear(self):
+        """Forget every trade, keeping the allocated capacity."""
+        self._n = 0
+        self._time_set = False
+        self.tz = None
+
+    def _reserve(self, extra: int):
+        needed = self._n + extra
+        capacity = len(self._columns['side'])
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity)
+        for name, values in self._columns.items():
+            grown = np.empty(capacity, dtype=values.dtype)
+            grown[:self._n] = values[:self._n]
+            self._columns[name] = grown
+
+    def _set_time_kind(self, values: np.ndarray, tz):
+        if self._time_set:
+            return
+        kind = values.dtype if values.dtype.kind == 'M' else np.dtype('i8')
+        if kind != self._columns['time'].dtype:
+            self._columns['time'] = self._columns['time'].view(kind)
+        self.tz = tz
+        self._time_set = True
+
+    def append(self, t, side: Side, position: float, price: float, cash: float, fee: float = 0.0, asset: int = 0):
+        """Record one trade."""
+        values, tz = _time_values([t])
+        self._set_time_kind(values, tz)
+        self._reserve(1)
+        i = self._n
+        cols = self._columns
+        cols['time'][i] = values[0]
+        cols['asset'][i] = asset
+        cols['side'][i] = side
+        cols['position'][i] = position
+        cols['price'][i] = price
+        cols['cash'][i] = cash
+        cols['fee'][i] = fee
+        self._n += 1
+
+    def extend(self, times, sides, positions, prices, cash, fees=0.0, assets=0):
+        """Record many trades at once; scalars broadcast over the batch."""
+        values, tz = _time_values(times)
+        n = len(values)
+        if n == 0:
+            return
+        self._set_time_kind(values, tz)
+        self._reserve(n)
+        end = self._n + n
+        for name, column in (('time', values), ('asset', assets), ('side', sides), ('position', positions),
+                             ('price', prices), ('cash', cash), ('fee', fees)):
+            self._columns[name][self._n:end] = column
+        self._n = end
+
+    @classmethod
+    def from_columns(cls, columns: dict, assets=None, tz=None) -> 'TradeLedger':
+        """Ledger over previously recorded columns (e.g. ``{name: ledger[name]}``
+        saved by results.py), used without copying; ``tz`` is the ledger's ``tz``."""
+        ledger = cls(0, assets)
+        ledger._columns = {name: np.asarray(columns[name]) for name in TRADE_DTYPE.names}
+        ledger._n = len(ledger._columns['side'])
+        ledger.tz = tz
+        ledger._time_set = ledger._n > 0
+        return ledger
+
+    @classmethod
+    def merge(cls, ledgers, assets=None) -> 'TradeLedger':
+        """One ledger holding every trade of ``ledgers`` in time order, the
+        i-th ledger's trades tagged as asset ``i``."""
+        ledgers = list(ledgers)
+        merged = cls(max(sum(len(l) for l in ledgers), 1), assets)
+        for code, ledger in enumerate(ledgers):
+            if len(ledger):
+                merged._set_time_kind(ledger['time'], ledger.tz)
+                merged.extend(ledger['time'], ledger['side'], ledger['position'], ledger['price'],
+                              ledger['cash'], ledger['fee'], code)
+        order = np.argsort(merged['time'], kind='stable')
+        for name in TRADE_DTYPE.names:
+            merged._columns[name][:merged._n] = merged[name][order]
+        return merged
+
+    def _times(self):
+        times = self['time']
+        if times.dtype.kind != 'M':
+            return times
+        index = pd.DatetimeIndex(times, copy=False)
+        return index.tz_localize('UTC').tz_convert(self.tz) if self.tz else index
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame view of the trades (columns share the ledger's memory)."""
+        codes = self['asset']
+        asset = pd.Categorical.from_codes(codes, self.assets) if self.assets is not None else codes
+        return pd.DataFrame({
+            'time': self._times(),
+            'asset': asset,
+            'side': pd.Categorical.from_codes(self['side'], SIDE_NAMES),
+            'position': self['position'],
+            'price': self['price'],
+            'cash': self['cash'],
+            'fee': self['fee'],
+        }, copy=False)
+
+    def to_arrow(self):
+        """pyarrow Table over the same buffers (requires pyarrow)."""
+        try:
+            import pyarrow
+        except ImportError:  # pragma: no cover - depends on the environment
+            raise ImportError("to_arrow requires pyarrow") from None
+        return pyarrow.table({name: self[name] for name in TRADE_DTYPE.names})
+
+    def to_records(self) -> np.ndarray:
+        """Copy of the trades as a structured array."""
+        out = np.empty(self._n, dtype=[(name, self._columns[name].dtype) for name in TRADE_DTYPE.names])
+        for name in TRADE_DTYPE.names:
+            out[name] = self[name]
+        return out
+
+    def round_trips(self) -> pd.DataFrame:
+        """One row per closed trade: entry/exit time and price, signed size,
+        PnL net of both fees, and holding time. Still-open positions are left out.
+        """
+        side, asset = self['side'], self['asset']
+        # stable sort by asset keeps each asset's enter/exit alternation
+        order = np.argsort(asset, kind='stable')
+        s, a = side[order], asset[order]
+        exit_at = np.flatnonzero((s[1:] == Side.EXIT) & (s[:-1] == Side.ENTER) & (a[1:] == a[:-1])) + 1
+        enter_idx, exit_idx = order[exit_at - 1], order[exit_at]
+        times = self._times()
+        position = self['position'][enter_idx]
+        entry_price, exit_price = self['price'][enter_idx], self['price'][exit_idx]
+        fee = self['fee']
+        entry_time, exit_time = times[enter_idx], times[exit_idx]
+        trips = pd.DataFrame({
+            'asset': asset[enter_idx] if self.assets is None else np.asarray(self.assets)[asset[enter_idx]],
+            'entry_time': entry_time,
+            'exit_time': exit_time,
+            'position': position,
+            'entry_price': entry_price,
+            'exit_price': exit_price,
+            'pnl': position * (exit_price - entry_price) - fee[enter_idx] - fee[exit_idx],
+            'holding': exit_time - entry_time,
+        })
+        return trips.sort_values('exit_time', kind='stable').reset_index(drop=True)
+
+    def turnover(self) -> float:
+        """Total traded notional, sum of |position| * price over every trade."""
+        return float(np.abs(self['position'] * self['price']).sum())
@@ -1,10 +1,15 @@
+import argparse
+import os
 import pandas as pd
 import numpy as np
-from backtester import Backtester
+from backtester import Backtester, PortfolioBacktester
+import profiling
+import report
+import results
 import utils
 from strategies import sma_crossover, rsi_meanrev, market_mood
 
-def run_single_asset_strategy(symbol: str, gen_signals_fn, start='2020-01-01'):
+def run_single_asset_strategy(symbol: str, gen_signals_fn, start='2020-01-01', renderer=None):
     df = utils.download_data(symbol, start=start)
     
     # Debug: print column names to verify
@@ -12,20 +17,25 @@ def run_single_asset_strategy(symbol: str, gen_signals_fn, start='2020-01-01'):
     
     # Use 'close' instead of 'adj_close' since that's what yfinance now returns
     price = df['close']
-    signals = gen_signals_fn(price)
-    bt = Backtester(price, cash=100000, commission=0.0)
-    equity = bt.run_signals(signals)
-    metrics = Backtester.performance_metrics(equity)
+
+    def compute():
+        bt = Backtester(price, cash=100000, commission=0.0)
+        equity = bt.run_signals(gen_signals_fn(price))
+        return equity, bt.history, Backtester.performance_metrics(equity)
+
+    # an identical earlier run comes straight from the result store
+    equity, _, metrics = results.memoize(price, gen_signals_fn, {}, {'cash': 100000, 'commission': 0.0}, compute,
+                                         info={'strategy': gen_signals_fn.__name__, 'symbols': [symbol]})
     print(f"\n=== {gen_signals_fn.__name__} on {symbol} ===")
     for k, v in metrics.items():
         print(f"{k}: {v}")
-    utils.plot_equity(equity, f"{gen_signals_fn.__name__}_{symbol}")
+    utils.plot_equity(equity, f"{gen_signals_fn.__name__}_{symbol}", renderer)
     return equity, metrics
 
-def run_market_mood(start='2020-01-01'):
+def run_market_mood(start='2020-01-01', renderer=None):
     # pair: BTC-USD vs QQQ
-    a = utils.download_data('BTC-USD', start=start)
-    b = utils.download_data('QQQ', start=start)
+    bars = utils.download_many(['BTC-USD', 'QQQ'], start=start)
+    a, b = bars['BTC-USD'], bars['QQQ']
     
     # Debug: print column names to verify
     print(f"Columns for BTC-USD: {a.columns.tolist()}")
@@ -34,27 +44,52 @@ def run_market_mood(start='2020-01-01'):
     # Use 'close' instead of 'adj_close' since that's what yfinance now returns
     price_a = a['close']
     price_b = b['close']
-    dfpos = market_mood.generate_pairs_signals(price_a, price_b)
-    # create synthetic combined equity: assume $100k initial, split into two legs of 50k each
-    init = 100000
-    notional = init / 2
-    # compute each leg equity
-    eq_a = (notional * (price_a.reindex(dfpos.index) / price_a.reindex(dfpos.index).iloc[0]) * (dfpos['pos_a'].replace(0, np.nan).ffill().fillna(0)))
-    eq_b = (notional * (price_b.reindex(dfpos.index) / price_b.reindex(dfpos.index).iloc[0]) * (dfpos['pos_b'].replace(0, np.nan).ffill().fillna(0)))
-    # combined equity (cash + mark-to-market). For simplicity, treat positions as fully invested when pos !=0
-    combined = eq_a.fillna(0) + eq_b.fillna(0) + (init - notional*(dfpos['pos_a'].abs().iloc[0] + dfpos['pos_b'].abs().iloc[0]))
-    combined.index = dfpos.index
-    utils.plot_equity(combined, 'market_mood_combined')
-    metrics = Backtester.performance_metrics(combined)
+    pair = pd.DataFrame({'BTC-USD': price_a, 'QQQ': price_b})
+
+    def compute():
+        dfpos = market_mood.generate_pairs_signals(price_a, price_b)
+        # both legs trade out of one $100k account
+        prices = pair.reindex(dfpos.index)
+        bt = PortfolioBacktester(prices, cash=100000, commission=0.0)
+        equity = bt.run_signals(dfpos.set_axis(prices.columns, axis=1))
+        return equity, bt.history, Backtester.performance_metrics(equity)
+
+    combined, _, metrics = results.memoize(pair, market_mood.generate_pairs_signals, {},
+                                           {'cash': 100000, 'commission': 0.0}, compute,
+                                           info={'strategy': 'generate_pairs_signals', 'symbols': list(pair.columns)})
+    utils.plot_equity(combined, 'market_mood_combined', renderer)
     print("\n=== Market Mood Detector (BTC vs QQQ) ===")
     for k, v in metrics.items():
         print(f"{k}: {v}")
     return combined, metrics
 
+def run_all():
+    # charts render on a background thread while the next strategy runs
+    with report.Renderer() as renderer:
+        # Run baselines
+        eq1, m1 = run_single_asset_strategy('QQQ', sma_crossover.generate_signals, renderer=renderer)
+        eq2, m2 = run_single_asset_strategy('QQQ', rsi_meanrev.generate_signals, renderer=renderer)
+        eq3, m3 = run_market_mood(renderer=renderer)
+        outcomes = {'SMA_QQQ': eq1, 'RSI_QQQ': eq2, 'MarketMood': eq3}
+        utils.compare_results(outcomes, renderer)
+        path = report.write_html(os.path.join(utils.OUTPUT_DIR, 'report.html'), outcomes,
+                                 pd.DataFrame({'SMA_QQQ': m1, 'RSI_QQQ': m2, 'MarketMood': m3}).T, renderer)
+    print(f'\nAll done. Plots saved to {utils.OUTPUT_DIR}/, report at {path}')
+
 if __name__ == '__main__':
-    # Run baselines
-    eq1, m1 = run_single_asset_strategy('QQQ', sma_crossover.generate_signals)
-    eq2, m2 = run_single_asset_strategy('QQQ', rsi_meanrev.generate_signals)
-    eq3, m3 = run_market_mood()
-    utils.compare_results({'SMA_QQQ': eq1, 'RSI_QQQ': eq2, 'MarketMood': eq3})
-    print('\nAll done. Plots saved to outputs/')
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Run the baseline strategies and save their plots.')
+    parser.add_argument('--profile', action='store_true', help='print a per-stage timing report')
+    parser.add_argument('--trace-memory', action='store_true', help='add net/peak bytes to the report')
+    parser.add_argument('--cprofile', metavar='PATH', help='also dump cProfile stats to PATH')
+    parser.add_argument('--folded', metavar='PATH', help='write folded stacks for flamegraph.pl/speedscope')
+    args = parser.parse_args()
+
+    if args.profile or args.trace_memory or args.cprofile or args.folded:
+        with profiling.profile(args.cprofile, trace_memory=args.trace_memory) as run:
+            run_all()
+        print('\n=== Timing report ===')
+        print(run.format_report())
+        if args.folded:
+            run.write_folded(args.folded)
+    else:
+        run_all()
@@ -0,0 +1,162 @@
+# metrics.py
+"""One definition of every performance statistic.
+
+``compute_metrics`` scores a single equity curve (Series / 1-D array) or a
+whole matrix of them (DataFrame / 2-D array, one curve per column) in one
+pass. Backtester.performance_metrics, utils.calculate_performance_metrics
+and the sweep tables all go through it.
+
+Definitions, with r_t the bar returns (r_0 = 0) and P bars per year:
+
+* total_return   e[-1] / e[0] - 1
+* ann_return     (1 + total_return) ** (P / n) - 1
+* ann_vol        std(r, ddof=1) * sqrt(P)
+* sharpe         mean(r) * P / ann_vol
+* sortino        mean(r) * P / (sqrt(mean(min(r, 0) ** 2)) * sqrt(P))
+* max_drawdown   min(e / running max - 1)
+* max_drawdown_duration  longest run of bars spent below a previous peak
+* calmar         ann_return / |max_drawdown|
+
+Ratios with a zero denominator are NaN.
+"""
+import numpy as np
+import pandas as pd
+
+import kernels
+import profiling
+from kernels import jit
+
+PERIODS_PER_YEAR = 252
+
+METRICS = ('total_return', 'ann_return', 'ann_vol', 'sharpe', 'sortino',
+           'max_drawdown', 'max_drawdown_duration', 'calmar')
+
+
+@jit
+def _scan_loop(e, out):
+    # single pass per column: Welford mean/variance of returns, downside
+    # second moment, running peak, drawdown depth and duration
+    n = e.shape[0]
+    for j in range(e.shape[1]):
+        mean = 0.0
+        m2 = 0.0
+        down = 0.0
+        peak = e[0, j]
+        max_dd = 0.0
+        run = 0
+        max_run = 0
+        for i in range(n):
+            x = e[i, j]
+            r = 0.0
+            if i > 0:
+                r = x / e[i - 1, j] - 1.0
+                if r != r:
+                    r = 0.0
+            delta = r - mean
+            mean += delta / (i + 1)
+            m2 += delta * (r - mean)
+            if r < 0:
+                down += r * r
+            if x > peak or peak != peak:
+                peak = x
+            dd = x / peak - 1.0
+            if dd < max_dd:
+                max_dd = dd
+            if dd < 0:
+                run += 1
+                if run > max_run:
+                    max_run = run
+            else:
+                run = 0
+        out[0, j] = mean
+        out[1, j] = np.sqrt(m2 / (n - 1)) if n > 1 else np.nan
+        out[2, j] = np.sqrt(down / n)
+        out[3, j] = max_dd
+        out[4, j] = max_run
+
+
+def _scan_numpy(e):
+    n = len(e)
+    returns = np.zeros(e.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(e[1:], e[:-1], out=returns[1:])
+    returns[1:] -= 1.0
+    returns[np.isnan(returns)] = 0.0
+    out = np.empty((5,) + e.shape[1:])
+    out[0] = returns.mean(axis=0)
+    out[1] = returns.std(axis=0, ddof=1) if n > 1 else np.nan
+    np.minimum(returns, 0.0, out=returns)
+    out[2] = np.sqrt((returns ** 2).mean(axis=0))
+    peak = np.fmax.accumulate(e, axis=0)
+    drawdown = e / peak - 1.0
+    out[3] = np.minimum(np.nanmin(drawdown, axis=0), 0.0)
+    below = drawdown < 0
+    run = np.cumsum(below, axis=0)
+    run -= np.maximum.accumulate(np.where(below, 0, run), axis=0)
+    out[4] = run.max(axis=0)
+    return out
+
+
+def _ratio(num, den):
+    num, den = np.broadcast_arrays(np.asarray(num, dtype=float), np.asarray(den, dtype=float))
+    out = np.full(num.shape, np.nan)
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+
+def trade_stats(history) -> dict:
+    """Round-trip statistics from a backtest's ``history`` (a TradeLedger).
+
+    A trade's PnL is its price move times its size, net of the entry and exit
+    commissions. Positions still open at the end are ignored.
+    """
+    trips = history.round_trips()
+    pnl = trips['pnl'].to_numpy()
+    wins, losses = pnl[pnl > 0].sum(), -pnl[pnl < 0].sum()
+    return {
+        'trades': len(pnl),
+        'win_rate': float((pnl > 0).mean()) if len(pnl) else np.nan,
+        'avg_trade_pnl': float(pnl.mean()) if len(pnl) else np.nan,
+        'profit_factor': float(wins / losses) if losses else (np.inf if wins else np.nan),
+        'avg_holding': trips['holding'].mean() if len(pnl) else np.nan,
+    }
+
+
+@profiling.stage('compute_metrics')
+def compute_metrics(equity, history=None, periods: int = PERIODS_PER_YEAR):
+    """Performance metrics for one equity curve (returns a dict) or for every
+    column of a 2-D equity matrix (returns a DataFrame, one row per column).
+
+    ``history`` (1-D only) adds the trade statistics from ``trade_stats``.
+    """
+    values = np.asarray(equity, dtype=float)
+    matrix = values if values.ndim == 2 else values.reshape(len(values), 1)
+    n = len(matrix)
+    if kernels.load_numba() is not None:
+        stats = np.empty((5, matrix.shape[1]))
+        _scan_loop(np.ascontiguousarray(matrix), stats)
+    else:
+        stats = _scan_numpy(matrix)
+    mean, std, downside, max_dd, duration = stats
+
+    total_return = matrix[-1] / matrix[0] - 1.0
+    ann_return = (1 + total_return) ** (periods / n) - 1 if n > 1 else np.zeros(matrix.shape[1])
+    ann_vol = std * np.sqrt(periods)
+    table = {
+        'total_return': total_return,
+        'ann_return': ann_return,
+        'ann_vol': ann_vol,
+        'sharpe': _ratio(mean * periods, ann_vol),
+        'sortino': _ratio(mean * periods, downside * np.sqrt(periods)),
+        'max_drawdown': max_dd,
+        'max_drawdown_duration': duration,
+        'calmar': _ratio(ann_return, np.abs(max_dd)),
+    }
+    if values.ndim == 2:
+        index = equity.columns if isinstance(equity, pd.DataFrame) else None
+        return pd.DataFrame(table, index=index)
+    result = {k: float(v[0]) for k, v in table.items()}
+    result['max_drawdown_duration'] = int(result['max_drawdown_duration'])
+    if history is not None:
+        result.update(trade_stats(history))
+    return result
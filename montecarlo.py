@@ -0,0 +1,223 @@
+# montecarlo.py
+"""Monte Carlo robustness tests: how much of a backtest result is luck?
+
+``run_montecarlo`` resamples a price history into thousands of synthetic
+paths and backtests a strategy on every one of them:
+
+* ``'bootstrap'``: circular block bootstrap of log returns; blocks of
+  ``block`` bars keep short-range autocorrelation and volatility clustering.
+* ``'gbm'``: geometric Brownian motion with the history's drift and
+  volatility (and, for pairs, the legs' correlation).
+
+Pairs resample both legs with the same blocks or correlated shocks, so the
+spread keeps its dependence. Paths are generated, turned into positions
+(the strategies' ``*_paths`` functions) and backtested as (bars x paths)
+matrices, ``batch_size`` paths at a time on a process pool. Each batch gets
+its own seed spawned from ``seed``, so results don't depend on the number of
+workers.
+
+``shuffle_trades`` instead reorders (or resamples) the closed trades of one
+backtest, which moves drawdowns but not the total PnL of a plain shuffle.
+
+Both return one row of metrics per path plus ``confidence_intervals``.
+
+    paths, summary = montecarlo.run_montecarlo(price, 'sma_crossover', {'short_window': 20}, n_paths=10_000)
+    summary.loc[['sharpe', 'max_drawdown', 'total_return']]
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import metrics
+import profiling
+from backtester import _simulate
+from strategies import sma_crossover, rsi_meanrev, market_mood
+
+METHODS = ('bootstrap', 'gbm')
+# strategy name -> positions for every column of a (bars x paths) price matrix;
+# market_mood takes the two legs' matrices
+PATH_SIGNALS = {
+    'sma_crossover': sma_crossover.generate_signals_paths,
+    'rsi_meanrev': rsi_meanrev.generate_signals_paths,
+    'market_mood': market_mood.generate_pairs_signals_paths,
+}
+PAIR_STRATEGIES = {'market_mood'}
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_LEVELS = (0.05, 0.95)
+
+
+def _price_matrix(price, strategy: str) -> np.ndarray:
+    """(bars x legs) prices with missing bars dropped, as the strategies do for pairs."""
+    if strategy in PAIR_STRATEGIES:
+        frame = pd.DataFrame({'a': price[0], 'b': price[1]}).dropna()
+    else:
+        frame = pd.Series(price).dropna().to_frame()
+    if len(frame) < 3:
+        raise ValueError("need at least 3 prices to resample")
+    return frame.to_numpy(dtype=float)
+
+
+def _grow(first: np.ndarray, log_returns: np.ndarray) -> np.ndarray:
+    """(bars x legs x paths) prices from (bars - 1 x legs x paths) log returns."""
+    paths = np.empty((len(log_returns) + 1,) + log_returns.shape[1:])
+    paths[0] = first[:, None]
+    np.cumsum(log_returns, axis=0, out=paths[1:])
+    np.exp(paths[1:], out=paths[1:])
+    paths[1:] *= first[:, None]
+    return paths
+
+
+def bootstrap_paths(prices: np.ndarray, n_paths: int, block: int = 20, rng=None) -> np.ndarray:
+    """(bars x legs x paths) circular block-bootstrap resamples of a
+    (bars x legs) price matrix, each starting from its first prices. Every
+    leg draws the same blocks."""
+    rng = np.random.default_rng(rng)
+    returns = np.diff(np.log(prices), axis=0)
+    m = len(returns)
+    block = max(1, min(int(block), m))
+    starts = rng.integers(0, m, size=(-(-m // block), n_paths))
+    # (blocks x block x paths) return indices, wrapping around the end
+    index = (starts[:, None, :] + np.arange(block)[None, :, None]) % m
+    index = index.reshape(-1, n_paths)[:m]
+    return _grow(prices[0], returns[index].transpose(0, 2, 1))
+
+
+def gbm_paths(prices: np.ndarray, n_paths: int, rng=None) -> np.ndarray:
+    """(bars x legs x paths) geometric Brownian motion paths with the mean
+    and covariance of the (bars x legs) price matrix's log returns."""
+    rng = np.random.default_rng(rng)
+    returns = np.diff(np.log(prices), axis=0)
+    drift = returns.mean(axis=0)
+    cov = np.atleast_2d(np.cov(returns, rowvar=False))
+    # a square root of the covariance that tolerates (near-)singular matrices
+    w, v = np.linalg.eigh(cov)
+    scale = v * np.sqrt(np.clip(w, 0.0, None))
+    shocks = rng.standard_normal((len(returns), n_paths, len(drift))) @ scale.T + drift
+    return _grow(prices[0], shocks.transpose(0, 2, 1))
+
+
+def backtest_paths(paths: np.ndarray, strategy: str, params: dict = None, cash: float = 100000,
+                   commission: float = 0.0, pct_risk: float = 0.1) -> np.ndarray:
+    """(bars x paths) equity of ``strategy`` on every (bars x legs x paths)
+    price path: Backtester.run_signals semantics for one leg,
+    PortfolioBacktester's long A / short B for pairs."""
+    params = params or {}
+    notional = cash * pct_risk
+    if strategy in PAIR_STRATEGIES:
+        pos_a = PATH_SIGNALS[strategy](paths[:, 0], paths[:, 1], **params).astype(float)
+        _, position, cash_flow, _, _ = _simulate(paths, np.stack([pos_a, -pos_a], axis=1), 0.0, notional, commission)
+        return cash + cash_flow.sum(axis=1) + np.where(position != 0, position * paths, 0.0).sum(axis=1)
+    price = paths[:, 0]
+    signals = PATH_SIGNALS[strategy](price, **params).astype(float)
+    return _simulate(price, signals, cash, notional, commission)[0]
+
+
+def _run_batch(task) -> pd.DataFrame:
+    prices, strategy, params, method, n_paths, block, seed, cash, commission, pct_risk = task
+    rng = np.random.default_rng(seed)
+    if method == 'bootstrap':
+        paths = bootstrap_paths(prices, n_paths, block, rng)
+    else:
+        paths = gbm_paths(prices, n_paths, rng)
+    equity = backtest_paths(paths, strategy, params, cash, commission, pct_risk)
+    # a path can end below zero (ruin), where annualizing the return is undefined
+    with np.errstate(invalid='ignore'):
+        return metrics.compute_metrics(equity)
+
+
+def confidence_intervals(table: pd.DataFrame, levels=DEFAULT_LEVELS, actual: dict = None) -> pd.DataFrame:
+    """Per metric (row): mean, std, the ``levels`` quantiles and median of
+    the per-path ``table``, NaNs skipped, and the ``actual`` value if given."""
+    low, high = levels
+    summary = pd.DataFrame({
+        'mean': table.mean(),
+        'std': table.std(),
+        f'p{100 * low:g}': table.quantile(low),
+        'p50': table.quantile(0.5),
+        f'p{100 * high:g}': table.quantile(high),
+    })
+    if actual is not None:
+        summary['actual'] = pd.Series(actual).reindex(summary.index)
+    return summary
+
+
+@profiling.stage('montecarlo.run_montecarlo')
+def run_montecarlo(price, strategy: str, params: dict = None, method: str = 'bootstrap', n_paths: int = 10_000,
+                   block: int = 20, cash: float = 100000, commission: float = 0.0, pct_risk: float = 0.1,
+                   seed: int = 0, batch_size: int = DEFAULT_BATCH_SIZE, max_workers: int = None,
+                   levels=DEFAULT_LEVELS):
+    """Backtest ``strategy`` on ``n_paths`` resampled versions of ``price``.
+
+    ``price`` is a Series, or an ``(a, b)`` pair for a pair strategy; missing
+    bars are dropped first. ``params`` are the strategy's keyword arguments.
+    Batches run on up to ``max_workers`` processes (inline with 1).
+
+    Returns ``(paths, summary)``: ``paths`` has one row of metrics per path
+    and ``summary`` is confidence_intervals at ``levels``, with the strategy
+    on the historical prices as ``actual``.
+    """
+    if strategy not in PATH_SIGNALS:
+        raise ValueError(f"unknown strategy {strategy!r}, expected one of {sorted(PATH_SIGNALS)}")
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}, got {method!r}")
+    if n_paths < 1 or batch_size < 1:
+        raise ValueError("n_paths and batch_size must be >= 1")
+    params = dict(params or {})
+    prices = _price_matrix(price, strategy)
+    sizes = [min(batch_size, n_paths - i) for i in range(0, n_paths, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(prices, strategy, params, method, size, block, s, cash, commission, pct_risk)
+             for size, s in zip(sizes, seeds)]
+    max_workers = max_workers or min(os.cpu_count() or 1, 8)
+    if max_workers == 1 or len(tasks) == 1:
+        tables = [_run_batch(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(min(max_workers, len(tasks))) as pool:
+            tables = list(pool.map(_run_batch, tasks))
+    table = pd.concat(tables, ignore_index=True).rename_axis('path')
+    actual = metrics.compute_metrics(backtest_paths(prices[:, :, None], strategy, params, cash, commission,
+                                                    pct_risk)[:, 0])
+    return table, confidence_intervals(table, levels, actual)
+
+
+def _trades_per_year(trips: pd.DataFrame) -> float:
+    span = trips['exit_time'].max() - trips['entry_time'].min()
+    if isinstance(span, pd.Timedelta):
+        years = span / pd.Timedelta(days=365.25)
+    else:
+        # bar numbers
+        years = span / metrics.PERIODS_PER_YEAR
+    return len(trips) / years if years > 0 else metrics.PERIODS_PER_YEAR
+
+
+@profiling.stage('montecarlo.shuffle_trades')
+def shuffle_trades(history, n_paths: int = 10_000, cash: float = 100000, replace: bool = False, seed: int = 0,
+                   periods: float = None, levels=DEFAULT_LEVELS):
+    """Metrics over ``n_paths`` reorderings of a backtest's closed trades.
+
+    ``history`` is a TradeLedger or its ``round_trips()`` frame. Each path
+    applies every trade's PnL once in a random order (``replace=True`` draws
+    trades with replacement instead, so the total varies too), stepping
+    equity once per trade; ratios are annualized with ``periods`` trades per
+    year, by default the log's own trade rate. Returns ``(paths, summary)``
+    like run_montecarlo, ``actual`` being the trades in their real order.
+    """
+    trips = history.round_trips() if hasattr(history, 'round_trips') else history
+    pnl = trips['pnl'].to_numpy(dtype=float)
+    if len(pnl) == 0:
+        raise ValueError("the trade log has no closed trades")
+    periods = periods or _trades_per_year(trips)
+    rng = np.random.default_rng(seed)
+    if replace:
+        order = rng.integers(0, len(pnl), size=(len(pnl), n_paths))
+    else:
+        order = rng.permuted(np.broadcast_to(np.arange(len(pnl))[:, None], (len(pnl), n_paths)), axis=0)
+    equity = np.empty((len(pnl) + 1, n_paths))
+    equity[0] = cash
+    np.cumsum(pnl[order], axis=0, out=equity[1:])
+    equity[1:] += cash
+    table = metrics.compute_metrics(equity, periods=periods).rename_axis('path')
+    actual = metrics.compute_metrics(cash + np.concatenate([[0.0], np.cumsum(pnl)]), periods=periods)
+    return table, confidence_intervals(table, levels, actual)
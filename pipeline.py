@@ -0,0 +1,122 @@
+# pipeline.py
+"""Dashboard compute pipeline split into cacheable stages.
+
+prices -> indicators (sma / rsi / zscore) -> positions -> backtest
+
+Every stage takes only plain, hashable arguments and calls its upstream
+stages through this module, so once the stages are wrapped by a cache (see
+``use_cache``) changing one parameter only recomputes the stages that
+depend on it. By default each stage is an in-process LRU cache; app.py
+swaps in ``st.cache_data`` so results are shared across reruns and users.
+"""
+import functools
+import sys
+
+import numpy as np
+import pandas as pd
+
+import indicators
+import profiling
+import results
+import utils
+from backtester import Backtester, PortfolioBacktester
+from execution import ExecutionModel, Percent
+from strategies import sma_crossover, rsi_meanrev, market_mood
+
+DEFAULT_MAX_ENTRIES = 128
+# the strategy code behind each dashboard strategy, part of its result-store key
+STRATEGY_MODULES = {
+    'SMA Crossover': sma_crossover,
+    'RSI Mean Reversion': rsi_meanrev,
+    'Market Mood Detector': market_mood,
+}
+
+
+def prices(symbol: str, start, end) -> pd.Series:
+    return utils.download_data(symbol, start=start, end=end)['close']
+
+
+def sma(symbol: str, start, end, window: int) -> np.ndarray:
+    return indicators.rolling_mean(prices(symbol, start, end).to_numpy(), window)
+
+
+def rsi(symbol: str, start, end, period: int) -> np.ndarray:
+    return rsi_meanrev.rsi(prices(symbol, start, end), period).to_numpy()
+
+
+def aligned_pair(symbol_a: str, symbol_b: str, start, end) -> pd.DataFrame:
+    a, b = prices(symbol_a, start, end), prices(symbol_b, start, end)
+    return pd.DataFrame({'a': a, 'b': b}, copy=False).dropna()
+
+
+def zscore(symbol_a: str, symbol_b: str, start, end, window: int) -> np.ndarray:
+    df = aligned_pair(symbol_a, symbol_b, start, end)
+    return market_mood.zscore(df['a'] - df['b'], window)
+
+
+def positions(strategy: str, symbols: tuple, start, end, params: tuple) -> pd.Series:
+    """Held positions (of the first asset for pairs) for one parameter set.
+
+    params are (short_window, long_window) for 'SMA Crossover', (low, high,
+    period) for 'RSI Mean Reversion' and (window, entry_z, exit_z) for
+    'Market Mood Detector'.
+    """
+    if strategy == 'SMA Crossover':
+        short_window, long_window = params
+        values = sma_crossover.positions_from_averages(sma(symbols[0], start, end, short_window),
+                                                        sma(symbols[0], start, end, long_window))
+        index = prices(symbols[0], start, end).index
+    elif strategy == 'RSI Mean Reversion':
+        low, high, period = params
+        values = rsi_meanrev.positions_from_rsi(rsi(symbols[0], start, end, period), low, high)
+        index = prices(symbols[0], start, end).index
+    elif strategy == 'Market Mood Detector':
+        window, entry_z, exit_z = params
+        values = market_mood.positions_from_zscore(zscore(*symbols, start, end, window), entry_z, exit_z)
+        index = aligned_pair(*symbols, start, end).index
+    else:
+        raise ValueError(f"unknown strategy {strategy!r}")
+    return pd.Series(values, index=index, name='position', copy=False)
+
+
+def backtest(strategy: str, symbols: tuple, start, end, params: tuple, cash: float, commission: float):
+    """(equity, metrics) for one strategy run; ``commission`` is a fraction
+    of traded notional (0.001 = 0.1%). Runs are memoized in the default
+    result store (see results.py), so they survive restarts."""
+    if strategy not in STRATEGY_MODULES:
+        raise ValueError(f"unknown strategy {strategy!r}")
+    pair = strategy == 'Market Mood Detector'
+    data = aligned_pair(*symbols, start, end) if pair else prices(symbols[0], start, end)
+
+    def compute():
+        pos = positions(strategy, symbols, start, end, params)
+        model = ExecutionModel(commission=Percent(commission))
+        if pair:
+            bt = PortfolioBacktester(data, cash=cash)
+            equity = bt.run_signals(pd.DataFrame({'a': pos, 'b': -pos}, copy=False), execution=model)
+        else:
+            bt = Backtester(data, cash=cash)
+            equity = bt.run_signals(pos, execution=model)
+        return equity, bt.history, Backtester.performance_metrics(equity)
+
+    info = {'strategy': strategy, 'symbols': symbols, 'start': str(start), 'end': str(end), 'params': params}
+    equity, _, metrics = results.memoize(data, (strategy, sys.modules[__name__], STRATEGY_MODULES[strategy]),
+                                         params, {'cash': float(cash), 'commission': float(commission)}, compute, info)
+    return equity, metrics
+
+
+_STAGES = {fn.__name__: fn for fn in (prices, sma, rsi, aligned_pair, zscore, positions, backtest)}
+
+
+def use_cache(decorator):
+    """Wrap every stage with ``decorator`` (e.g. ``st.cache_data(max_entries=...)``).
+
+    Stages look each other up through the module namespace, so the wrapped
+    versions are what upstream calls hit.
+    """
+    for name, fn in _STAGES.items():
+        # instrumented inside the cache, so profiles show only the stages that actually ran
+        globals()[name] = decorator(profiling.stage(f'pipeline.{name}')(fn))
+
+
+use_cache(functools.lru_cache(maxsize=DEFAULT_MAX_ENTRIES))
@@ -0,0 +1,78 @@
+# precision.py
+"""Reduced-memory mode: float32 backtests and int8 positions.
+
+By default the backtesters work on float64 prices, cash and equity, and the
+strategies return int64 positions. In ``float32`` mode the backtesters
+(including the execution models) run on float32 arrays instead, and the
+strategies return int8 positions. Positions are -1/0/1, so int8 holds them
+exactly and takes an eighth of the memory. A backtest then needs about half
+the memory, and a parameter grid's position matrix an eighth of it
+(``python -m benchmarks.memory`` measures both).
+
+Indicators are still computed in float64 from the original prices, so the
+signals and trades are the same in both modes. Only the backtest arithmetic
+loses precision:
+
+* prices are rounded to float32, a relative error of at most 2**-24 (6e-8);
+* cash adds one rounding per trade and one per fee, so after T trades cash
+  and equity are within about (4T + 2) * 2**-24 * max|equity| of the float64
+  run. That is under $25 per 1,000 trades on $100,000, and the error is
+  usually far smaller because roundings tend to cancel;
+* metrics.py accumulates in float64, so the metrics lose no further
+  precision. Bar returns are only as good as the curve, though, and a curve
+  that nears zero equity magnifies the error.
+
+Loop-engine runs (engine='loop', on_bar) stay in float64. The mode applies
+to the whole process. Select it with the QUANT_GYM_PRECISION environment
+variable, which batch and service worker processes inherit, or in code:
+
+    QUANT_GYM_PRECISION=float32 python batch.py --symbols-file universe.txt
+
+    with precision.using('float32'):
+        equity = Backtester(price).run_signals(sma_crossover.generate_signals(price))
+"""
+import contextlib
+import os
+
+import numpy as np
+
+MODES = ('float64', 'float32')
+
+
+def _check(mode: str) -> str:
+    if mode not in MODES:
+        raise ValueError(f"unknown precision {mode!r}, expected one of {MODES}")
+    return mode
+
+
+_mode = _check(os.environ.get('QUANT_GYM_PRECISION') or 'float64')
+
+
+def mode() -> str:
+    return _mode
+
+
+def set_mode(mode: str):
+    global _mode
+    _mode = _check(mode)
+
+
+@contextlib.contextmanager
+def using(mode: str):
+    """Run the block in precision ``mode``, restoring the previous one afterwards."""
+    previous = _mode
+    set_mode(mode)
+    try:
+        yield
+    finally:
+        set_mode(previous)
+
+
+def float_dtype() -> np.dtype:
+    """dtype of backtest prices, cash and equity."""
+    return np.dtype(_mode)
+
+
+def signal_dtype() -> np.dtype:
+    """dtype of strategy positions."""
+    return np.dtype(np.int8) if _mode == 'float32' else np.dtype(np.int64)
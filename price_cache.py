@@ -0,0 +1,440 @@
+# price_cache.py
+import contextlib
+import json
+import os
+import random
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: entries are only locked within a process
+    fcntl = None
+
+DEFAULT_ROOT = os.environ.get('QUANT_GYM_CACHE_DIR', os.path.join('.cache', 'prices'))
+DEFAULT_MAX_BYTES = 1 << 30
+# bulk fetches: concurrent downloads, and requests per second to the remote source
+DEFAULT_FETCH_WORKERS = 8
+DEFAULT_FETCH_RATE = 4.0
+
+COLUMN_MAPPING = {
+    "Adj Close": "close",
+    "Close": "close",
+    "Open": "open",
+    "High": "high",
+    "Low": "low",
+    "Volume": "volume"
+}
+
+
+def standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Flatten yfinance's MultiIndex columns and map them to lower-case names."""
+    # SIMPLIFIED: Always use the first level of MultiIndex and rename
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    df = df.rename(columns=COLUMN_MAPPING)
+    # "Adj Close" and "Close" can both map to close; keep the first
+    df = df.loc[:, ~df.columns.duplicated()]
+    # Ensure we have close price
+    if 'close' not in df.columns and len(df.columns) > 0:
+        df['close'] = df.iloc[:, 0]  # Use first column as close price
+    return df
+
+
+class PriceSource:
+    """Where the cache gets bars it doesn't have yet.
+
+    ``fetch`` returns a DataFrame with standardized columns for the bars in
+    ``[start, end)``.
+    """
+
+    def fetch(self, symbol: str, start: pd.Timestamp, end: pd.Timestamp, interval: str = '1d') -> pd.DataFrame:
+        raise NotImplementedError
+
+
+class YahooSource(PriceSource):
+    def fetch(self, symbol, start, end, interval='1d'):
+        import yfinance as yf
+        # concurrency comes from PriceCache.get_many, not yfinance's own threads
+        df = yf.download(symbol, start=start, end=end, interval=interval, progress=False, threads=False)
+        return standardize_columns(df)
+
+
+class FrameSource(PriceSource):
+    """Serves bars from in-memory DataFrames, keyed by symbol (or (symbol, interval))."""
+
+    def __init__(self, frames: dict):
+        self.frames = frames
+
+    def fetch(self, symbol, start, end, interval='1d'):
+        df = self.frames.get((symbol, interval), self.frames.get(symbol))
+        if df is None:
+            raise LookupError(f"no local data for {symbol} ({interval})")
+        idx = df.index
+        return df[(idx >= _localize(start, idx)) & (idx < _localize(end, idx))]
+
+
+class CsvSource(FrameSource):
+    """Serves bars from ``<directory>/<symbol>.csv`` files with a date index column."""
+
+    def __init__(self, directory: str):
+        super().__init__({})
+        self.directory = directory
+
+    def fetch(self, symbol, start, end, interval='1d'):
+        if symbol not in self.frames:
+            path = os.path.join(self.directory, f'{symbol}.csv')
+            self.frames[symbol] = standardize_columns(pd.read_csv(path, index_col=0, parse_dates=True))
+        return super().fetch(symbol, start, end, interval)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``acquire`` blocks so that at most ``rate``
+    calls per second go through on average, in bursts of up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float = None, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class ThrottledSource(PriceSource):
+    """Wraps another source with token-bucket rate limiting and retries.
+
+    Failed fetches are retried up to ``retries`` times with exponential
+    backoff (``backoff * 2**attempt`` seconds, jittered, capped at
+    ``max_backoff``). LookupError and ValueError mean the data doesn't exist
+    and are raised straight away.
+    """
+    PERMANENT = (LookupError, ValueError)
+
+    def __init__(self, source: PriceSource, rate: float = DEFAULT_FETCH_RATE, burst: float = None,
+                 retries: int = 3, backoff: float = 0.5, max_backoff: float = 30.0, sleep=time.sleep):
+        self.source = source
+        self.bucket = TokenBucket(rate, burst, sleep=sleep)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+
+    def fetch(self, symbol, start, end, interval='1d'):
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            try:
+                return self.source.fetch(symbol, start, end, interval)
+            except self.PERMANENT:
+                raise
+            except Exception:
+                if attempt == self.retries:
+                    raise
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+            self.sleep(delay * (0.5 + random.random() / 2))
+
+
+# one lock per cache entry directory, shared by every PriceCache in the process,
+# so concurrent requests for the same symbol fetch it once and then hit the cache
+_entry_locks = {}
+_entry_locks_guard = threading.Lock()
+
+
+def _entry_lock(path: str) -> threading.Lock:
+    key = os.path.abspath(path)
+    with _entry_locks_guard:
+        return _entry_locks.setdefault(key, threading.Lock())
+
+
+@contextlib.contextmanager
+def _locked(path: str, shared: bool = False):
+    """Hold the cache entry at ``path``: its thread lock, then an ``flock`` on
+    ``<path>.lock`` so other processes on the same cache directory (batch
+    pool or service workers) neither interleave their writes with ours nor
+    read a half-written entry. ``shared`` readers don't exclude each other."""
+    with _entry_lock(path):
+        lock = None
+        if fcntl is not None:
+            try:
+                if not shared:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                lock = open(f'{path}.lock', 'a')
+            except OSError:
+                # nothing cached for the symbol yet, or a read-only cache
+                pass
+        if lock is None:
+            yield
+            return
+        with lock:
+            fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+
+
+def _localize(ts: pd.Timestamp, index: pd.Index) -> pd.Timestamp:
+    tz = getattr(index, 'tz', None)
+    if tz is not None and ts.tzinfo is None:
+        return ts.tz_localize(tz)
+    return ts
+
+
+def _window(df: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    """Rows of the date-sorted ``df`` in ``[start, end)``, as a view rather than a copy."""
+    idx = df.index
+    lo, hi = idx.searchsorted([_localize(start, idx), _localize(end, idx)])
+    return df.iloc[lo:hi]
+
+
+def _touch(path: str):
+    # explicit timestamps: implicit ones use the coarse kernel clock and can tie
+    now = time.time_ns()
+    os.utime(path, ns=(now, now))
+
+
+def _tmp_name(path: str) -> str:
+    return f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
+def _atomic_save(path: str, array: np.ndarray):
+    tmp = _tmp_name(path)
+    with open(tmp, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+class PriceCache:
+    """On-disk cache of OHLCV bars keyed by symbol and interval.
+
+    Each entry is a directory of memory-mappable ``.npy`` columns plus a
+    ``meta.json`` recording the date range the source has answered with bars
+    (up to today at most). Requests outside that range only fetch the
+    missing part. Entries
+    are evicted least-recently-used once the cache exceeds ``max_bytes``. In
+    offline mode the source is never called and only cached bars are returned.
+    ``get`` holds the entry's lock (see _locked) while it reads and fills it,
+    so threads and processes sharing a cache directory fetch each range once.
+    """
+
+    def __init__(self, root: str = DEFAULT_ROOT, source: PriceSource = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES, offline: bool = False):
+        self.root = root
+        self.source = source if source is not None else YahooSource()
+        self.max_bytes = max_bytes
+        self.offline = offline
+
+    def _path(self, symbol: str, interval: str) -> str:
+        safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in symbol)
+        return os.path.join(self.root, safe, interval)
+
+    def _read_meta(self, path: str):
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def load(self, symbol: str, interval: str = '1d', mmap: bool = True) -> pd.DataFrame:
+        """Everything cached for ``symbol``, or None. Columns are memory-mapped
+        unless ``mmap`` is False."""
+        path = self._path(symbol, interval)
+        meta = self._read_meta(path)
+        if meta is None:
+            return None
+        mode = 'r' if mmap else None
+        index = pd.DatetimeIndex(np.load(os.path.join(path, 'index.npy')), name=meta['index_name'])
+        if meta['tz'] is not None:
+            index = index.tz_localize('UTC').tz_convert(meta['tz'])
+        # plain ndarray views of the maps, so pandas treats them like any other column
+        columns = {c: np.load(os.path.join(path, f'{c}.npy'), mmap_mode=mode).view(np.ndarray)
+                   for c in meta['columns']}
+        _touch(os.path.join(path, 'meta.json'))
+        return pd.DataFrame(columns, index=index, copy=False)
+
+    def _store(self, symbol: str, interval: str, df: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp):
+        path = self._path(symbol, interval)
+        os.makedirs(path, exist_ok=True)
+        index = pd.DatetimeIndex(df.index)
+        columns = list(df.columns)
+        # naive datetime64 (UTC for tz-aware indexes)
+        naive = index if index.tz is None else index.tz_convert('UTC').tz_localize(None)
+        _atomic_save(os.path.join(path, 'index.npy'), naive.to_numpy())
+        for c in columns:
+            _atomic_save(os.path.join(path, f'{c}.npy'), df[c].to_numpy())
+        meta = {
+            'symbol': symbol,
+            'interval': interval,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'columns': columns,
+            'tz': None if index.tz is None else str(index.tz),
+            'index_name': index.name,
+        }
+        tmp = _tmp_name(os.path.join(path, 'meta.json'))
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(path, 'meta.json'))
+        _touch(os.path.join(path, 'meta.json'))
+        self._evict(keep=path)
+
+    def _entries(self):
+        """(last access time, size in bytes, path) for every cached entry."""
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for symbol in os.listdir(self.root):
+            try:
+                intervals = os.listdir(os.path.join(self.root, symbol))
+            except FileNotFoundError:
+                continue
+            for interval in intervals:
+                if interval.endswith('.lock'):
+                    continue
+                path = os.path.join(self.root, symbol, interval)
+                meta = os.path.join(path, 'meta.json')
+                try:
+                    size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                    entries.append((os.path.getmtime(meta), size, path))
+                except FileNotFoundError:
+                    # not written yet, or being written / evicted by another thread
+                    continue
+        return entries
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self, keep: str = None):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def get(self, symbol: str, start, end, interval: str = '1d') -> pd.DataFrame:
+        """Bars for ``symbol`` in ``[start, end)``, topping up the cache from the
+        source for any part of the range it hasn't covered yet. Bars already
+        cached come back as read-only views of the memory-mapped columns;
+        copy them before modifying them in place."""
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        with _locked(self._path(symbol, interval), shared=self.offline):
+            return self._get(symbol, start, end, interval)
+
+    def get_many(self, requests, max_workers: int = DEFAULT_FETCH_WORKERS, return_exceptions: bool = False) -> list:
+        """``get`` for many ``(symbol, start, end[, interval])`` requests at once.
+
+        Requests for the same symbol and interval are coalesced into a single
+        ``get`` over the union of their ranges; distinct symbols are fetched
+        concurrently on up to ``max_workers`` threads. Returns one DataFrame
+        per request, in order. With ``return_exceptions`` a failed request
+        gives its exception instead of raising it.
+        """
+        requests = [(r[0], pd.Timestamp(r[1]), pd.Timestamp(r[2]), r[3] if len(r) > 3 else '1d') for r in requests]
+        ranges = {}
+        for symbol, start, end, interval in requests:
+            s, e = ranges.get((symbol, interval), (start, end))
+            ranges[(symbol, interval)] = (min(s, start), max(e, end))
+
+        def fetch(key):
+            (symbol, interval), (start, end) = key
+            try:
+                return self.get(symbol, start, end, interval)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max(1, min(max_workers, len(ranges)))) as pool:
+            frames = dict(zip(ranges, pool.map(fetch, ranges.items())))
+
+        results = []
+        for symbol, start, end, interval in requests:
+            df = frames[(symbol, interval)]
+            if isinstance(df, Exception):
+                if not return_exceptions:
+                    raise df
+                results.append(df)
+            else:
+                results.append(_window(df, start, end))
+        return results
+
+    def _get(self, symbol: str, start: pd.Timestamp, end: pd.Timestamp, interval: str) -> pd.DataFrame:
+        meta = self._read_meta(self._path(symbol, interval))
+
+        if meta is None:
+            missing = [(start, end)]
+            covered = None
+        else:
+            c_start, c_end = pd.Timestamp(meta['start']), pd.Timestamp(meta['end'])
+            missing = []
+            if start < c_start:
+                missing.append((start, c_start))
+            if end > c_end:
+                missing.append((c_end, end))
+            covered = (c_start, c_end)
+        fetch = bool(missing) and not self.offline
+        # served straight from the cache, the columns stay memory-mapped (read-only)
+        cached = self.load(symbol, interval, mmap=not fetch) if meta is not None else None
+
+        if fetch:
+            # a range only counts as covered once the source returns bars for
+            # it, and never past today, so failed fetches and bars that don't
+            # exist yet are asked for again on the next request
+            today = pd.Timestamp.now(tz=end.tz).normalize()
+            fetched = []
+            for s, e in missing:
+                part = self.source.fetch(symbol, s, e, interval)
+                if len(part):
+                    fetched.append(part)
+                    last = part.index[-1]
+                    if e.tz is None and last.tz is not None:
+                        # naive requests are wall-clock times in the index's zone (see _localize)
+                        last = last.tz_localize(None)
+                    e = max(min(e, today), last + pd.Timedelta(1, 'ns'))
+                    covered = (s, e) if covered is None else (min(covered[0], s), max(covered[1], e))
+            if fetched:
+                merged = pd.concat(([] if cached is None else [cached]) + fetched)
+                cached = merged[~merged.index.duplicated(keep='last')].sort_index().select_dtypes('number')
+                self._store(symbol, interval, cached, *covered)
+            elif cached is None:
+                return part.select_dtypes('number')
+        elif cached is None:
+            raise LookupError(f"{symbol} ({interval}) is not cached and the price cache is offline")
+        return _window(cached, start, end)
+
+
+_default_cache = None
+
+
+def default_cache() -> PriceCache:
+    """The process-wide cache used by utils.download_data. Configured with the
+    QUANT_GYM_CACHE_DIR and QUANT_GYM_OFFLINE environment variables."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = PriceCache(source=ThrottledSource(YahooSource()),
+                                    offline=os.environ.get('QUANT_GYM_OFFLINE', '') not in ('', '0'))
+    return _default_cache
+
+
+def set_default_cache(cache: PriceCache):
+    global _default_cache
+    _default_cache = cache
@@ -0,0 +1,250 @@
+# profiling.py
+"""Opt-in per-stage instrumentation for the backtest pipeline.
+
+Hot-path functions are wrapped with ``@stage('name')``. While profiling is
+off (the default) the wrapper is a single context lookup before calling through.
+After ``enable()`` every call records wall time, rows processed (length of
+the first array/frame result or argument) and the change in allocated
+memory blocks; ``enable(trace_memory=True)`` also traces net and peak bytes
+with tracemalloc. Stages may nest: times are inclusive, and the folded-stack
+export attributes self time to each nesting path.
+
+    profiling.enable()
+    ... run backtests ...
+    print(profiling.format_report())
+    profiling.write_folded('run.folded')   # flamegraph.pl / speedscope input
+
+``profile(path)`` additionally records a full cProfile dump.
+
+Each profiled run records into its own ``Profile``, held in a context
+variable, so runs on different threads (one per Streamlit session, say) never
+share or clear each other's stages. Stages only count towards the profile of
+the thread, or context, that started it:
+
+    with profiling.profile() as run:
+        ... run backtests ...
+    print(run.format_report())
+"""
+import contextlib
+import contextvars
+import cProfile
+import functools
+import sys
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+COLUMNS = ('calls', 'seconds', 'rows', 'blocks', 'net_bytes', 'peak_bytes')
+
+
+class Profile:
+    """Stages recorded by one profiled run."""
+
+    def __init__(self, trace_memory: bool = False):
+        self.active = False
+        self.trace_memory = trace_memory
+        self.started_tracing = False
+        self.stats = {}
+        self.paths = {}
+        # per thread: one [name, start_time, child_seconds, start_bytes, peak_bytes, start_blocks] per open stage
+        self._local = threading.local()
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _enter(self, name):
+        stack = self._stack()
+        start_bytes = peak = 0
+        if self.trace_memory:
+            start_bytes, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1][4] = max(stack[-1][4], peak)
+            tracemalloc.reset_peak()
+            peak = start_bytes
+        stack.append([name, time.perf_counter(), 0.0, start_bytes, peak, sys.getallocatedblocks()])
+
+    def _exit(self, rows):
+        stack = self._stack()
+        name, start, children, start_bytes, peak, blocks = stack[-1]
+        seconds = time.perf_counter() - start
+        row = self.stats.setdefault(name, dict.fromkeys(COLUMNS, 0))
+        row['calls'] += 1
+        row['seconds'] += seconds
+        row['rows'] += rows
+        row['blocks'] += sys.getallocatedblocks() - blocks
+        if self.trace_memory:
+            current, traced_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, traced_peak)
+            row['net_bytes'] += current - start_bytes
+            row['peak_bytes'] = max(row['peak_bytes'], peak - start_bytes)
+        path = ';'.join(frame[0] for frame in stack)
+        self.paths[path] = self.paths.get(path, 0.0) + seconds - children
+        stack.pop()
+        if stack:
+            stack[-1][2] += seconds
+            if self.trace_memory:
+                stack[-1][4] = max(stack[-1][4], peak)
+                tracemalloc.reset_peak()
+
+    def report(self) -> pd.DataFrame:
+        """One row per stage, slowest first."""
+        table = pd.DataFrame.from_dict(self.stats, orient='index', columns=list(COLUMNS))
+        if not self.trace_memory:
+            table = table.drop(columns=['net_bytes', 'peak_bytes'])
+        table['ms_per_call'] = 1000 * table['seconds'] / table['calls']
+        return table.sort_values('seconds', ascending=False)
+
+    def format_report(self) -> str:
+        if not self.stats:
+            return 'no stages recorded'
+        return self.report().to_string(float_format=lambda v: f'{v:.4f}')
+
+    def folded(self) -> str:
+        """Self time per stage nesting path in folded-stack format
+        (``a;b;c <microseconds>`` lines), readable by flamegraph.pl and speedscope."""
+        return ''.join(f'{stack} {round(seconds * 1e6)}\n' for stack, seconds in sorted(self.paths.items()))
+
+    def write_folded(self, path: str):
+        with open(path, 'w') as f:
+            f.write(self.folded())
+
+
+_current = contextvars.ContextVar('profiling', default=None)
+# tracemalloc is process-wide: it runs while any profile that started it traces memory
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+
+
+def _start_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users or not tracemalloc.is_tracing():
+            if not _tracing_users:
+                tracemalloc.start()
+            _tracing_users += 1
+            return True
+    return False
+
+
+def _stop_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if not _tracing_users:
+            tracemalloc.stop()
+
+
+def current() -> Profile:
+    """The profile of this thread (context), started by ``enable``/``profile``, or None."""
+    return _current.get()
+
+
+def enable(trace_memory: bool = False) -> Profile:
+    """Start recording into this context's profile, creating it if needed."""
+    run = _current.get()
+    if run is None:
+        run = Profile()
+        _current.set(run)
+    if run.active:
+        disable()
+    run.trace_memory = trace_memory
+    run.started_tracing = trace_memory and _start_tracing()
+    run.active = True
+    return run
+
+
+def disable():
+    """Stop recording; the profile keeps its stages for ``report``."""
+    run = _current.get()
+    if run is None or not run.active:
+        return
+    run.active = False
+    if run.started_tracing:
+        _stop_tracing()
+        run.started_tracing = False
+
+
+def enabled() -> bool:
+    run = _current.get()
+    return run is not None and run.active
+
+
+def reset():
+    """Drop this context's recorded stages."""
+    run = _current.get()
+    if run is not None:
+        run.stats.clear()
+        run.paths.clear()
+
+
+def _rows(result, args):
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    for value in (result,) + args:
+        shape = getattr(value, 'shape', None)
+        if shape:
+            return shape[0]
+    return 0
+
+
+def stage(name: str):
+    """Decorator recording calls to the wrapped function under ``name``."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            run = _current.get()
+            if run is None or not run.active:
+                return fn(*args, **kwargs)
+            run._enter(name)
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+                return result
+            finally:
+                run._exit(_rows(result, args))
+        return wrapper
+    return decorate
+
+
+def report() -> pd.DataFrame:
+    """This context's profile as a table (see Profile.report)."""
+    return (_current.get() or Profile()).report()
+
+
+def format_report() -> str:
+    return (_current.get() or Profile()).format_report()
+
+
+def folded() -> str:
+    return (_current.get() or Profile()).folded()
+
+
+def write_folded(path: str):
+    (_current.get() or Profile()).write_folded(path)
+
+
+@contextlib.contextmanager
+def profile(path: str = None, trace_memory: bool = False):
+    """Record stages into a new Profile for the duration of the block and
+    yield it; with ``path``, also run cProfile and dump its stats there
+    (``python -m pstats``, snakeviz). The profile stays this context's
+    current one afterwards, so ``report()`` etc. still read it."""
+    disable()
+    _current.set(Profile())
+    run = enable(trace_memory)
+    profiler = cProfile.Profile() if path else None
+    if profiler:
+        profiler.enable()
+    try:
+        yield run
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(path)
+        disable()
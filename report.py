@@ -0,0 +1,271 @@
+# report.py
+"""Equity-curve plotting and consolidated run reports.
+
+Long equity curves are downsampled with LTTB (largest triangle three
+buckets) before they are drawn, so a chart costs the same whether the run
+had a thousand bars or ten million; the curve's global high and low are
+always kept. Figures are built on ``matplotlib.figure.Figure`` directly
+(never pyplot), reused between renders and rendered on one background
+thread by ``Renderer``, so nothing accumulates across dashboard reruns and
+the next backtest runs while the last chart is encoded.
+
+    with report.Renderer() as renderer:
+        png = renderer.equity(equity, 'SMA QQQ', path='outputs/equity_sma_qqq.png')
+        report.write_html('outputs/report.html', {'SMA QQQ': equity}, metrics_table, renderer)
+"""
+import base64
+import html
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import profiling
+
+# points kept per curve; a few per horizontal pixel at the default sizes
+DEFAULT_POINTS = 2000
+DPI = 150
+EQUITY_SIZE = (10, 4)
+COMPARISON_SIZE = (12, 6)
+# curves in the report's small-multiples grid
+MAX_PANELS = 48
+GRID_COLUMNS = 4
+LEGEND_LIMIT = 12
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Sorted indices of the points LTTB keeps when reducing ``(x, y)`` to ``n_out``.
+
+    The first and last points are always kept and the rest are split into
+    ``n_out - 2`` buckets, each contributing the point forming the largest
+    triangle with the previously kept point and the next bucket's mean. The
+    global minimum and maximum of ``y`` replace their bucket's pick, so
+    drawdown troughs and peaks survive (one extra point is kept in the rare
+    case both fall in the same bucket). NaNs are only picked from buckets
+    holding nothing else.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    if n_out < 3:
+        raise ValueError("n_out must be >= 3")
+    # n_out - 2 buckets over the interior points, bucket b is edges[b]:edges[b + 1]
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    valid = ~np.isnan(y)
+    inner = slice(1, n - 1)
+    starts = edges[:-1] - 1
+    counts = np.add.reduceat(valid[inner].astype(float), starts)
+    sums = np.add.reduceat(np.where(valid, y, 0.0)[inner], starts)
+    # each bucket's target is the mean of the bucket after it (the last point for the last bucket)
+    mean_x = np.append(np.add.reduceat(x[inner], starts) / np.diff(edges), x[-1])
+    mean_y = np.append(np.divide(sums, counts, out=np.full(len(counts), np.nan), where=counts > 0), y[-1])
+
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # twice the triangle area; the constant factor doesn't change the argmax
+        area = np.abs((x[a] - mean_x[b + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y[b + 1] - y[a]))
+        a = lo + int(np.argmax(np.where(np.isnan(area), -1.0, area)))
+        keep[b + 1] = a
+
+    if not valid.any():
+        return keep
+    low, high = int(np.nanargmin(y)), int(np.nanargmax(y))
+    for extreme in (low, high):
+        bucket = np.searchsorted(edges, extreme, side='right') - 1
+        if 0 <= bucket < n_out - 2 and keep[bucket + 1] not in (low, high):
+            keep[bucket + 1] = extreme
+    return np.unique(np.append(keep, (low, high)))
+
+
+def downsample(series: pd.Series, max_points: int = DEFAULT_POINTS) -> pd.Series:
+    """``series`` reduced to at most ``max_points`` rows with lttb, using the
+    index (timestamps or numbers) as x."""
+    if len(series) <= max_points:
+        return series
+    index = series.index
+    if isinstance(index, pd.DatetimeIndex):
+        x = index.as_unit('ns').asi8.astype(float)
+    elif pd.api.types.is_numeric_dtype(index):
+        x = index.to_numpy(dtype=float)
+    else:
+        x = np.arange(len(series), dtype=float)
+    return series.iloc[lttb(x, series.to_numpy(dtype=float), max_points)]
+
+
+class FigurePool:
+    """Reusable figures keyed by size; ``get`` hands back a cleared one.
+
+    Figures come from ``matplotlib.figure.Figure`` with an Agg canvas, so they
+    are never registered with pyplot and can't leak or open a GUI window.
+    Use a pool from one thread only.
+    """
+
+    def __init__(self):
+        self._figures = {}
+
+    def get(self, figsize):
+        fig = self._figures.get(figsize)
+        if fig is None:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            fig = Figure(figsize=figsize)
+            FigureCanvasAgg(fig)
+            self._figures[figsize] = fig
+        else:
+            fig.clear()
+        return fig
+
+    def clear(self):
+        self._figures.clear()
+
+
+def draw_equity(fig, equity: pd.Series, title: str, max_points: int = DEFAULT_POINTS):
+    ax = fig.subplots()
+    line = downsample(equity, max_points)
+    ax.plot(line.index, line.to_numpy(), linewidth=1.5)
+    ax.set_title(f'Equity Curve: {title}', fontsize=13, fontweight='bold')
+    ax.set_ylabel('Equity ($)')
+    ax.grid(True, alpha=0.3)
+    fig.autofmt_xdate()
+    return fig
+
+
+def draw_comparison(fig, results: dict, max_points: int = DEFAULT_POINTS):
+    """Every curve in ``results`` normalized to its starting value."""
+    ax = fig.subplots()
+    for name, equity in results.items():
+        line = downsample(equity / equity.iloc[0], max_points)
+        ax.plot(line.index, line.to_numpy(), label=name, linewidth=1.5)
+    if 0 < len(results) <= LEGEND_LIMIT:
+        ax.legend()
+    ax.set_title('Equity Curve Comparison (Normalized)', fontsize=13, fontweight='bold')
+    ax.set_ylabel('Normalized Equity')
+    ax.grid(True, alpha=0.3)
+    fig.autofmt_xdate()
+    return fig
+
+
+def draw_grid(fig, results: dict, max_points: int = DEFAULT_POINTS // 4):
+    """One small panel per curve, ``GRID_COLUMNS`` to a row."""
+    names = list(results)
+    rows = -(-len(names) // GRID_COLUMNS)
+    axes = np.atleast_1d(fig.subplots(rows, GRID_COLUMNS, squeeze=False)).ravel()
+    for ax, name in zip(axes, names):
+        line = downsample(results[name], max_points)
+        ax.plot(line.index, line.to_numpy(), linewidth=1)
+        ax.set_title(name, fontsize=9)
+        ax.tick_params(labelsize=7)
+        ax.tick_params(axis='x', labelrotation=30)
+        ax.grid(True, alpha=0.3)
+    for ax in axes[len(names):]:
+        ax.set_visible(False)
+    fig.tight_layout()
+    return fig
+
+
+def grid_size(n: int) -> tuple:
+    return (16, 3 * max(1, -(-n // GRID_COLUMNS)))
+
+
+@profiling.stage('render_png')
+def render_png(fig, path: str = None, dpi: int = DPI) -> bytes:
+    """``fig`` encoded as PNG bytes, also written to ``path`` when given."""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    data = buffer.getvalue()
+    if path:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+    return data
+
+
+class Renderer:
+    """Renders charts on one background thread with a shared FigurePool.
+
+    Each method returns a Future of the PNG bytes (also written to ``path``);
+    ``close`` (or leaving the ``with`` block) waits for pending renders.
+    matplotlib isn't thread-safe, which is why there is exactly one worker.
+    """
+
+    def __init__(self, dpi: int = DPI, max_points: int = DEFAULT_POINTS):
+        self.dpi = dpi
+        self.max_points = max_points
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='report')
+        # only touched from the worker thread
+        self._figures = FigurePool()
+
+    def _render(self, draw, figsize, args, path):
+        return render_png(draw(self._figures.get(figsize), *args), path, self.dpi)
+
+    def equity(self, equity: pd.Series, title: str, path: str = None):
+        return self._pool.submit(self._render, draw_equity, EQUITY_SIZE, (equity, title, self.max_points), path)
+
+    def comparison(self, results: dict, path: str = None):
+        return self._pool.submit(self._render, draw_comparison, COMPARISON_SIZE, (dict(results), self.max_points),
+                                 path)
+
+    def grid(self, results: dict, path: str = None):
+        results = dict(list(results.items())[:MAX_PANELS])
+        return self._pool.submit(self._render, draw_grid, grid_size(len(results)),
+                                 (results, max(self.max_points // 4, 3)), path)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _img(png: bytes, alt: str) -> str:
+    return f'<img alt="{html.escape(alt)}" src="data:image/png;base64,{base64.b64encode(png).decode()}">'
+
+
+@profiling.stage('html_report')
+def html_report(results: dict, metrics: pd.DataFrame = None, renderer: Renderer = None,
+                title: str = 'Backtest Report') -> str:
+    """One self-contained HTML page: a normalized comparison chart, ``metrics``
+    as a table and a small-multiples grid (first MAX_PANELS curves). Charts
+    are rendered with ``renderer`` (a temporary one without)."""
+    own = renderer is None
+    renderer = renderer or Renderer()
+    try:
+        # queue both charts before waiting on either
+        comparison = renderer.comparison(results) if results else None
+        grid = renderer.grid(results) if len(results) > 1 else None
+        sections = []
+        if comparison is not None:
+            sections.append(_img(comparison.result(), 'comparison'))
+        if metrics is not None and len(metrics):
+            sections.append('<h2>Metrics</h2>' + metrics.to_html(float_format=lambda v: f'{v:.4f}',
+                                                                  na_rep='', border=0))
+        if grid is not None:
+            shown = min(len(results), MAX_PANELS)
+            sections.append(f'<h2>Equity Curves ({shown} of {len(results)})</h2>' + _img(grid.result(), 'curves'))
+    finally:
+        if own:
+            renderer.close()
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(title)}</title>'
+            '<style>body{font-family:sans-serif;margin:2em}img{max-width:100%}'
+            'table{border-collapse:collapse}td,th{padding:2px 8px;text-align:right}'
+            'tr:nth-child(even){background:#f4f4f4}</style></head>'
+            f'<body><h1>{html.escape(title)}</h1>{"".join(sections)}</body></html>')
+
+
+def write_html(path: str, results: dict, metrics: pd.DataFrame = None, renderer: Renderer = None,
+               title: str = 'Backtest Report') -> str:
+    """Write html_report to ``path`` and return the path."""
+    page = html_report(results, metrics, renderer, title)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(page)
+    return path
@@ -0,0 +1,343 @@
+# results.py
+"""Persistent, content-addressed store of backtest results.
+
+A run is keyed by ``run_key``: a hash of the price data it saw (a
+fingerprint of index and values), the strategy code (the source of its
+module), its parameters, the backtester settings and the source of the
+engine modules, so editing a strategy or the engine never serves a stale
+result. Each run is a directory of memory-mappable ``.npy`` columns (equity
+curve and trade ledger) plus a ``meta.json`` with the metrics, like the
+price cache's entries. ``index.jsonl`` holds one line of metrics per run so
+``query`` compares thousands of runs without opening them.
+
+Runs are written to a temporary directory and renamed into place, and
+index lines are appended with a single ``O_APPEND`` write, so any number of
+processes can write to one store: the first writer of a key wins and the
+others drop their copy.
+
+    equity, history, metrics = results.memoize(price, sma_crossover.generate_signals, {'short_window': 20},
+                                               {'cash': 100000}, compute, info={'symbol': 'QQQ'})
+    results.default_store().query(symbol='QQQ').sort_values('sharpe')
+"""
+import functools
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+import pandas as pd
+
+import precision
+from ledger import TRADE_DTYPE, TradeLedger
+
+DEFAULT_ROOT = os.environ.get('QUANT_GYM_RESULTS_DIR', os.path.join('.cache', 'results'))
+FORMAT_VERSION = 1
+# modules whose source is part of every key: a change to any of them can change any result
+ENGINE_MODULES = ('backtester', 'execution', 'indicators', 'kernels', 'ledger', 'metrics', 'precision')
+INDEX_FILE = 'index.jsonl'
+
+
+def fingerprint(data) -> str:
+    """Hash of a Series' or DataFrame's index and values (names are ignored),
+    or of an array's shape, dtype and contents."""
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(data, (pd.Series, pd.DataFrame)):
+        frame = data.to_frame() if isinstance(data, pd.Series) else data
+        h.update(f'{frame.shape}'.encode())
+        tz = getattr(frame.index, 'tz', None)
+        h.update(str(tz).encode())
+        h.update(pd.util.hash_pandas_object(frame.set_axis(range(frame.shape[1]), axis=1), index=True)
+                 .to_numpy().tobytes())
+    else:
+        array = np.ascontiguousarray(data)
+        h.update(f'{array.shape}{array.dtype.str}'.encode())
+        h.update(array.tobytes())
+    return h.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _source_hash(module_name: str) -> str:
+    module = sys.modules.get(module_name) or importlib.import_module(module_name)
+    path = getattr(module, '__file__', None)
+    if path is None:
+        return ''
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def code_token(obj) -> str:
+    """Identifies a strategy's code: a module or function name with a hash of
+    the module's source. Strings are taken as they are."""
+    if isinstance(obj, str):
+        return obj
+    if isinstance(obj, types.ModuleType):
+        return f'{obj.__name__}@{_source_hash(obj.__name__)}'
+    name = f"{obj.__module__}.{getattr(obj, '__qualname__', getattr(obj, '__name__', repr(obj)))}"
+    return f'{name}@{_source_hash(obj.__module__)}'
+
+
+def run_key(prices, strategy, params=None, settings=None) -> str:
+    """Content address of one backtest.
+
+    ``prices`` is the data the run saw (hashed with fingerprint, or an
+    existing fingerprint string), ``strategy`` a function, module or name (or
+    a tuple of them, see code_token) and ``params`` and ``settings`` (cash,
+    commission, ...) anything JSON-serializable. Runs in precision.py's
+    float32 mode get keys of their own.
+    """
+    strategies = strategy if isinstance(strategy, (tuple, list)) else (strategy,)
+    payload = {
+        'version': FORMAT_VERSION,
+        'engine': [code_token(importlib.import_module(m)) for m in ENGINE_MODULES],
+        'prices': prices if isinstance(prices, str) else fingerprint(prices),
+        'strategy': [code_token(s) for s in strategies],
+        'params': params,
+        'settings': settings,
+        'precision': precision.mode(),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=repr).encode()).hexdigest()
+
+
+def _index_values(index: pd.Index):
+    """(values, meta) to save an index as one ``.npy`` column."""
+    if isinstance(index, pd.DatetimeIndex):
+        tz = None if index.tz is None else str(index.tz)
+        naive = index if index.tz is None else index.tz_convert('UTC').tz_localize(None)
+        return naive.to_numpy(), {'tz': tz, 'freq': index.freqstr, 'index_name': index.name}
+    return index.to_numpy(dtype='i8'), {'tz': None, 'freq': None, 'index_name': index.name}
+
+
+def _plain(value):
+    """JSON-friendly copy of metrics/info values (NumPy scalars, tuples)."""
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _save(path: str, array: np.ndarray):
+    with open(path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(array))
+
+
+class ResultStore:
+    """Backtest results on disk under ``root``, keyed by run_key; see the module docstring."""
+
+    def __init__(self, root: str = DEFAULT_ROOT):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.isfile(os.path.join(self._path(key), 'meta.json'))
+
+    def put(self, key: str, equity: pd.Series, history: TradeLedger = None, metrics: dict = None,
+            info: dict = None) -> bool:
+        """Store a run under ``key``: its equity curve, trade ledger, metrics and
+        free-form ``info`` (strategy, symbols, params, ... as shown by query).
+        Returns False, storing nothing, if the key is already there."""
+        final = self._path(key)
+        if key in self:
+            return False
+        tmp = os.path.join(self.root, 'tmp', f'{key}.{os.getpid()}.{threading.get_ident()}')
+        os.makedirs(tmp)
+        try:
+            values, meta = _index_values(equity.index)
+            _save(os.path.join(tmp, 'index.npy'), values)
+            _save(os.path.join(tmp, 'equity.npy'), equity.to_numpy(dtype=float))
+            trades = 0
+            if history is not None:
+                trades = len(history)
+                for name in TRADE_DTYPE.names:
+                    _save(os.path.join(tmp, f'trade_{name}.npy'), history[name])
+            record = {
+                'key': key,
+                'created': time.time(),
+                'bars': len(equity),
+                'trades': trades,
+                'info': _plain(info or {}),
+                'metrics': _plain(metrics or {}),
+            }
+            meta.update(record, name=equity.name, has_trades=history is not None,
+                        trade_assets=None if history is None else history.assets,
+                        trade_tz=None if history is None else history.tz)
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            os.makedirs(os.path.dirname(final), exist_ok=True)
+            try:
+                os.rename(tmp, final)
+            except OSError:
+                # another writer got there first; its copy is the same run
+                if key in self:
+                    return False
+                raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self._append_index(record)
+        return True
+
+    def _append_index(self, record: dict):
+        line = (json.dumps(record) + '\n').encode()
+        fd = os.open(os.path.join(self.root, INDEX_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # one write per line: concurrent appends don't interleave
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def get(self, key: str, mmap: bool = True):
+        """``(equity, history, metrics)`` stored under ``key``, or None.
+        Arrays are memory-mapped (read-only) unless ``mmap`` is False;
+        ``history`` is None if the run was stored without one."""
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        mode = 'r' if mmap else None
+        values = np.load(os.path.join(path, 'index.npy'), mmap_mode=mode)
+        if values.dtype.kind == 'M':
+            index = pd.DatetimeIndex(values, name=meta['index_name'])
+            if meta['tz'] is not None:
+                index = index.tz_localize('UTC').tz_convert(meta['tz'])
+            if meta['freq'] is not None:
+                index = pd.DatetimeIndex(index, freq=meta['freq'])
+        else:
+            index = pd.Index(values, name=meta['index_name'])
+        equity = pd.Series(np.load(os.path.join(path, 'equity.npy'), mmap_mode=mode), index=index,
+                           name=meta['name'], copy=False)
+        history = None
+        if meta['has_trades']:
+            columns = {name: np.load(os.path.join(path, f'trade_{name}.npy'), mmap_mode=mode)
+                       for name in TRADE_DTYPE.names}
+            history = TradeLedger.from_columns(columns, meta['trade_assets'], meta['trade_tz'])
+        return equity, history, meta['metrics']
+
+    def run(self, key: str, compute, info: dict = None):
+        """The run stored under ``key``, or ``compute()``'s ``(equity, history,
+        metrics)`` after storing it there."""
+        stored = self.get(key)
+        if stored is not None:
+            return stored
+        equity, history, metrics = compute()
+        self.put(key, equity, history, metrics, info)
+        return equity, history, metrics
+
+    def _records(self):
+        try:
+            with open(os.path.join(self.root, INDEX_FILE)) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # a line still being appended
+                continue
+        return records
+
+    def query(self, **equals) -> pd.DataFrame:
+        """One row per stored run, indexed by key: created, bars, trades, the
+        run's info (dict values flattened to ``'name.field'`` columns, lists
+        to tuples) and its metrics. ``equals`` keeps the rows whose column
+        equals the given value, e.g. ``query(strategy='sma_crossover')``."""
+        rows = []
+        for record in self._records():
+            row = {'key': record['key'], 'created': record['created'], 'bars': record['bars'],
+                   'trades': record['trades']}
+            for name, value in record['info'].items():
+                if isinstance(value, dict):
+                    row.update({f'{name}.{k}': _hashable(v) for k, v in value.items()})
+                else:
+                    row[name] = _hashable(value)
+            row.update(record['metrics'])
+            rows.append(row)
+        table = pd.DataFrame(rows)
+        if table.empty:
+            return table
+        table = table.drop_duplicates('key').set_index('key')
+        for name, value in equals.items():
+            if name not in table.columns:
+                return table.iloc[:0]
+            table = table[[v == _hashable(value) for v in table[name]]]
+        return table
+
+    def equity_curves(self, keys) -> pd.DataFrame:
+        """The equity curves of ``keys`` side by side (outer-joined on their index)."""
+        curves = {}
+        for key in keys:
+            stored = self.get(key)
+            if stored is None:
+                raise LookupError(f"no stored run {key}")
+            curves[key] = stored[0]
+        return pd.DataFrame(curves)
+
+    def rebuild_index(self) -> int:
+        """Rewrite index.jsonl from the stored runs (while nothing writes to
+        the store); returns the number of runs."""
+        records = []
+        for prefix in sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []:
+            directory = os.path.join(self.root, prefix)
+            if prefix == 'tmp' or not os.path.isdir(directory):
+                continue
+            for key in sorted(os.listdir(directory)):
+                try:
+                    with open(os.path.join(directory, key, 'meta.json')) as f:
+                        meta = json.load(f)
+                except FileNotFoundError:
+                    continue
+                records.append({k: meta[k] for k in ('key', 'created', 'bars', 'trades', 'info', 'metrics')})
+        records.sort(key=lambda r: r['created'])
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, INDEX_FILE)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            f.writelines(json.dumps(r) + '\n' for r in records)
+        os.replace(tmp, path)
+        return len(records)
+
+
+def _hashable(value):
+    return tuple(_hashable(v) for v in value) if isinstance(value, list) else value
+
+
+_default_store = None
+_default_set = False
+
+
+def default_store():
+    """The process-wide store used by pipeline.py and main.py, under
+    QUANT_GYM_RESULTS_DIR (``.cache/results`` by default); None, disabling
+    memoization, when that variable is set to an empty string."""
+    global _default_store, _default_set
+    if not _default_set:
+        _default_store = ResultStore(DEFAULT_ROOT) if DEFAULT_ROOT else None
+        _default_set = True
+    return _default_store
+
+
+def set_default_store(store):
+    """Replace the default store (None disables memoization)."""
+    global _default_store, _default_set
+    _default_store, _default_set = store, True
+
+
+def memoize(prices, strategy, params, settings, compute, info: dict = None, store: ResultStore = None):
+    """``(equity, history, metrics)`` of the run keyed by run_key(prices,
+    strategy, params, settings): from ``store`` (the default store if None)
+    when it's there, else ``compute()``'s result, which is then stored."""
+    store = store if store is not None else default_store()
+    if store is None:
+        return compute()
+    return store.run(run_key(prices, strategy, params, settings), compute, info)
@@ -0,0 +1,273 @@
+# screening.py
+"""Pair-universe screening for the market_mood spread strategy.
+
+load_universe -> screen_pairs -> backtest_pairs
+
+``load_universe`` downloads N symbols concurrently and aligns their closes
+on one calendar: ``'intersect'`` keeps the bars every symbol traded,
+``'ffill'`` keeps every bar any symbol traded and carries the last close
+over the others' holidays (e.g. equities over crypto weekends).
+
+``screen_pairs`` scores all N(N-1)/2 pairs at once. For a pair (a, b) the
+hedge ratio is the OLS slope of a's price on b's, the spread is
+``a - hedge_ratio * b`` and ``tstat`` is the Engle-Granger statistic: the
+Dickey-Fuller t-stat of the spread's mean reversion (no augmentation lags).
+Both regression directions are tried and the more negative kept. Every sum
+those need is an entry of a few Gram matrices of the (bars x symbols)
+price matrix, so each block of rows costs a handful of matrix products
+instead of one regression per pair; blocks run on a thread pool (NumPy
+releases the GIL in them) and only the ``top`` pairs of each are kept.
+
+``backtest_pairs`` then runs the z-score strategy on the best pairs, all
+in one (bars x pairs) pass.
+
+    prices, failed = screening.load_universe(symbols, '2020-01-01', how='ffill')
+    pairs = screening.screen_pairs(prices, top=50)
+    equity, table = screening.backtest_pairs(prices, pairs.head(20), window=20)
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import metrics
+import profiling
+import utils
+from montecarlo import backtest_paths
+
+HOW = ('intersect', 'ffill')
+DEFAULT_BLOCK_ROWS = 64
+# MacKinnon (2010) response surface for the Engle-Granger test with two
+# variables and a constant: critical value = b0 + b1 / n + b2 / n**2
+CRITICAL_VALUES = {
+    0.01: (-3.89644, -10.9519, -33.527),
+    0.05: (-3.33613, -6.1101, -6.823),
+    0.10: (-3.04445, -4.2412, -2.720),
+}
+COLUMNS = ['a', 'b', 'hedge_ratio', 'tstat', 'level', 'half_life', 'correlation']
+
+
+def align_prices(prices: dict, how: str = 'intersect', min_coverage: float = 0.0,
+                 limit: int = None) -> pd.DataFrame:
+    """(bars x symbols) close prices from ``{symbol: close Series}``.
+
+    ``how='intersect'`` keeps only the bars every symbol has; ``'ffill'``
+    keeps the union of bars, forward-filling each symbol at most ``limit``
+    bars, and drops the bars still missing a price (before a symbol's first
+    close or past ``limit``). Symbols with closes on less than
+    ``min_coverage`` of the union's bars are dropped first, so one short
+    history doesn't truncate the whole universe.
+    """
+    if how not in HOW:
+        raise ValueError(f"how must be one of {HOW}, got {how!r}")
+    frame = pd.DataFrame({symbol: pd.Series(close, dtype=float) for symbol, close in prices.items()})
+    if min_coverage > 0 and len(frame):
+        frame = frame.loc[:, frame.notna().mean() >= min_coverage]
+    if how == 'ffill':
+        frame = frame.ffill(limit=limit)
+    return frame.dropna()
+
+
+@profiling.stage('screening.load_universe')
+def load_universe(symbols, start='2020-01-01', end='2025-01-01', how: str = 'intersect',
+                  min_coverage: float = 0.0, limit: int = None):
+    """Download ``symbols`` concurrently and align them with align_prices.
+
+    Returns ``(prices, failed)``: the aligned frame and ``{symbol: error}``
+    for the symbols that couldn't be loaded, which are left out.
+    """
+    prices, failed = {}, {}
+    for symbol, bars in utils.download_many(symbols, start=start, end=end, return_exceptions=True).items():
+        if isinstance(bars, Exception):
+            failed[symbol] = f'{type(bars).__name__}: {bars}'
+        else:
+            prices[symbol] = bars['close']
+    return align_prices(prices, how, min_coverage, limit), failed
+
+
+def critical_value(level: float, n: int) -> float:
+    """Engle-Granger critical value at ``level`` (a CRITICAL_VALUES key) for
+    a Dickey-Fuller regression on ``n`` observations."""
+    b0, b1, b2 = CRITICAL_VALUES[level]
+    return b0 + b1 / n + b2 / n ** 2
+
+
+def _direction(cc_a, cc_b, cc_ab, ll_a, ll_b, ll_ab, dd_a, dd_b, dd_ab, dl_a, dl_b, dl_ab, dl_ba, dof):
+    """Hedge ratio, Dickey-Fuller gamma and t-stat of the spread a - beta * b
+    from the Gram-matrix entries of a and b: levels (cc), lagged levels (ll),
+    differences (dd) and differences x lagged levels (dl, dl_ab = sum(da * lag_b))."""
+    beta = cc_ab / cc_b
+    lag = ll_a - 2 * beta * ll_ab + beta ** 2 * ll_b
+    cross = dl_a - beta * (dl_ab + dl_ba) + beta ** 2 * dl_b
+    diff = dd_a - 2 * beta * dd_ab + beta ** 2 * dd_b
+    gamma = cross / lag
+    ssr = np.maximum(diff - gamma * cross, 0.0)
+    return beta, gamma, gamma / np.sqrt(ssr / dof / lag)
+
+
+def _diagonals(values):
+    """Per-symbol sums of squared levels, lagged levels and differences, and of differences x lagged levels."""
+    lag, diff = values[:-1], np.diff(values, axis=0)
+    return (np.einsum('ij,ij->j', values, values), np.einsum('ij,ij->j', lag, lag),
+            np.einsum('ij,ij->j', diff, diff), np.einsum('ij,ij->j', diff, lag))
+
+
+def _screen_block(values, diagonals, start, stop, top):
+    """Column numbers ``a``, ``b`` and hedge ratio, gamma, t-stat and
+    correlation of every pair (i, j) with ``start <= i < stop`` and ``j > i``;
+    the ``top`` best only."""
+    lag, diff = values[:-1], np.diff(values, axis=0)
+    cc = values[:, start:stop].T @ values[:, start:]
+    ll = lag[:, start:stop].T @ lag[:, start:]
+    dd = diff[:, start:stop].T @ diff[:, start:]
+    dl = diff[:, start:stop].T @ lag[:, start:]
+    ld = lag[:, start:stop].T @ diff[:, start:]
+    i, j = np.nonzero(np.arange(start, stop)[:, None] < np.arange(start, values.shape[1])[None, :])
+    ci, cj = i + start, j + start
+    c, l, d, dls = diagonals
+    cc, ll, dd, dl, ld = cc[i, j], ll[i, j], dd[i, j], dl[i, j], ld[i, j]
+    dof = len(values) - 2
+    # a on b, then b on a
+    beta_ab, gamma_ab, t_ab = _direction(c[ci], c[cj], cc, l[ci], l[cj], ll, d[ci], d[cj], dd,
+                                         dls[ci], dls[cj], dl, ld, dof)
+    beta_ba, gamma_ba, t_ba = _direction(c[cj], c[ci], cc, l[cj], l[ci], ll, d[cj], d[ci], dd,
+                                         dls[cj], dls[ci], ld, dl, dof)
+    flip = np.nan_to_num(t_ba, nan=np.inf) < np.nan_to_num(t_ab, nan=np.inf)
+    block = (np.where(flip, cj, ci), np.where(flip, ci, cj), np.where(flip, beta_ba, beta_ab),
+             np.where(flip, gamma_ba, gamma_ab), np.where(flip, t_ba, t_ab), cc / np.sqrt(c[ci] * c[cj]))
+    if top is not None and len(ci) > top:
+        keep = np.argpartition(np.nan_to_num(block[4], nan=np.inf), top - 1)[:top]
+        block = tuple(x[keep] for x in block)
+    return block
+
+
+@profiling.stage('screening.screen_pairs')
+def screen_pairs(prices: pd.DataFrame, top: int = None, block_rows: int = DEFAULT_BLOCK_ROWS,
+                 max_workers: int = None) -> pd.DataFrame:
+    """Hedge ratio and cointegration statistics of every pair of ``prices``'
+    columns (an aligned frame without gaps, see align_prices), best first.
+
+    One row per pair with COLUMNS: the spread is ``a - hedge_ratio * b``,
+    ``tstat`` its Engle-Granger t-stat (more negative is more mean-reverting),
+    ``level`` the smallest CRITICAL_VALUES level it passes (NaN if none),
+    ``half_life`` the bars it takes a spread deviation to halve and
+    ``correlation`` that of the two price levels. Only the ``top`` pairs are
+    returned (all with None). Blocks of ``block_rows`` symbols run on up to
+    ``max_workers`` threads.
+    """
+    values = prices.to_numpy(dtype=float)
+    if np.isnan(values).any():
+        raise ValueError("prices has missing values, align it first (see align_prices)")
+    if len(values) < 3:
+        raise ValueError("need at least 3 bars to screen pairs")
+    if top is not None and top < 1:
+        raise ValueError("top must be >= 1")
+    # centering makes every sum below a regression on a constant too
+    values = values - values.mean(axis=0)
+    diagonals = _diagonals(values)
+    n_symbols = values.shape[1]
+    block_rows = max(1, int(block_rows))
+    max_workers = max_workers or min(os.cpu_count() or 1, 8)
+
+    def run(start):
+        return _screen_block(values, diagonals, start, min(start + block_rows, n_symbols), top)
+
+    starts = range(0, max(n_symbols - 1, 1), block_rows)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if max_workers == 1 or len(starts) == 1:
+            blocks = [run(start) for start in starts]
+        else:
+            with ThreadPoolExecutor(max_workers) as pool:
+                blocks = list(pool.map(run, starts))
+        a, b, beta, gamma, tstat, correlation = (np.concatenate(x) for x in zip(*blocks))
+        half_life = np.where(gamma < 0, -np.log(2) / np.log1p(gamma), np.nan)
+    n = len(values) - 1
+    level = np.full(len(tstat), np.nan)
+    for lvl in sorted(CRITICAL_VALUES, reverse=True):
+        level[tstat <= critical_value(lvl, n)] = lvl
+    order = np.argsort(np.nan_to_num(tstat, nan=np.inf), kind='stable')[:top]
+    symbols = np.asarray(prices.columns, dtype=object)
+    return pd.DataFrame({
+        'a': symbols[a[order]],
+        'b': symbols[b[order]],
+        'hedge_ratio': beta[order],
+        'tstat': tstat[order],
+        'level': level[order],
+        'half_life': half_life[order],
+        'correlation': correlation[order],
+    }, columns=COLUMNS)
+
+
+def pair_labels(pairs: pd.DataFrame) -> list:
+    return list(pairs['a'].astype(str) + '/' + pairs['b'].astype(str))
+
+
+@profiling.stage('screening.backtest_pairs')
+def backtest_pairs(prices: pd.DataFrame, pairs: pd.DataFrame, window=20, entry_z=2.0, exit_z=0.5,
+                   cash: float = 100000, commission: float = 0.0, pct_risk: float = 0.1):
+    """market_mood on every row of ``pairs`` (screen_pairs output) over the
+    aligned ``prices``, trading the spread ``a - hedge_ratio * b``.
+
+    Returns ``(equity, table)``: a (bars x pairs) equity frame and one row of
+    metrics per pair, both labelled ``'A/B'``. Each column matches
+    PortfolioBacktester on that pair with
+    ``generate_pairs_signals(..., hedge_ratio=...)`` positions. The legs are
+    always long one / short the other, so keep only positive hedge ratios
+    unless trading a pair against its spread is intended.
+    """
+    legs = np.stack([prices[list(pairs['a'])].to_numpy(dtype=float),
+                     prices[list(pairs['b'])].to_numpy(dtype=float)], axis=1)
+    params = {'window': window, 'entry_z': entry_z, 'exit_z': exit_z,
+              'hedge_ratio': pairs['hedge_ratio'].to_numpy(dtype=float)}
+    equity = backtest_paths(legs, 'market_mood', params, cash, commission, pct_risk)
+    labels = pair_labels(pairs)
+    table = metrics.compute_metrics(equity)
+    table.index = pd.Index(labels, name='pair')
+    table.insert(0, 'tstat', pairs['tstat'].to_numpy())
+    return pd.DataFrame(equity, index=prices.index, columns=labels), table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Screen a universe for cointegrated pairs and backtest the best.')
+    parser.add_argument('--symbols', nargs='*', default=[])
+    parser.add_argument('--symbols-file', help='file with one ticker per line')
+    parser.add_argument('--start', default='2020-01-01')
+    parser.add_argument('--end', default='2025-01-01')
+    parser.add_argument('--how', choices=HOW, default='intersect', help='calendar alignment')
+    parser.add_argument('--min-coverage', type=float, default=0.0)
+    parser.add_argument('--top', type=int, default=20, help='pairs (with a positive hedge ratio) to backtest')
+    parser.add_argument('--window', type=int, default=20)
+    parser.add_argument('--entry-z', type=float, default=2.0)
+    parser.add_argument('--exit-z', type=float, default=0.5)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='outputs/pair_screen.csv')
+    args = parser.parse_args(argv)
+
+    symbols = list(args.symbols)
+    if args.symbols_file:
+        with open(args.symbols_file) as f:
+            symbols += [line.strip() for line in f if line.strip()]
+    if len(symbols) < 2:
+        parser.error('need at least 2 symbols')
+    prices, failed = load_universe(symbols, args.start, args.end, args.how, args.min_coverage)
+    for symbol, error in failed.items():
+        print(f'{symbol}: {error}')
+    if prices.shape[1] < 2 or len(prices) < 3:
+        parser.error('fewer than 2 symbols with overlapping prices')
+    print(f'{prices.shape[1]} symbols, {len(prices)} bars, {prices.shape[1] * (prices.shape[1] - 1) // 2} pairs')
+    pairs = screen_pairs(prices, max_workers=args.workers)
+    pairs = pairs[pairs['hedge_ratio'] > 0].head(args.top).reset_index(drop=True)
+    _, table = backtest_pairs(prices, pairs, args.window, args.entry_z, args.exit_z)
+    table = pairs.set_index(pd.Index(pair_labels(pairs), name='pair')).join(table.drop(columns='tstat'))
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    table.to_csv(args.out)
+    print(table[['hedge_ratio', 'tstat', 'half_life', 'sharpe', 'total_return']].to_string(float_format='%.3f'))
+    print(f'\nSaved to {args.out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
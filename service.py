@@ -0,0 +1,379 @@
+# service.py
+"""Local backtest service: a job queue in front of a worker pool.
+
+A job is a list of runs, each one compute.run call (strategy, symbols,
+dates, parameters, cash, commission). ``BacktestService`` fans a job's runs
+out to a process pool and tracks it: ``status`` reports how many runs are
+done, ``cancel`` drops the runs that haven't started, and submitting a job
+identical to one still queued or running returns that job's id instead of
+computing it twice. Runs go through pipeline.backtest, so finished ones are
+also memoized in the result store (results.py).
+
+``serve`` puts one service behind a small JSON HTTP API and
+``ServiceClient`` talks to it with the same methods as the service itself,
+so callers (app.py, batch.py) work with either:
+
+    POST   /jobs               {"runs": [spec, ...]} -> {"id": ...}
+    GET    /jobs               every job's status
+    GET    /jobs/<id>          {"status", "done", "total", "error", ...}
+    GET    /jobs/<id>/result   {"results": [{"equity": ..., "metrics": ...}, ...]}, ?points=N downsamples
+    DELETE /jobs/<id>          cancel
+
+    python service.py --port 8765 --workers 4
+    client = service.ServiceClient('http://127.0.0.1:8765')
+    job = client.submit([service.spec('sma_crossover', ['QQQ'], params=(20, 50))])
+    equity, metrics = service.wait(client, job)[0]
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+import compute
+import report
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# finished jobs kept for status/result queries, oldest dropped first
+DEFAULT_KEEP = 256
+ACTIVE = ('queued', 'running')
+
+
+def spec(strategy: str, symbols, start='2020-01-01', end='2025-01-01', params=None, cash: float = 100000,
+         commission: float = 0.0) -> dict:
+    """One run of a job; the arguments of compute.run."""
+    return {'strategy': strategy, 'symbols': list(symbols), 'start': str(start), 'end': str(end),
+            'params': None if params is None else list(params), 'cash': cash, 'commission': commission}
+
+
+def _normalize(run: dict) -> tuple:
+    """compute.run's arguments from a spec dict, checked before anything is queued."""
+    strategy = run.get('strategy')
+    if strategy not in compute.STRATEGIES:
+        raise ValueError(f"unknown strategy {strategy!r}, expected one of {sorted(compute.STRATEGIES)}")
+    legs = compute.STRATEGIES[strategy][1]
+    symbols = tuple(str(s) for s in run.get('symbols') or ())
+    if len(symbols) != legs:
+        raise ValueError(f"{strategy} trades {legs} symbol(s), got {len(symbols)}")
+    params = compute.check_params(strategy, run.get('params'))
+    return (strategy, symbols, str(run.get('start', '2020-01-01')), str(run.get('end', '2025-01-01')), params,
+            float(run.get('cash', 100000)), float(run.get('commission', 0.0)))
+
+
+def _run_task(task: tuple):
+    return compute.run(*task)
+
+
+class Job:
+    """One submitted job; read it through BacktestService.status."""
+
+    def __init__(self, job_id: str, key: str, tasks: list):
+        self.id = job_id
+        self.key = key
+        self.tasks = tasks
+        self.futures = []
+        self.results = [None] * len(tasks)
+        self.done = 0
+        self.state = 'queued'
+        self.error = None
+        self.submitted = time.time()
+        self.finished = None
+
+    def status(self) -> dict:
+        state = self.state
+        if state == 'queued' and any(f.running() or f.done() for f in self.futures):
+            state = 'running'
+        return {'id': self.id, 'status': state, 'done': self.done, 'total': len(self.tasks),
+                'error': self.error, 'submitted': self.submitted, 'finished': self.finished}
+
+
+class BacktestService:
+    """Runs jobs on ``max_workers`` processes (or the given ``executor``);
+    see the module docstring. Thread-safe."""
+
+    def __init__(self, max_workers: int = None, executor=None, keep: int = DEFAULT_KEEP):
+        if executor is None:
+            # spawned workers: the service lives in threaded servers (HTTP, Streamlit) that shouldn't be forked
+            executor = ProcessPoolExecutor(max_workers or min(os.cpu_count() or 1, 8),
+                                           mp_context=multiprocessing.get_context('spawn'))
+        self.executor = executor
+        self.keep = keep
+        self._jobs = OrderedDict()
+        self._active = {}
+        # reentrant: cancelling a future runs its done callback (_task_done) right away
+        self._lock = threading.RLock()
+
+    def submit(self, runs) -> str:
+        """Queue a job of ``runs`` (spec dicts) and return its id, or the id of
+        an identical job that is still queued or running."""
+        tasks = [_normalize(run) for run in runs]
+        if not tasks:
+            raise ValueError("a job needs at least one run")
+        key = hashlib.sha256(json.dumps(tasks).encode()).hexdigest()
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None:
+                return job.id
+            job = Job(uuid.uuid4().hex, key, tasks)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._trim()
+            job.futures = [self.executor.submit(_run_task, task) for task in tasks]
+        # callbacks take the lock, so they're attached once it's released
+        for i, future in enumerate(job.futures):
+            future.add_done_callback(lambda f, job=job, i=i: self._task_done(job, i, f))
+        return job.id
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.state not in ACTIVE]
+        for job_id in finished[:max(0, len(self._jobs) - self.keep)]:
+            del self._jobs[job_id]
+
+    def _finish(self, job: Job, state: str, error: str = None):
+        job.state, job.error, job.finished = state, error, time.time()
+        if self._active.get(job.key) is job:
+            del self._active[job.key]
+
+    def _task_done(self, job: Job, i: int, future):
+        with self._lock:
+            if job.state not in ACTIVE or future.cancelled():
+                return
+            error = future.exception()
+            if error is not None:
+                for other in job.futures:
+                    other.cancel()
+                self._finish(job, 'failed', f'{type(error).__name__}: {error}')
+                return
+            job.results[i] = future.result()
+            job.done += 1
+            if job.done == len(job.tasks):
+                self._finish(job, 'done')
+
+    def _job(self, job_id: str) -> Job:
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise LookupError(f"no job {job_id!r}")
+        return job
+
+    def status(self, job_id: str) -> dict:
+        """``{'id', 'status', 'done', 'total', 'error', 'submitted', 'finished'}``;
+        status is one of queued, running, done, failed or cancelled."""
+        with self._lock:
+            return self._job(job_id).status()
+
+    def jobs(self) -> list:
+        with self._lock:
+            return [job.status() for job in self._jobs.values()]
+
+    def result(self, job_id: str) -> list:
+        """``(equity, metrics)`` per run of a finished job, in submission order."""
+        with self._lock:
+            job = self._job(job_id)
+            if job.state != 'done':
+                raise ValueError(f"job {job_id} is {job.status()['status']}")
+            return list(job.results)
+
+    def cancel(self, job_id: str) -> dict:
+        """Cancel a queued or running job: runs that haven't started are
+        dropped and the results of the running ones discarded."""
+        with self._lock:
+            job = self._job(job_id)
+            if job.state in ACTIVE:
+                for future in job.futures:
+                    future.cancel()
+                self._finish(job, 'cancelled')
+            return job.status()
+
+    def close(self, wait: bool = True):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def wait(service, job_id: str, poll: float = 0.5, timeout: float = None, progress=None) -> list:
+    """Poll ``service`` (a BacktestService or ServiceClient) until the job
+    finishes and return its results; ``progress(status)`` is called on every
+    poll. Raises ValueError if the job failed or was cancelled and
+    TimeoutError after ``timeout`` seconds."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        status = service.status(job_id)
+        if progress:
+            progress(status)
+        if status['status'] == 'done':
+            return service.result(job_id)
+        if status['status'] not in ACTIVE:
+            raise ValueError(f"job {job_id} {status['status']}: {status['error'] or ''}".rstrip(': '))
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError(f"job {job_id} still {status['status']} after {timeout}s")
+        time.sleep(poll)
+
+
+def _encode_equity(equity: pd.Series) -> dict:
+    index = equity.index
+    if isinstance(index, pd.DatetimeIndex):
+        return {'kind': 'datetime', 'unit': index.unit, 'tz': None if index.tz is None else str(index.tz),
+                'index': index.asi8.tolist(), 'values': equity.tolist()}
+    return {'kind': 'number', 'tz': None, 'index': index.tolist(), 'values': equity.tolist()}
+
+
+def _decode_equity(data: dict) -> pd.Series:
+    if data['kind'] == 'datetime':
+        index = pd.DatetimeIndex(np.asarray(data['index'], dtype=f"M8[{data['unit']}]"))
+        if data['tz'] is not None:
+            index = index.tz_localize('UTC').tz_convert(data['tz'])
+    else:
+        index = pd.Index(data['index'])
+    return pd.Series(data['values'], index=index, dtype=float)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'QuantGym/1'
+
+    def _send(self, code: int, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, handle):
+        url = urllib.parse.urlsplit(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        try:
+            self._send(200, handle(parts, urllib.parse.parse_qs(url.query)))
+        except LookupError as e:
+            self._send(404, {'error': str(e)})
+        except (ValueError, TypeError) as e:
+            self._send(400, {'error': str(e)})
+        except Exception as e:
+            self._send(500, {'error': f'{type(e).__name__}: {e}'})
+
+    def do_GET(self):
+        def handle(parts, query):
+            service = self.server.service
+            if parts == ['jobs']:
+                return {'jobs': service.jobs()}
+            if len(parts) == 2 and parts[0] == 'jobs':
+                return service.status(parts[1])
+            if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'result':
+                points = int(query['points'][0]) if 'points' in query else None
+                out = []
+                for equity, metrics in service.result(parts[1]):
+                    if points:
+                        equity = report.downsample(equity, points)
+                    out.append({'equity': _encode_equity(equity), 'metrics': metrics})
+                return {'results': out}
+            if parts == ['health']:
+                return {'status': 'ok'}
+            raise LookupError(f"no route {self.path}")
+        self._route(handle)
+
+    def do_POST(self):
+        def handle(parts, query):
+            if parts != ['jobs']:
+                raise LookupError(f"no route {self.path}")
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            return {'id': self.server.service.submit(body.get('runs', []))}
+        self._route(handle)
+
+    def do_DELETE(self):
+        def handle(parts, query):
+            if len(parts) != 2 or parts[0] != 'jobs':
+                raise LookupError(f"no route {self.path}")
+            return self.server.service.cancel(parts[1])
+        self._route(handle)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, service: BacktestService = None,
+          verbose: bool = False) -> ThreadingHTTPServer:
+    """An HTTP server for ``service`` (a new one if None), not yet started:
+    call ``serve_forever`` (port 0 picks a free port, see ``server_address``)."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.service = service if service is not None else BacktestService()
+    server.verbose = verbose
+    return server
+
+
+class ServiceClient:
+    """BacktestService's methods over its HTTP API."""
+
+    def __init__(self, url: str = f'http://{DEFAULT_HOST}:{DEFAULT_PORT}', timeout: float = 30.0):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, payload=None):
+        data = None if payload is None else json.dumps(payload).encode()
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            error = json.loads(e.read() or b'{}').get('error', str(e))
+            raise (LookupError if e.code == 404 else ValueError)(error) from None
+
+    def submit(self, runs) -> str:
+        return self._request('POST', '/jobs', {'runs': list(runs)})['id']
+
+    def status(self, job_id: str) -> dict:
+        return self._request('GET', f'/jobs/{job_id}')
+
+    def jobs(self) -> list:
+        return self._request('GET', '/jobs')['jobs']
+
+    def result(self, job_id: str, points: int = None) -> list:
+        """``(equity, metrics)`` per run; ``points`` downsamples the curves server-side."""
+        query = f'?points={int(points)}' if points else ''
+        return [(_decode_equity(r['equity']), r['metrics'])
+                for r in self._request('GET', f'/jobs/{job_id}/result{query}')['results']]
+
+    def cancel(self, job_id: str) -> dict:
+        return self._request('DELETE', f'/jobs/{job_id}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve backtests over HTTP.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+
+    with BacktestService(args.workers) as service:
+        server = serve(args.host, args.port, service, args.verbose)
+        print(f'Serving backtests on http://{server.server_address[0]}:{server.server_address[1]}')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
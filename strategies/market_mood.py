@@ -1,46 +1,138 @@
 # strategies/market_mood.py
 import pandas as pd
 import numpy as np
+import precision
+import profiling
+import indicators
+from indicators import RollingZScore, RollingZScoreChunks
+from kernels import crossed_above, crossed_below, hold_positions
 
-def generate_pairs_signals(price_a, price_b, window=20, entry_z=2.0, exit_z=0.5):
+
+def zscore(spread: pd.Series, window) -> np.ndarray:
+    """Rolling z-score of the spread, with a zero rolling std replaced by 1
+    (one column per window when ``window`` is a sequence)."""
+    return indicators.rolling_zscore(spread.to_numpy(), window)
+
+
+def _signal_changes(z: np.ndarray, entry_z, exit_z) -> np.ndarray:
+    changes = np.zeros(z.shape, dtype=precision.signal_dtype())
+    changes[crossed_above(z, entry_z)] = -1  # Enter short spread
+    changes[crossed_below(z, -np.asarray(entry_z))] = 1  # Enter long spread
+    changes[crossed_below(abs(z), exit_z)] = 0  # Exit position
+    return changes
+
+
+def positions_from_zscore(z: np.ndarray, entry_z, exit_z) -> np.ndarray:
+    """Held spread positions (``pos_a``) from a precomputed z-score (1-D or 2-D)."""
+    return hold_positions(_signal_changes(z, entry_z, exit_z))
+
+
+@profiling.stage('market_mood.generate_pairs_signals')
+def generate_pairs_signals(price_a, price_b, window=20, entry_z=2.0, exit_z=0.5, hedge_ratio=1.0):
     """
     Generate pairs trading signals based on z-score of spread between two assets.
+    The spread is ``price_a - hedge_ratio * price_b`` (see screening.py for
+    estimating the ratio); both legs still trade the same notional.
     """
     # Align the two price series
-    df = pd.DataFrame({'a': price_a, 'b': price_b}).dropna()
-    
-    # Calculate spread (price_a - price_b)
-    df['spread'] = df['a'] - df['b']
+    df = pd.DataFrame({'a': price_a, 'b': price_b}, copy=False).dropna()
     
-    # Calculate z-score of spread
-    rolling_mean = df['spread'].rolling(window=window).mean()
-    rolling_std = df['spread'].rolling(window=window).std()
-    
-    # Avoid division by zero
-    rolling_std = rolling_std.replace(0, 1)
-    
-    df['z'] = (df['spread'] - rolling_mean) / rolling_std
-    
-    # Generate SIGNAL changes (not positions)
-    df['signal_change'] = 0
-    df.loc[(df['z'] > entry_z) & (df['z'].shift(1) <= entry_z), 'signal_change'] = -1  # Enter short spread
-    df.loc[(df['z'] < -entry_z) & (df['z'].shift(1) >= -entry_z), 'signal_change'] = 1   # Enter long spread
-    df.loc[(abs(df['z']) < exit_z) & (abs(df['z'].shift(1)) >= exit_z), 'signal_change'] = 0  # Exit position
+    # Calculate spread (price_a - hedge_ratio * price_b) and its z-score
+    z = zscore(df['a'] - hedge_ratio * df['b'], window)
     
     # Convert signal changes to positions (hold until exit signal)
-    current_signal = 0
-    positions = []
+    position = positions_from_zscore(z, entry_z, exit_z)
     
-    for change in df['signal_change']:
-        if change != 0:
-            current_signal = change
-        positions.append(current_signal)
+    # Create position dataframe: long/short asset A, the inverse in asset B
+    dfpos = pd.DataFrame({'pos_a': position, 'pos_b': -position}, index=df.index, copy=False)
     
-    df['position'] = positions
-    
-    # Create position dataframe
-    dfpos = pd.DataFrame(index=df.index)
-    dfpos['pos_a'] = df['position']  # Position in asset A
-    dfpos['pos_b'] = -df['position']  # Position in asset B (inverse)
-    
-    return dfpos
\ No newline at end of file
+    return dfpos
+
+
+@profiling.stage('market_mood.generate_pairs_signals_grid')
+def generate_pairs_signals_grid(price_a, price_b, params, cache: dict = None) -> pd.DataFrame:
+    """Spread positions for many (window, entry_z, exit_z) triples in one 2-D pass.
+
+    Column ``(window, entry_z, exit_z)`` equals the ``pos_a`` column of
+    ``generate_pairs_signals`` for those parameters (``pos_b`` is its negation).
+    The rolling z-score is computed once per distinct window and stored in
+    ``cache``.
+    """
+    params = [tuple(p) for p in params]
+    cache = {} if cache is None else cache
+    df = pd.DataFrame({'a': price_a, 'b': price_b}, copy=False).dropna()
+    spread = df['a'] - df['b']
+    missing = sorted({p[0] for p in params if ('z', p[0]) not in cache})
+    if missing:
+        for window, z in zip(missing, zscore(spread, missing).T):
+            cache[('z', window)] = z
+    z = np.column_stack([cache[('z', p[0])] for p in params])
+    entry = np.array([p[1] for p in params], dtype=float)
+    exit_ = np.array([p[2] for p in params], dtype=float)
+    columns = pd.MultiIndex.from_tuples(params, names=['window', 'entry_z', 'exit_z'])
+    return pd.DataFrame(positions_from_zscore(z, entry, exit_), index=df.index, columns=columns, copy=False)
+
+
+@profiling.stage('market_mood.generate_pairs_signals_paths')
+def generate_pairs_signals_paths(prices_a: np.ndarray, prices_b: np.ndarray, window=20, entry_z=2.0,
+                                 exit_z=0.5, hedge_ratio=1.0) -> np.ndarray:
+    """Spread positions (``pos_a``) for every column of two aligned (bars x
+    paths) price matrices in one 2-D pass; column ``j`` equals
+    ``generate_pairs_signals`` on ``prices_a[:, j]``, ``prices_b[:, j]``.
+    ``hedge_ratio`` may also hold one ratio per column. Unlike that function,
+    rows with a missing price aren't dropped."""
+    spread = prices_a - np.asarray(hedge_ratio, dtype=float) * prices_b
+    return positions_from_zscore(indicators.rolling_zscore(spread, window), entry_z, exit_z)
+
+
+class PairsStream:
+    """Bar-by-bar ``generate_pairs_signals``: ``update(price_a, price_b)``
+    returns ``pos_a`` for that bar in O(1) (``pos_b`` is its negation), or
+    None when either price is missing since the batch version drops that bar."""
+
+    def __init__(self, window: int = 20, entry_z: float = 2.0, exit_z: float = 0.5):
+        self.entry_z = entry_z
+        self.exit_z = exit_z
+        self.zscore = RollingZScore(window)
+        self.prev = float('nan')
+        self.position = 0
+
+    def update(self, price_a: float, price_b: float):
+        if price_a != price_a or price_b != price_b:
+            return None
+        z, prev = self.zscore.update(price_a - price_b), self.prev
+        change = 0
+        if z > self.entry_z and prev <= self.entry_z:
+            change = -1  # Enter short spread
+        if z < -self.entry_z and prev >= -self.entry_z:
+            change = 1  # Enter long spread
+        if abs(z) < self.exit_z and abs(prev) >= self.exit_z:
+            change = 0  # Exit position
+        if change != 0:
+            self.position = change
+        self.prev = z
+        return self.position
+
+
+class PairsChunks:
+    """Chunk-at-a-time ``generate_pairs_signals``: ``update(prices_a, prices_b)``
+    returns ``pos_a`` for that chunk (``pos_b`` is its negation). Like the
+    batch version it expects both prices on every bar; drop the rest first."""
+
+    def __init__(self, window: int = 20, entry_z: float = 2.0, exit_z: float = 0.5):
+        self.entry_z = entry_z
+        self.exit_z = exit_z
+        self.zscore = RollingZScoreChunks(window)
+        self.prev = float('nan')
+        self.position = 0
+
+    def update(self, prices_a, prices_b) -> np.ndarray:
+        z = self.zscore.update(np.asarray(prices_a, dtype=float) - np.asarray(prices_b, dtype=float))
+        if len(z) == 0:
+            return np.zeros(0, dtype=precision.signal_dtype())
+        # lead with the previous chunk's last bar so crossings and holds carry over
+        changes = _signal_changes(np.concatenate([[self.prev], z]), self.entry_z, self.exit_z)
+        changes[0] = self.position
+        positions = hold_positions(changes)[1:]
+        self.prev, self.position = z[-1], positions[-1]
+        return positions
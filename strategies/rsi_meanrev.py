@@ -1,39 +1,115 @@
+import numpy as np
 import pandas as pd
+import precision
+import profiling
+import indicators
+from indicators import RSI, RSIChunks
+from kernels import crossed_above, crossed_below, hold_positions
 
 def rsi(series: pd.Series, period: int = 14) -> pd.Series:
-    delta = series.diff()
-    up = delta.clip(lower=0)
-    down = -delta.clip(upper=0)
-    
-    # Use exponential moving average for smoother RSI
-    up_ema = up.ewm(span=period, adjust=False).mean()
-    down_ema = down.ewm(span=period, adjust=False).mean()
-    
-    rs = up_ema / down_ema
-    rsi = 100 - (100 / (1 + rs))
-    return rsi
+    """100 - 100 / (1 + RS), RS being the ratio of the exponential moving
+    averages (span ``period``) of up and down moves (see indicators.rsi)."""
+    return pd.Series(indicators.rsi(series.to_numpy(), period), index=series.index, copy=False)
 
-def generate_signals(price: pd.Series, low: int = 30, high: int = 70, period: int = 14) -> pd.Series:
-    df = pd.DataFrame({'close': price})
-    df['rsi'] = rsi(df['close'], period)
-    
-    # Generate signals based on RSI levels
-    df['signal'] = 0
+
+def _signal_changes(values: np.ndarray, low, high) -> np.ndarray:
+    changes = np.zeros(values.shape, dtype=precision.signal_dtype())
     # Buy when RSI crosses above oversold level
-    df.loc[(df['rsi'] > low) & (df['rsi'].shift(1) <= low), 'signal'] = 1
+    changes[crossed_above(values, low)] = 1
     # Sell when RSI crosses below overbought level
-    df.loc[(df['rsi'] < high) & (df['rsi'].shift(1) >= high), 'signal'] = -1
+    changes[crossed_below(values, high)] = -1
     # Exit when RSI crosses back to neutral
-    df.loc[((df['rsi'] < low) & (df['rsi'].shift(1) >= low)) | 
-           ((df['rsi'] > high) & (df['rsi'].shift(1) <= high)), 'signal'] = 0
-    
+    changes[crossed_below(values, low) | crossed_above(values, high)] = 0
+    return changes
+
+
+def positions_from_rsi(values: np.ndarray, low, high) -> np.ndarray:
+    """Held positions from precomputed RSI values (1-D, or 2-D with per-column levels)."""
+    return hold_positions(_signal_changes(values, low, high))
+
+
+@profiling.stage('rsi_meanrev.generate_signals')
+def generate_signals(price: pd.Series, low: int = 30, high: int = 70, period: int = 14) -> pd.Series:
+    values = rsi(price, period).to_numpy()
     # Convert signal changes to positions
-    current_position = 0
-    positions = []
-    
-    for signal in df['signal']:
-        if signal != 0:  # Only change position on actual signals
-            current_position = signal
-        positions.append(current_position)
-    
-    return pd.Series(positions, index=df.index, name='position')
\ No newline at end of file
+    positions = positions_from_rsi(values, low, high)
+    return pd.Series(positions, index=price.index, name='position', copy=False)
+
+
+@profiling.stage('rsi_meanrev.generate_signals_grid')
+def generate_signals_grid(price: pd.Series, params, cache: dict = None) -> pd.DataFrame:
+    """Positions for many (low, high, period) triples in one 2-D pass.
+
+    Column ``(low, high, period)`` equals ``generate_signals(price, low, high, period)``.
+    The RSI (and its up/down EWMs) is computed once per distinct period and
+    stored in ``cache``.
+    """
+    params = [tuple(p) for p in params]
+    cache = {} if cache is None else cache
+    missing = sorted({p[2] for p in params if ('rsi', p[2]) not in cache})
+    if missing:
+        for period, values in zip(missing, indicators.rsi(price.to_numpy(), missing).T):
+            cache[('rsi', period)] = values
+    values = np.column_stack([cache[('rsi', p[2])] for p in params])
+    low = np.array([p[0] for p in params], dtype=float)
+    high = np.array([p[1] for p in params], dtype=float)
+    columns = pd.MultiIndex.from_tuples(params, names=['low', 'high', 'period'])
+    return pd.DataFrame(positions_from_rsi(values, low, high), index=price.index, columns=columns, copy=False)
+
+
+@profiling.stage('rsi_meanrev.generate_signals_paths')
+def generate_signals_paths(prices: np.ndarray, low: int = 30, high: int = 70, period: int = 14) -> np.ndarray:
+    """Positions for every column of a (bars x paths) price matrix in one 2-D
+    pass; column ``j`` equals ``generate_signals`` on ``prices[:, j]``."""
+    return positions_from_rsi(indicators.rsi(prices, period), low, high)
+
+
+class RSIStream:
+    """Bar-by-bar ``generate_signals``: ``update(price)`` returns the position
+    for that bar in O(1), identical to the batch result for the same prices."""
+
+    def __init__(self, low: int = 30, high: int = 70, period: int = 14):
+        self.low = low
+        self.high = high
+        self.rsi = RSI(period)
+        self.prev = float('nan')
+        self.position = 0
+
+    def update(self, price: float) -> int:
+        value, prev = self.rsi.update(price), self.prev
+        low, high = self.low, self.high
+        change = 0
+        if value > low and prev <= low:
+            change = 1
+        if value < high and prev >= high:
+            change = -1
+        if (value < low and prev >= low) or (value > high and prev <= high):
+            change = 0
+        if change != 0:
+            self.position = change
+        self.prev = value
+        return self.position
+
+
+class RSIMeanRevChunks:
+    """Chunk-at-a-time ``generate_signals``: ``update(prices)`` returns the
+    positions for that chunk, identical to the batch result for the
+    concatenated prices."""
+
+    def __init__(self, low: int = 30, high: int = 70, period: int = 14):
+        self.low = low
+        self.high = high
+        self.rsi = RSIChunks(period)
+        self.prev = float('nan')
+        self.position = 0
+
+    def update(self, prices) -> np.ndarray:
+        values = self.rsi.update(prices)
+        if len(values) == 0:
+            return np.zeros(0, dtype=precision.signal_dtype())
+        # lead with the previous chunk's last bar so crossings and holds carry over
+        changes = _signal_changes(np.concatenate([[self.prev], values]), self.low, self.high)
+        changes[0] = self.position
+        positions = hold_positions(changes)[1:]
+        self.prev, self.position = values[-1], positions[-1]
+        return positions
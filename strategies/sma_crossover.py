@@ -1,24 +1,101 @@
+import numpy as np
 import pandas as pd
+import precision
+import profiling
+import indicators
+from indicators import RollingMean, RollingMeanChunks
+from kernels import crossed_above, crossed_below, hold_positions
 
-def generate_signals(price: pd.Series, short_window: int = 20, long_window: int = 50) -> pd.Series:
-    df = pd.DataFrame({'close': price})
-    df['sma_s'] = df['close'].rolling(short_window).mean()
-    df['sma_l'] = df['close'].rolling(long_window).mean()
-    
-    # Generate signals based on crossover
-    df['signal'] = 0
+
+def _signal_changes(sma_s: np.ndarray, sma_l: np.ndarray) -> np.ndarray:
+    changes = np.zeros(sma_s.shape, dtype=precision.signal_dtype())
     # Golden cross: short MA crosses above long MA -> BUY
-    df.loc[(df['sma_s'] > df['sma_l']) & (df['sma_s'].shift(1) <= df['sma_l'].shift(1)), 'signal'] = 1
+    changes[crossed_above(sma_s, sma_l)] = 1
     # Death cross: short MA crosses below long MA -> SELL
-    df.loc[(df['sma_s'] < df['sma_l']) & (df['sma_s'].shift(1) >= df['sma_l'].shift(1)), 'signal'] = -1
-    
+    changes[crossed_below(sma_s, sma_l)] = -1
+    return changes
+
+
+def positions_from_averages(sma_s: np.ndarray, sma_l: np.ndarray) -> np.ndarray:
+    """Held positions from precomputed short/long moving averages (1-D or 2-D)."""
+    return hold_positions(_signal_changes(sma_s, sma_l))
+
+
+@profiling.stage('sma_crossover.generate_signals')
+def generate_signals(price: pd.Series, short_window: int = 20, long_window: int = 50) -> pd.Series:
+    # both moving averages in one kernel call
+    sma_s, sma_l = indicators.rolling_mean(price.to_numpy(), [short_window, long_window]).T
     # Convert signal changes to positions (hold until opposite signal)
-    current_position = 0
-    positions = []
-    
-    for signal in df['signal']:
-        if signal != 0:  # Only change position on actual crossover signals
-            current_position = signal
-        positions.append(current_position)
-    
-    return pd.Series(positions, index=df.index, name='position')
\ No newline at end of file
+    positions = positions_from_averages(sma_s, sma_l)
+    return pd.Series(positions, index=price.index, name='position', copy=False)
+
+
+@profiling.stage('sma_crossover.generate_signals_grid')
+def generate_signals_grid(price: pd.Series, params, cache: dict = None) -> pd.DataFrame:
+    """Positions for many (short_window, long_window) pairs in one 2-D pass.
+
+    Column ``(s, l)`` equals ``generate_signals(price, s, l)``. Each distinct
+    window's moving average is computed once and stored in ``cache`` so that
+    repeated calls on the same price series can share it.
+    """
+    params = [tuple(p) for p in params]
+    cache = {} if cache is None else cache
+    missing = sorted({w for p in params for w in p if ('sma', w) not in cache})
+    if missing:
+        for w, sma in zip(missing, indicators.rolling_mean(price.to_numpy(), missing).T):
+            cache[('sma', w)] = sma
+    sma_s = np.column_stack([cache[('sma', s)] for s, _ in params])
+    sma_l = np.column_stack([cache[('sma', l)] for _, l in params])
+    columns = pd.MultiIndex.from_tuples(params, names=['short_window', 'long_window'])
+    return pd.DataFrame(positions_from_averages(sma_s, sma_l), index=price.index, columns=columns, copy=False)
+
+
+@profiling.stage('sma_crossover.generate_signals_paths')
+def generate_signals_paths(prices: np.ndarray, short_window: int = 20, long_window: int = 50) -> np.ndarray:
+    """Positions for every column of a (bars x paths) price matrix in one 2-D
+    pass; column ``j`` equals ``generate_signals`` on ``prices[:, j]``."""
+    return positions_from_averages(indicators.rolling_mean(prices, short_window),
+                                   indicators.rolling_mean(prices, long_window))
+
+
+class SMACrossoverStream:
+    """Bar-by-bar ``generate_signals``: ``update(price)`` returns the position
+    for that bar in O(1), identical to the batch result for the same prices."""
+
+    def __init__(self, short_window: int = 20, long_window: int = 50):
+        self.sma_s = RollingMean(short_window)
+        self.sma_l = RollingMean(long_window)
+        self.prev_s = self.prev_l = float('nan')
+        self.position = 0
+
+    def update(self, price: float) -> int:
+        sma_s, sma_l = self.sma_s.update(price), self.sma_l.update(price)
+        if sma_s > sma_l and self.prev_s <= self.prev_l:
+            self.position = 1
+        elif sma_s < sma_l and self.prev_s >= self.prev_l:
+            self.position = -1
+        self.prev_s, self.prev_l = sma_s, sma_l
+        return self.position
+
+
+class SMACrossoverChunks:
+    """Chunk-at-a-time ``generate_signals``: ``update(prices)`` returns the
+    positions for that chunk, identical to the batch result for the
+    concatenated prices."""
+
+    def __init__(self, short_window: int = 20, long_window: int = 50):
+        self.sma_s = RollingMeanChunks(short_window)
+        self.sma_l = RollingMeanChunks(long_window)
+        self.prev_s = self.prev_l = float('nan')
+        self.position = 0
+
+    def update(self, prices) -> np.ndarray:
+        sma_s, sma_l = self.sma_s.update(prices), self.sma_l.update(prices)
+        if len(sma_s) == 0:
+            return np.zeros(0, dtype=precision.signal_dtype())
+        # lead with the previous chunk's last bar so crossings and holds carry over
+        changes = _signal_changes(np.concatenate([[self.prev_s], sma_s]), np.concatenate([[self.prev_l], sma_l]))
+        changes[0] = self.position
+        positions = hold_positions(changes)[1:]
+        self.prev_s, self.prev_l, self.position = sma_s[-1], sma_l[-1], positions[-1]
+        return positions
@@ -0,0 +1,83 @@
+# streaming.py
+"""Bar-by-bar (live / paper trading) driver.
+
+Streaming strategies (``SMACrossoverStream``, ``RSIStream``, ``PairsStream``)
+keep rolling indicator state and ``Backtester.on_bar`` keeps the account
+state, so each new bar costs O(1) instead of re-running the whole history.
+``ReplaySource`` plays cached history back as a feed for testing.
+"""
+import numpy as np
+import pandas as pd
+
+from backtester import Backtester
+from ledger import TradeLedger
+from price_cache import PriceCache
+
+
+class ReplaySource:
+    """Replays cached close prices for one or more symbols in time order.
+
+    Yields ``(t, prices)`` with one price per symbol on the union of their
+    dates (NaN where a symbol has no bar), like a live multi-symbol feed.
+    """
+
+    def __init__(self, cache: PriceCache, symbols, start, end, interval: str = '1d'):
+        self.symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+        closes = {s: cache.get(s, start, end, interval)['close'] for s in self.symbols}
+        self.frame = pd.DataFrame(closes)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __iter__(self):
+        values = self.frame.to_numpy(dtype=float)
+        for t, row in zip(self.frame.index, values):
+            yield t, tuple(row)
+
+
+class LiveRunner:
+    """Feeds bars to a streaming strategy and one Backtester per traded leg.
+
+    Single-asset strategies trade one leg; pair strategies (``update(price_a,
+    price_b)``) trade long/short legs. Legs are sized and share ``cash`` the
+    way PortfolioBacktester does.
+    """
+
+    def __init__(self, strategy, legs: int = 1, cash: float = 100000, commission: float = 0.0,
+                 pct_risk: float = 0.1):
+        self.strategy = strategy
+        self.pct_risk = pct_risk
+        self.cash = cash
+        self.backtesters = [Backtester(cash=cash, commission=commission) for _ in range(legs)]
+        self.dates = []
+        self.equity = []
+
+    def on_bar(self, t, *prices):
+        """Process one bar; returns the combined equity, or None if the
+        strategy skipped the bar."""
+        position = self.strategy.update(*prices)
+        if position is None:
+            return None
+        # pair legs hold opposite positions
+        signals = (position, -position)[:len(self.backtesters)]
+        # every leg starts from the full cash balance; count it once
+        equity = -(len(self.backtesters) - 1) * self.cash
+        for bt, p, s in zip(self.backtesters, prices, signals):
+            equity = equity + bt.on_bar(t, p, s, self.pct_risk)
+        self.dates.append(t)
+        self.equity.append(equity)
+        return equity
+
+    def run(self, source) -> pd.Series:
+        """Consume every bar from ``source`` and return the equity curve."""
+        for t, prices in source:
+            self.on_bar(t, *prices)
+        return self.equity_curve()
+
+    def equity_curve(self) -> pd.Series:
+        return pd.Series(np.array(self.equity, dtype=float), index=pd.Index(self.dates))
+
+    @property
+    def history(self) -> TradeLedger:
+        """Every leg's trades in time order, tagged with the leg number as asset."""
+        return TradeLedger.merge(bt.history for bt in self.backtesters)
@@ -0,0 +1,72 @@
+# sweep.py
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from backtester import Backtester, PortfolioBacktester
+from strategies import sma_crossover, rsi_meanrev, market_mood
+
+# strategy name -> batched signal generator. market_mood takes a
+# (price_a, price_b) pair in place of the price series.
+GRID_SIGNALS = {
+    'sma_crossover': sma_crossover.generate_signals_grid,
+    'rsi_meanrev': rsi_meanrev.generate_signals_grid,
+    'market_mood': market_mood.generate_pairs_signals_grid,
+}
+PAIR_STRATEGIES = {'market_mood'}
+
+
+def param_grid(*axes):
+    """Every combination of the given parameter values, e.g.
+    ``param_grid(range(5, 55), range(50, 200))`` for (short_window, long_window)."""
+    return list(itertools.product(*axes))
+
+
+def grid_positions(strategy: str, price, params, cache: dict = None) -> pd.DataFrame:
+    """Positions for every parameter tuple, one column each."""
+    if strategy in PAIR_STRATEGIES:
+        return GRID_SIGNALS[strategy](*price, params, cache=cache)
+    return GRID_SIGNALS[strategy](price, params, cache=cache)
+
+
+def grid_equity(strategy: str, price, positions: pd.DataFrame, cash: float = 100000, commission: float = 0.0,
+                pct_risk: float = 0.1) -> pd.DataFrame:
+    """Equity of every column of ``positions``. Pair strategies run as a
+    two-asset portfolio, long A / short B for a long spread."""
+    if strategy in PAIR_STRATEGIES:
+        prices = pd.DataFrame({'a': price[0], 'b': price[1]}).reindex(positions.index)
+        bt = PortfolioBacktester(prices, cash=cash, commission=commission)
+        return bt.run_signals_matrix({'a': positions, 'b': -positions}, pct_risk)
+    price = price.reindex(positions.index)
+    return Backtester(price, cash=cash, commission=commission).run_signals_matrix(positions, pct_risk)
+
+
+def _trade_counts(positions: pd.DataFrame) -> np.ndarray:
+    active = positions.to_numpy() != 0
+    return active[0] + (active[1:] & ~active[:-1]).sum(axis=0)
+
+
+def run_sweep(price, strategy: str, params, cash: float = 100000, commission: float = 0.0,
+              pct_risk: float = 0.1, chunk_size: int = 500) -> pd.DataFrame:
+    """Backtest ``strategy`` for every parameter tuple in ``params``.
+
+    Signals for a chunk of parameter sets are built as one 2-D array and
+    backtested together; indicators are shared across chunks. Returns one row
+    of performance metrics (plus the number of trades) per parameter set.
+    """
+    params = [tuple(p) for p in params]
+    cache = {}
+    tables = []
+    for i in range(0, len(params), chunk_size):
+        positions = grid_positions(strategy, price, params[i:i + chunk_size], cache)
+        equity = grid_equity(strategy, price, positions, cash, commission, pct_risk)
+        table = Backtester.performance_metrics_matrix(equity)
+        table['trades'] = _trade_counts(positions)
+        tables.append(table)
+    return pd.concat(tables)
+
+
+def run_pairs_sweep(price_a: pd.Series, price_b: pd.Series, params, **kwargs) -> pd.DataFrame:
+    """run_sweep for market_mood's (window, entry_z, exit_z) grid."""
+    return run_sweep((price_a, price_b), 'market_mood', params, **kwargs)
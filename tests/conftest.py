@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _gbm_prices(n=500, rng=0, s0=100.0, mu=0.0, sigma=0.01, start='2020-01-01', freq='B', tz=None, name=None):
+    """``n`` closes of a geometric random walk: ``s0 * exp(cumsum(normal(mu, sigma)))``
+    on a ``freq`` date index. ``rng`` is a seed, or a Generator to keep drawing
+    from (several series, or prices and then signals, from one stream)."""
+    rng = np.random.default_rng(rng)
+    dates = pd.date_range(start, periods=n, freq=freq, tz=tz)
+    return pd.Series(s0 * np.exp(np.cumsum(rng.normal(mu, sigma, n))), index=dates, name=name)
+
+
+@pytest.fixture
+def gbm_prices():
+    """Factory for synthetic price series, see _gbm_prices."""
+    return _gbm_prices
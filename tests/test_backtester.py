@@ -1,9 +1,124 @@
+import numpy as np
 import pandas as pd
-from backtester import Backtester
+import pytest
+from backtester import Backtester, PortfolioBacktester
 
 
 def test_backtester_basic():
-dates = pd.date_range('2020-01-01', periods=10)
-price = pd.Series([100 + i for i in range(10)], index=dates)
-# simple buy at start hold till end
-signals
\ No newline at end of file
+    dates = pd.date_range('2020-01-01', periods=10)
+    price = pd.Series([100 + i for i in range(10)], index=dates)
+    # simple buy at start hold till end
+    signals = pd.Series(1, index=dates)
+    bt = Backtester(price, cash=100000)
+    equity = bt.run_signals(signals)
+    assert equity.iloc[0] == pytest.approx(100000)
+    assert equity.iloc[-1] == pytest.approx(100000 + 100 * 9)
+    assert list(bt.history.to_frame()['side']) == ['enter']
+
+
+def _random_case(seed, n=500, nan_price=False):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2015-01-01', periods=n, freq='B')
+    price = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.01, n))), index=dates)
+    if nan_price:
+        price.iloc[rng.choice(n, 5, replace=False)] = np.nan
+    # sparse regime changes including direct long <-> short flips and fractional signals
+    raw = rng.choice([-1.0, 0.0, 0.5, 1.0], size=n)
+    signals = pd.Series(raw, index=dates).where(rng.random(n) < 0.05).ffill().fillna(0)
+    return price, signals
+
+
+def _run(price, signals, engine, **kwargs):
+    bt = Backtester(price, cash=100000, commission=0.01)
+    equity = bt.run_signals(signals, engine=engine, **kwargs)
+    return equity, bt.history.to_frame()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_vectorized_matches_loop(seed):
+    price, signals = _random_case(seed)
+    eq_loop, hist_loop = _run(price, signals, 'loop')
+    eq_vec, hist_vec = _run(price, signals, 'vectorized')
+    pd.testing.assert_series_equal(eq_vec, eq_loop, check_exact=True, check_freq=False)
+    pd.testing.assert_frame_equal(hist_vec, hist_loop, check_exact=True)
+
+
+def test_vectorized_matches_loop_with_gaps():
+    price, signals = _random_case(7, nan_price=True)
+    # signals on a sparser index are reindexed and zero-filled
+    signals = signals.iloc[::2]
+    eq_loop, hist_loop = _run(price, signals, 'loop', pct_risk=0.25)
+    eq_vec, hist_vec = _run(price, signals, 'vectorized', pct_risk=0.25)
+    pd.testing.assert_series_equal(eq_vec, eq_loop, check_exact=True, check_freq=False)
+    # NaN prices at trade bars compare equal
+    pd.testing.assert_frame_equal(hist_vec, hist_loop, check_exact=True)
+
+
+@pytest.mark.parametrize('values', [[0, 0, 0], [1, 1, 1], [-1, 0, 1], [0, 1, 0]])
+def test_vectorized_matches_loop_edge_cases(values):
+    dates = pd.date_range('2020-01-01', periods=len(values))
+    price = pd.Series([10.0, 11.0, 9.0], index=dates)
+    signals = pd.Series(values, index=dates)
+    eq_loop, hist_loop = _run(price, signals, 'loop')
+    eq_vec, hist_vec = _run(price, signals, 'vectorized')
+    pd.testing.assert_series_equal(eq_vec, eq_loop, check_exact=True, check_freq=False)
+    pd.testing.assert_frame_equal(hist_vec, hist_loop, check_exact=True)
+
+
+def test_unknown_engine():
+    price, signals = _random_case(0, n=10)
+    with pytest.raises(ValueError):
+        Backtester(price).run_signals(signals, engine='gpu')
+
+
+def _portfolio_case(n_assets=4, seed=7):
+    cases = [_random_case(seed + k) for k in range(n_assets)]
+    prices = pd.DataFrame({f'A{k}': p for k, (p, _) in enumerate(cases)})
+    signals = pd.DataFrame({f'A{k}': s for k, (_, s) in enumerate(cases)})
+    return prices, signals
+
+
+def test_portfolio_matches_single_asset_legs():
+    prices, signals = _portfolio_case()
+    equity = PortfolioBacktester(prices, cash=100000, commission=0.01).run_signals(signals, pct_risk=0.2)
+    # each leg sized off the full cash balance; the shared cash is counted once
+    legs = [Backtester(prices[a], cash=100000, commission=0.01).run_signals(signals[a], pct_risk=0.2) - 100000
+            for a in prices]
+    np.testing.assert_allclose(equity.to_numpy(), 100000 + sum(legs).to_numpy(), rtol=1e-12)
+
+
+def test_portfolio_matrix_matches_single_runs():
+    prices, signals = _portfolio_case(2)
+    runs = {a: pd.DataFrame({'x': signals[a], 'y': -signals[a]}) for a in prices}
+    bt = PortfolioBacktester(prices, commission=0.01)
+    equity = bt.run_signals_matrix(runs)
+    for col in ('x', 'y'):
+        expected = PortfolioBacktester(prices, commission=0.01).run_signals(
+            pd.DataFrame({a: runs[a][col] for a in prices}))
+        np.testing.assert_array_equal(equity[col].to_numpy(), expected.to_numpy())
+
+
+def test_portfolio_history_and_missing_prices():
+    dates = pd.date_range('2020-01-01', periods=5)
+    prices = pd.DataFrame({'a': [10.0, 11, 12, 13, 14], 'b': [np.nan, np.nan, 20, np.nan, 22]}, index=dates)
+    signals = pd.DataFrame({'a': [1, 1, 0, 0, 0], 'b': [1, 1, 1, 1, 0]}, index=dates)
+    bt = PortfolioBacktester(prices, cash=1000, commission=0.0)
+    equity = bt.run_signals(signals, pct_risk=0.2)
+    # b is only entered once it has a price and is marked at its last close on the gap
+    trades = bt.history.to_frame()
+    assert list(trades[['time', 'asset', 'side']].itertuples(index=False, name=None)) == [
+        (dates[0], 'a', 'enter'), (dates[2], 'a', 'exit'), (dates[2], 'b', 'enter'), (dates[4], 'b', 'exit')]
+    np.testing.assert_allclose(equity.to_numpy(), [1000, 1020, 1040, 1040, 1060])
+    assert bt.positions['b'].tolist() == [0, 0, 10, 10, 0]
+
+
+def test_portfolio_run_weights_rebalances():
+    dates = pd.date_range('2020-01-01', periods=4)
+    prices = pd.DataFrame({'a': [10.0, 20, 20, 10], 'b': [50.0, 50, 100, 100]}, index=dates)
+    weights = pd.DataFrame({'a': [0.5, 0.5, 0.25, 0.0], 'b': [-0.2, -0.2, -0.2, -0.2]}, index=dates)
+    bt = PortfolioBacktester(prices, cash=1000, commission=0.1)
+    equity = bt.run_weights(weights)
+    assert bt.positions['a'].tolist() == [50, 50, 12.5, 0]
+    assert bt.positions['b'].tolist() == [-4, -4, -4, -4]
+    fees = np.cumsum([5.4, 0, 3.75, 1.25])
+    np.testing.assert_allclose(equity.to_numpy(), np.array([1000, 1500, 1300, 1175]) - fees)
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+from backtester import Backtester
+from strategies import sma_crossover
+import batch
+
+
+@pytest.fixture
+def make_prices(gbm_prices):
+    def make(symbols, n=400):
+        return {s: gbm_prices(n, i, sigma=0.02) for i, s in enumerate(symbols)}
+    return make
+
+
+def test_run_batch_matches_inline_backtests(make_prices):
+    prices = make_prices(['AAA', 'BBB', 'CCC'])
+    jobs = [(s, 'sma_crossover', {'short_window': 10}) for s in prices]
+    jobs += [(s, 'rsi_meanrev', {}) for s in prices]
+    jobs += [(('AAA', 'BBB'), 'market_mood', {'window': 15})]
+    table = batch.run_batch(jobs, prices=prices, max_workers=2)
+    assert len(table) == len(jobs)
+    assert table['error'].isna().all()
+    row = table[(table.symbol == 'BBB') & (table.strategy == 'sma_crossover')].iloc[0]
+    equity = Backtester(prices['BBB']).run_signals(sma_crossover.generate_signals(prices['BBB'], short_window=10))
+    assert row['sharpe'] == Backtester.performance_metrics(equity)['sharpe']
+
+
+def test_failures_are_isolated(make_prices):
+    prices = make_prices(['AAA'])
+    jobs = [('AAA', 'sma_crossover', {}), ('AAA', 'sma_crossover', {'bogus': 1}),
+            ('AAA', 'no_such_strategy', {}), ('AAA', 'rsi_meanrev', {})]
+    table = batch.run_batch(jobs, prices=prices, max_workers=2)
+    errors = table.set_index('params')['error']
+    assert errors.notna().sum() == 2
+    assert 'TypeError' in errors[repr({'bogus': 1})]
+    assert table[table.strategy == 'rsi_meanrev']['error'].isna().all()
+
+
+def test_equity_points_returns_downsampled_curves(make_prices):
+    prices = make_prices(['AAA'], n=1000)
+    table = batch.run_batch([('AAA', 'sma_crossover', {})], prices=prices, max_workers=1, equity_points=100)
+    equity = table['equity'].iloc[0]
+    assert len(equity) == 100
+    full = Backtester(prices['AAA']).run_signals(sma_crossover.generate_signals(prices['AAA']))
+    pd.testing.assert_series_equal(equity, full.reindex(equity.index))
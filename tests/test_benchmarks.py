@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+import kernels
+from benchmarks import memory, startup, suite
+
+
+def test_gbm_is_reproducible():
+    a, b = suite.gbm(1000), suite.gbm(1000)
+    np.testing.assert_array_equal(a.to_numpy(), b.to_numpy())
+    assert (a > 0).all() and a.index.is_monotonic_increasing
+    x, y = suite.gbm_pair(5000)
+    assert np.corrcoef(np.diff(np.log(x)), np.diff(np.log(y)))[0, 1] > 0.7
+
+
+def test_run_suite_records_every_mode():
+    cases = {k: v for k, v in suite.CASES.items() if k[0] in ('run_signals', 'sma_crossover', 'run_chunked')}
+    records = suite.run_suite(sizes=(500, 2000), repeat=1, cases=cases, loop_max=500)
+    seen = {(r['case'], r['mode'], r['bars']) for r in records}
+    assert ('run_signals', 'loop', 500) in seen and ('run_signals', 'loop', 2000) not in seen
+    assert ('run_signals', 'vectorized', 2000) in seen and ('sma_crossover', 'numpy', 2000) in seen
+    assert ('run_chunked', 'numpy', 2000) not in seen
+    assert (('run_chunked', 'numba', 2000) in seen) == (kernels.numba is not None)
+    assert all(r['seconds'] > 0 and r['peak_bytes'] >= 0 for r in records)
+
+
+def test_compare_flags_regressions():
+    baseline = [{'case': 'c', 'mode': 'm', 'bars': 10, 'seconds': 0.1, 'peak_bytes': 1000},
+                {'case': 'c', 'mode': 'm', 'bars': 20, 'seconds': 0.0001, 'peak_bytes': 1000}]
+    current = [{'case': 'c', 'mode': 'm', 'bars': 10, 'seconds': 0.2, 'peak_bytes': 1100},
+               {'case': 'c', 'mode': 'm', 'bars': 20, 'seconds': 0.001, 'peak_bytes': 1000},
+               {'case': 'new', 'mode': 'm', 'bars': 10, 'seconds': 1.0, 'peak_bytes': 1}]
+    regressions = suite.compare(current, baseline, tolerance=0.25)
+    assert [(r['bars'], r['field']) for r in regressions] == [(10, 'seconds')]
+
+
+def test_memory_float32_lowers_peak():
+    record = memory.run_memory(cases=('sweep',), bars=(50000,), columns=16)[0]
+    assert record['float32_bytes'] < record['float64_bytes'] and record['reduction'] > 0.2
+    with pytest.raises(ValueError, match='unknown case'):
+        memory.probe('nope', 10)
+
+
+def test_compute_entry_points_start_without_heavy_imports():
+    for module in ('compute', 'batch'):
+        record = startup.measure(module, repeat=1)
+        assert not set(startup.HEAVY) & set(record['modules']), module
+
+
+def test_importing_utils_has_no_side_effects(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', 'import utils'], cwd=tmp_path, check=True,
+                   env={**os.environ, 'PYTHONPATH': root})
+    assert not (tmp_path / 'outputs').exists()
@@ -0,0 +1,108 @@
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pytest
+import chunked
+from backtester import Backtester, PortfolioBacktester
+from strategies import sma_crossover, rsi_meanrev, market_mood
+
+
+@pytest.fixture
+def make_prices(gbm_prices):
+    def make(n, seed=0, s0=100.0):
+        return gbm_prices(n, seed, s0, sigma=0.002, freq='min')
+    return make
+
+
+@pytest.mark.parametrize('chunk_size', [1, 97, 1000, 5000])
+@pytest.mark.parametrize('strategy, batch', [
+    (lambda: sma_crossover.SMACrossoverChunks(10, 30), lambda p: sma_crossover.generate_signals(p, 10, 30)),
+    (lambda: rsi_meanrev.RSIMeanRevChunks(30, 70, 5), lambda p: rsi_meanrev.generate_signals(p, 30, 70, 5)),
+])
+def test_single_asset_matches_in_memory_run(chunk_size, strategy, batch, make_prices):
+    price = make_prices(3000)
+    price.iloc[[50, 1200, 1201]] = np.nan
+    times, equity, history = chunked.run_chunked(price.to_numpy(), strategy(), chunk_size,
+                                                 index=price.index.to_numpy(), commission=0.01)
+    bt = Backtester(price, commission=0.01)
+    expected = bt.run_signals(batch(price))
+    np.testing.assert_array_equal(times, price.index.to_numpy())
+    np.testing.assert_array_equal(equity, expected.to_numpy())
+    pd.testing.assert_frame_equal(history.to_frame(), bt.history.to_frame())
+
+
+class _Replay:
+    """Chunked strategy replaying precomputed signals."""
+
+    def __init__(self, signals):
+        self.signals = signals
+        self.start = 0
+
+    def update(self, prices):
+        self.start += len(prices)
+        return self.signals[self.start - len(prices):self.start]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 13, 400])
+def test_positions_carry_across_chunks(chunk_size, make_prices):
+    # sparse regime changes with flat spells, so entries and exits land on chunk edges
+    rng = np.random.default_rng(3)
+    price = make_prices(2000)
+    raw = rng.choice([-1.0, 0.0, 0.5, 1.0], size=2000)
+    signals = pd.Series(raw, index=price.index).where(rng.random(2000) < 0.05).ffill().fillna(0)
+    _, equity, history = chunked.run_chunked(price.to_numpy(), _Replay(signals.to_numpy()), chunk_size,
+                                             index=price.index.to_numpy(), commission=0.01)
+    bt = Backtester(price, commission=0.01)
+    np.testing.assert_array_equal(equity, bt.run_signals(signals).to_numpy())
+    assert (history.to_frame()['side'] == 'exit').sum() > 10
+    pd.testing.assert_frame_equal(history.to_frame(), bt.history.to_frame())
+
+
+@pytest.mark.parametrize('chunk_size', [1, 250, 5000])
+def test_pairs_match_portfolio_run(chunk_size, make_prices):
+    a, b = make_prices(3000, 1), make_prices(3000, 2, 95.0)
+    a.iloc[::131] = np.nan
+    times, equity, history = chunked.run_chunked((a.to_numpy(), b.to_numpy()), market_mood.PairsChunks(30, 1.0, 0.2),
+                                                 chunk_size, index=a.index.to_numpy(), commission=0.01)
+    dfpos = market_mood.generate_pairs_signals(a, b, 30, 1.0, 0.2)
+    bt = PortfolioBacktester(pd.DataFrame({'a': a, 'b': b}).reindex(dfpos.index), commission=0.01)
+    expected = bt.run_signals(dfpos.set_axis(['a', 'b'], axis=1))
+    np.testing.assert_array_equal(times, expected.index.to_numpy())
+    np.testing.assert_array_equal(equity, expected.to_numpy())
+    pd.testing.assert_frame_equal(history.to_frame(), bt.history.to_frame())
+
+
+def test_memory_mapped_round_trip(tmp_path, make_prices):
+    price = make_prices(5000)
+    chunked.save_columns(tmp_path / 'data', price.to_frame('close'))
+    columns = chunked.open_columns(tmp_path / 'data')
+    assert isinstance(columns['close'], np.memmap)
+    times, equity, _ = chunked.run_chunked(columns['close'], sma_crossover.SMACrossoverChunks(), 700,
+                                           index=columns['index'], out=tmp_path / 'run')
+    assert isinstance(equity, np.memmap)
+    np.testing.assert_array_equal(np.load(tmp_path / 'run' / 'index.npy'), price.index.to_numpy())
+    expected = Backtester(price).run_signals(sma_crossover.generate_signals(price))
+    np.testing.assert_array_equal(equity, expected.to_numpy())
+
+
+def test_peak_memory_is_bounded_by_chunk_size(tmp_path, make_prices):
+    n = 1_000_000
+    chunked.save_columns(tmp_path, make_prices(n).to_frame('close'))
+    columns = chunked.open_columns(tmp_path)
+    strategy = sma_crossover.SMACrossoverChunks()
+    chunked.run_chunked(columns['close'][:1000], sma_crossover.SMACrossoverChunks())  # warm up
+    tracemalloc.start()
+    try:
+        chunked.run_chunked(columns['close'], strategy, 10_000, index=columns['index'], out=tmp_path / 'run')
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # well under a single in-memory copy of the close column
+    assert peak < 8 * n / 4
+
+
+def test_rejects_misaligned_inputs():
+    with pytest.raises(ValueError, match='same length'):
+        chunked.run_chunked((np.ones(10), np.ones(9)), market_mood.PairsChunks())
+    with pytest.raises(ValueError, match='chunk_size'):
+        chunked.run_chunked(np.ones(10), sma_crossover.SMACrossoverChunks(), chunk_size=0)
@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+import pytest
+from backtester import Backtester, PortfolioBacktester
+from execution import ExecutionModel, PerShare, Percent, Bps, FixedSpread, HighLowSpread, VolumeImpact
+
+
+@pytest.fixture
+def case(gbm_prices):
+    def make(seed=0, n=400):
+        rng = np.random.default_rng(seed)
+        close = gbm_prices(n, rng, start='2015-01-01')
+        dates = close.index
+        bars = pd.DataFrame({
+            'open': close.shift(1).fillna(close.iloc[0]) * (1 + rng.normal(0, 0.002, n)),
+            'high': close * 1.01,
+            'low': close * 0.99,
+            'volume': rng.integers(10_000, 50_000, n).astype(float),
+        }, index=dates)
+        raw = rng.choice([-1.0, 0.0, 0.5, 1.0], size=n)
+        signals = pd.Series(raw, index=dates).where(rng.random(n) < 0.05).ffill().fillna(0)
+        return close, bars, signals
+    return make
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_per_share_model_matches_default_engine(seed, case):
+    close, bars, signals = case(seed)
+    bt = Backtester(close, commission=0.01)
+    expected = bt.run_signals(signals)
+    expected_trades = bt.history.to_frame()
+    equity = bt.run_signals(signals, execution=ExecutionModel(commission=PerShare(0.01)))
+    pd.testing.assert_series_equal(equity, expected)
+    pd.testing.assert_frame_equal(bt.history.to_frame(), expected_trades)
+
+
+def test_percent_commission_charges_notional():
+    dates = pd.date_range('2020-01-01', periods=4)
+    close = pd.Series([100.0, 110.0, 120.0, 120.0], index=dates)
+    signals = pd.Series([1, 1, 0, 0], index=dates)
+    bt = Backtester(close, cash=1000)
+    equity = bt.run_signals(signals, pct_risk=1.0, execution=ExecutionModel(commission=Percent(0.01)))
+    # 10 shares: 10 in fees on entry, 12 on exit
+    assert equity.iloc[-1] == pytest.approx(1000 + 200 - 10 - 12)
+    assert list(bt.history['fee']) == pytest.approx([10, 12])
+    assert Bps(25).rate == pytest.approx(0.0025)
+
+
+def test_next_open_fills_one_bar_later():
+    dates = pd.date_range('2020-01-01', periods=5)
+    close = pd.Series([100.0, 102.0, 104.0, 106.0, 108.0], index=dates)
+    bars = pd.DataFrame({'open': [99.0, 101.0, 103.0, 105.0, 107.0]}, index=dates)
+    signals = pd.Series([1, 1, 0, 0, 0], index=dates)
+    bt = Backtester(close, cash=1010, bars=bars)
+    equity = bt.run_signals(signals, pct_risk=1.0, execution=ExecutionModel(fill='next_open'))
+    trades = bt.history.to_frame()
+    assert list(trades['time']) == [dates[1], dates[3]]
+    assert list(trades['price']) == [101.0, 105.0]
+    # flat on the signal bar, then 10 shares bought at 101 and sold at 105
+    assert equity.iloc[0] == pytest.approx(1010)
+    assert equity.iloc[1] == pytest.approx(1010 + 10 * (102 - 101))
+    assert equity.iloc[-1] == pytest.approx(1010 + 10 * (105 - 101))
+
+
+def test_spread_moves_fills_against_the_trade(case):
+    close, bars, signals = case(1)
+    bt = Backtester(close, bars=bars)
+    bt.run_signals(signals, execution=ExecutionModel(slippage=[FixedSpread(10), HighLowSpread(0.5)]))
+    trades = bt.history.to_frame()
+    mid = close.reindex(trades['time']).to_numpy()
+    half_range = ((bars['high'] - bars['low']) / 4).reindex(trades['time']).to_numpy()
+    # buys (positive entries, closed shorts) pay up, sells receive less
+    bought = np.where(trades['side'] == 'enter', trades['position'], -trades['position']) > 0
+    expected = mid + np.where(bought, 1, -1) * (mid * 10 / 2e4 + half_range)
+    np.testing.assert_allclose(trades['price'], expected)
+
+
+def test_volume_impact_grows_with_order_size(case):
+    close, bars, signals = case(2)
+    model = ExecutionModel(slippage=VolumeImpact(0.1))
+    small = Backtester(close, bars=bars).run_signals(signals, pct_risk=0.01, execution=model)
+    large = Backtester(close, bars=bars).run_signals(signals, pct_risk=0.5, execution=model)
+    free_small = Backtester(close).run_signals(signals, pct_risk=0.01)
+    free_large = Backtester(close).run_signals(signals, pct_risk=0.5)
+    cost_small = (free_small - small).iloc[-1]
+    cost_large = (free_large - large).iloc[-1]
+    assert 0 < cost_small
+    # cost per dollar traded rises with size under square-root impact
+    assert cost_large / 50 > cost_small
+
+
+def test_compound_sizing_reinvests_each_trip():
+    dates = pd.date_range('2020-01-01', periods=6)
+    close = pd.Series([100.0, 120.0, 120.0, 50.0, 60.0, 60.0], index=dates)
+    signals = pd.Series([1, 0, 0, 1, 0, 0], index=dates)
+    bt = Backtester(close, cash=1000)
+    equity = bt.run_signals(signals, pct_risk=0.5,
+                            execution=ExecutionModel(commission=Percent(0.01), sizing='compound'))
+    cash = 1000.0
+    for entry, exit_ in ((100.0, 120.0), (50.0, 60.0)):
+        shares = 0.5 * cash / entry
+        cash += shares * (exit_ - entry) - 0.01 * shares * (entry + exit_)
+    assert equity.iloc[-1] == pytest.approx(cash)
+    assert bt.history['position'][2] == pytest.approx(0.5 * (1000 + 5 * 20 - 0.05 * 220) / 50)
+
+
+def test_matrix_matches_single_runs(case):
+    close, bars, signals = case(3)
+    model = ExecutionModel(fill='next_open', commission=Bps(5), slippage=HighLowSpread(), sizing='compound')
+    bt = Backtester(close, bars=bars)
+    grid = pd.DataFrame({'long': signals, 'short': -signals})
+    equity = bt.run_signals_matrix(grid, execution=model)
+    for name in grid:
+        np.testing.assert_allclose(equity[name], bt.run_signals(grid[name], execution=model))
+
+
+def test_model_validation(case):
+    close, bars, signals = case(4)
+    with pytest.raises(ValueError, match='bar columns'):
+        Backtester(close).run_signals(signals, execution=ExecutionModel(fill='next_open'))
+    with pytest.raises(ValueError, match='vectorized'):
+        Backtester(close).run_signals(signals, engine='loop', execution=ExecutionModel())
+    with pytest.raises(ValueError, match='compound'):
+        ExecutionModel(slippage=VolumeImpact(), sizing='compound')
+    with pytest.raises(ValueError, match='fill'):
+        ExecutionModel(fill='vwap')
+
+
+def test_portfolio_execution(case):
+    close, bars, signals = case(5)
+    prices = pd.DataFrame({'a': close, 'b': close * 0.5})
+    legs = pd.DataFrame({'a': signals, 'b': -signals})
+    bar_frames = {name: pd.DataFrame({'a': bars[name], 'b': bars[name] * 0.5}) for name in ('open', 'high', 'low')}
+    model = ExecutionModel(fill='next_open', commission=Percent(0.001), slippage=HighLowSpread())
+    bt = PortfolioBacktester(prices, cash=100000, bars=bar_frames)
+    equity = bt.run_signals(legs, execution=model)
+    # each leg adds its single-asset PnL to the shared account
+    pnl = 0
+    for a in legs:
+        leg = Backtester(prices[a], cash=100000, bars=pd.DataFrame({k: v[a] for k, v in bar_frames.items()}))
+        pnl = pnl + leg.run_signals(legs[a], execution=model) - 100000
+        np.testing.assert_allclose(bt.history.to_frame().query('asset == @a')['price'], leg.history['price'])
+    np.testing.assert_allclose(equity, 100000 + pnl)
+    with pytest.raises(ValueError, match='fixed sizing'):
+        bt.run_signals(legs, execution=ExecutionModel(sizing='compound'))
@@ -0,0 +1,152 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+import indicators
+import kernels
+from strategies.rsi_meanrev import rsi
+
+
+def _series(seed):
+    rng = np.random.default_rng(seed)
+    x = np.cumsum(rng.normal(size=1500)) + 100
+    x[100:140] = x[100]  # flat run
+    x[500] = np.nan
+    x[900:903] = np.nan
+    return pd.Series(x * 10 ** (3 * seed))
+
+
+def _feed(state, values):
+    return np.array([state.update(v) for v in values])
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('window', [1, 2, 5, 50])
+def test_rolling_mean_and_var_are_bit_exact(seed, window):
+    s = _series(seed)
+    np.testing.assert_array_equal(_feed(indicators.RollingMean(window), s), s.rolling(window).mean())
+    np.testing.assert_array_equal(_feed(indicators.RollingVar(window), s), s.rolling(window).var())
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('period', [2, 3, 14])
+def test_rsi_is_bit_exact(seed, period):
+    s = _series(seed)
+    np.testing.assert_array_equal(_feed(indicators.RSI(period), s), rsi(s, period))
+
+
+@pytest.fixture(params=['pandas', 'jit'])
+def backend(request, monkeypatch):
+    if request.param == 'pandas':
+        monkeypatch.setattr(kernels, 'numba', None)
+    elif kernels.numba is None:
+        pytest.skip('numba is not installed')
+    return request.param
+
+
+def _feed_chunks(state, values, size):
+    values = np.asarray(values, dtype=float)
+    return np.concatenate([state.update(values[i:i + size]) for i in range(0, len(values), size)])
+
+
+@pytest.mark.parametrize('size', [1, 7, 256, 5000])
+def test_chunk_indicators_are_bit_exact(size, backend):
+    s = _series(1)
+    np.testing.assert_array_equal(_feed_chunks(indicators.RollingMeanChunks(50), s, size), s.rolling(50).mean())
+    np.testing.assert_array_equal(_feed_chunks(indicators.EWMMeanChunks(14), s, size),
+                                  s.ewm(span=14, adjust=False).mean())
+    np.testing.assert_array_equal(_feed_chunks(indicators.RSIChunks(3), s, size), rsi(s, 3))
+    std = s.rolling(20).std().replace(0, 1)
+    np.testing.assert_array_equal(_feed_chunks(indicators.RollingZScoreChunks(20), s, size),
+                                  (s - s.rolling(20).mean()) / std)
+
+
+def _frame():
+    return pd.DataFrame({seed: _series(seed).to_numpy() for seed in range(3)})
+
+
+def test_one_call_indicators_match_pandas(backend):
+    frame = _frame()
+    s = frame[1]
+    std = frame.rolling(20).std()
+    expected = {
+        'rolling_mean': frame.rolling(20).mean(),
+        'rolling_var': frame.rolling(20).var(),
+        'rolling_std': std,
+        'rolling_zscore': (frame - frame.rolling(20).mean()) / std.replace(0, 1),
+        'ewm_mean': frame.ewm(span=20, adjust=False).mean(),
+        'rsi': frame.apply(rsi, period=20),
+    }
+    for name, table in expected.items():
+        fn = getattr(indicators, name)
+        # many symbols at once, and one symbol on its own
+        np.testing.assert_array_equal(fn(frame.to_numpy(), 20), table, err_msg=name)
+        np.testing.assert_array_equal(fn(s.to_numpy(), 20), table[1], err_msg=name)
+
+
+def test_many_windows_in_one_call(backend):
+    s = _series(2)
+    windows = [1, 5, 50]
+    np.testing.assert_array_equal(indicators.rolling_mean(s.to_numpy(), windows),
+                                  np.column_stack([s.rolling(w).mean() for w in windows]))
+    np.testing.assert_array_equal(indicators.rsi(s.to_numpy(), [3, 14]), np.column_stack([rsi(s, 3), rsi(s, 14)]))
+    # one window per column of a 2-D array
+    frame = _frame()
+    np.testing.assert_array_equal(indicators.rolling_zscore(frame.to_numpy(), windows),
+                                  np.column_stack([indicators.rolling_zscore(frame[i].to_numpy(), w)
+                                                   for i, w in enumerate(windows)]))
+    with pytest.raises(ValueError, match='columns'):
+        indicators.rolling_mean(frame.to_numpy(), [5, 10])
+    with pytest.raises(ValueError, match='window'):
+        indicators.RollingMeanChunks(0).update(s.to_numpy())
+
+
+def test_chunk_state_carries_many_columns(backend):
+    frame = _frame().to_numpy()
+    zscores = indicators.RollingZScoreChunks([5, 20, 60])
+    out = np.concatenate([zscores.update(frame[i:i + 97]) for i in range(0, len(frame), 97)])
+    whole = indicators.RollingZScoreChunks([5, 20, 60])
+    np.testing.assert_array_equal(out, whole.update(frame))
+    # the running sums end where one pass over the whole frame leaves them
+    np.testing.assert_array_equal(zscores.state, whole.state)
+    np.testing.assert_array_equal(zscores.var_state, whole.var_state)
+    mean = indicators.RollingMeanChunks(20)
+    mean.update(frame[:, 0])
+    total, _, _, nobs = mean.state[0, :4]
+    assert nobs == np.count_nonzero(~np.isnan(frame[-20:, 0]))
+    assert total == pytest.approx(np.nansum(frame[-20:, 0]))
+    ewm = indicators.EWMMeanChunks(14)
+    np.testing.assert_array_equal(ewm.update(frame[:, 0])[-1], ewm.state[0, 0])
+    assert zscores.state.shape == (3, kernels.ROLLING_MEAN_STATE)
+    assert zscores.var_state.shape == (3, kernels.ROLLING_VAR_STATE)
+    assert len(zscores.tail) == 60
+    with pytest.raises(ValueError, match='same number of columns'):
+        zscores.update(frame[:10, :1])
+
+
+def test_chunk_indicators_without_numba():
+    # the kernels run as plain Python loops, carrying the same running state
+    script = """
+import sys
+sys.modules['numba'] = None
+import numpy as np, pandas as pd
+import indicators, kernels
+from strategies.rsi_meanrev import rsi
+assert kernels.numba is None
+x = np.cumsum(np.random.default_rng(1).normal(size=600)) + 100
+x[100:140] = x[100]
+x[300] = np.nan
+s = pd.Series(x)
+for size in (1, 7, 256):
+    feed = lambda state: np.concatenate([state.update(x[i:i + size]) for i in range(0, len(x), size)])
+    np.testing.assert_array_equal(feed(indicators.RollingMeanChunks([5, 50])),
+                                  np.column_stack([s.rolling(w).mean() for w in (5, 50)]))
+    np.testing.assert_array_equal(feed(indicators.RollingVarChunks(50)), s.rolling(50).var())
+    std = s.rolling(20).std().replace(0, 1)
+    np.testing.assert_array_equal(feed(indicators.RollingZScoreChunks(20)), (s - s.rolling(20).mean()) / std)
+    np.testing.assert_array_equal(feed(indicators.RSIChunks(3)), rsi(s, 3))
+"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', script], cwd=root, check=True, env={**os.environ, 'PYTHONPATH': root})
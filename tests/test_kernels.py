@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+import kernels
+
+
+def _reference_hold(changes):
+    current, out = 0, []
+    for change in changes:
+        if change != 0:
+            current = change
+        out.append(current)
+    return np.array(out)
+
+
+@pytest.fixture(params=['numpy', 'jit'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        monkeypatch.setattr(kernels, 'numba', None)
+    elif kernels.numba is None:
+        pytest.skip('numba is not installed')
+    return request.param
+
+
+def test_hold_positions(backend):
+    rng = np.random.default_rng(0)
+    changes = rng.choice([-1, 0, 0, 0, 1], size=(300, 4))
+    held = kernels.hold_positions(changes)
+    assert held.dtype == changes.dtype
+    for j in range(changes.shape[1]):
+        np.testing.assert_array_equal(held[:, j], _reference_hold(changes[:, j]))
+    np.testing.assert_array_equal(kernels.hold_positions(changes[:, 0]), held[:, 0])
+    assert kernels.hold_positions(np.zeros(0, dtype=np.int64)).shape == (0,)
+
+
+def test_crossovers_match_pandas():
+    rng = np.random.default_rng(1)
+    a = pd.Series(rng.normal(size=200)).where(rng.random(200) > 0.05)
+    b = pd.Series(rng.normal(size=200))
+    np.testing.assert_array_equal(kernels.crossed_above(a, b), ((a > b) & (a.shift(1) <= b.shift(1))).to_numpy())
+    np.testing.assert_array_equal(kernels.crossed_below(a, b), ((a < b) & (a.shift(1) >= b.shift(1))).to_numpy())
+    np.testing.assert_array_equal(kernels.crossed_above(a, 0.5), ((a > 0.5) & (a.shift(1) <= 0.5)).to_numpy())
+
+
+def test_crossovers_with_per_column_levels():
+    rng = np.random.default_rng(2)
+    values = rng.normal(size=(100, 3))
+    levels = np.array([-0.5, 0.0, 0.5])
+    crossed = kernels.crossed_above(values, levels)
+    for j, level in enumerate(levels):
+        np.testing.assert_array_equal(crossed[:, j], kernels.crossed_above(values[:, j], level))
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+from backtester import Backtester, PortfolioBacktester
+from ledger import Side, TradeLedger
+
+
+@pytest.fixture
+def case(gbm_prices):
+    def make(n=400, seed=0):
+        rng = np.random.default_rng(seed)
+        price = gbm_prices(n, rng)
+        signals = pd.Series(rng.choice([-1.0, 0.0, 1.0], size=n), index=price.index).where(rng.random(n) < 0.1)
+        return price, signals.ffill().fillna(0)
+    return make
+
+
+def test_append_grows_and_keeps_trades():
+    ledger = TradeLedger(capacity=2)
+    for i in range(100):
+        ledger.append(pd.Timestamp('2020-01-01') + pd.Timedelta(days=i), Side(i % 2), i, 10.0 + i, 1000.0)
+    assert len(ledger) == 100
+    assert ledger['position'].tolist() == list(range(100))
+    assert ledger['side'].dtype == np.int8
+    frame = ledger.to_frame()
+    assert frame['time'].iloc[-1] == pd.Timestamp('2020-04-09')
+    assert list(frame['side'][:2]) == ['enter', 'exit']
+
+
+def test_frame_and_arrow_are_zero_copy(case):
+    price, signals = case()
+    bt = Backtester(price, commission=0.01)
+    bt.run_signals(signals)
+    frame = bt.history.to_frame()
+    assert np.shares_memory(frame['price'].to_numpy(), bt.history['price'])
+    table = bt.history.to_arrow()
+    assert np.shares_memory(table.column('cash').to_numpy(), bt.history['cash'])
+    assert len(table) == len(frame) == len(bt.history)
+
+
+def test_history_resets_per_run(case):
+    price, signals = case()
+    bt = Backtester(price)
+    bt.run_signals(signals)
+    first = bt.history.to_frame().copy()
+    bt.run_signals(signals, engine='loop')
+    pd.testing.assert_frame_equal(bt.history.to_frame(), first)
+
+
+def test_round_trips_match_cash_changes(case):
+    price, signals = case(seed=1)
+    # flat bar between trades, so each round trip's PnL is the cash change it caused
+    signals[signals.shift(1).fillna(0) != signals] = 0
+    bt = Backtester(price, cash=10000, commission=0.02)
+    bt.run_signals(signals, pct_risk=0.5)
+    trips = bt.history.round_trips()
+    frame = bt.history.to_frame()
+    exits = frame[frame['side'] == 'exit']
+    cash_before = np.r_[10000, exits['cash'].to_numpy()[:-1]]
+    np.testing.assert_allclose(trips['pnl'], exits['cash'].to_numpy() - cash_before, rtol=1e-9)
+    assert (trips['holding'] > pd.Timedelta(0)).all()
+    assert bt.history.turnover() == pytest.approx((frame['position'].abs() * frame['price']).sum())
+
+
+def test_portfolio_round_trips_per_asset(case):
+    (a, sa), (b, sb) = case(seed=2), case(seed=3)
+    prices, signals = pd.DataFrame({'a': a, 'b': b}), pd.DataFrame({'a': sa, 'b': sb})
+    bt = PortfolioBacktester(prices, commission=0.01)
+    bt.run_signals(signals)
+    trips = bt.history.round_trips()
+    for asset in 'ab':
+        single = Backtester(prices[asset], commission=0.01)
+        single.run_signals(signals[asset])
+        expected = single.history.round_trips()
+        np.testing.assert_allclose(trips.loc[trips['asset'] == asset, 'pnl'], expected['pnl'])
+    assert set(bt.history.to_frame()['asset'].cat.categories) == {'a', 'b'}
+
+
+def test_timezone_round_trip_and_merge():
+    dates = pd.date_range('2020-01-01', periods=3, freq='h', tz='US/Eastern')
+    one, two = TradeLedger(), TradeLedger()
+    one.extend(dates[[0, 2]], [Side.ENTER, Side.EXIT], [1.0, 1.0], [10.0, 11.0], [0.0, 11.0])
+    two.append(dates[1], Side.ENTER, -2.0, 5.0, 10.0)
+    merged = TradeLedger.merge([one, two], assets=['x', 'y'])
+    frame = merged.to_frame()
+    assert list(frame['time']) == list(dates)
+    assert list(frame['asset']) == ['x', 'y', 'x']
+    assert merged.round_trips()['pnl'].tolist() == [1.0]
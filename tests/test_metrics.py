@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+import kernels
+import metrics
+from backtester import Backtester
+
+
+def _equity(k=4, n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(1000 * np.exp(np.cumsum(rng.normal(0, 0.01, (n, k)), axis=0)))
+
+
+def _reference(equity: pd.Series):
+    returns = equity.pct_change().fillna(0)
+    total = equity.iloc[-1] / equity.iloc[0] - 1
+    ann_ret = (1 + total) ** (252 / len(equity)) - 1
+    ann_vol = returns.std() * np.sqrt(252)
+    drawdown = equity / equity.cummax() - 1
+    below = drawdown < 0
+    runs = below.groupby((~below).cumsum()).sum()
+    downside = np.sqrt((returns.clip(upper=0) ** 2).mean()) * np.sqrt(252)
+    return {
+        'total_return': total,
+        'ann_return': ann_ret,
+        'ann_vol': ann_vol,
+        'sharpe': returns.mean() * 252 / ann_vol,
+        'sortino': returns.mean() * 252 / downside,
+        'max_drawdown': drawdown.min(),
+        'max_drawdown_duration': runs.max(),
+        'calmar': ann_ret / abs(drawdown.min()),
+    }
+
+
+@pytest.fixture(params=['numpy', 'jit'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        monkeypatch.setattr(kernels, 'numba', None)
+    elif kernels.numba is None:
+        pytest.skip('numba is not installed')
+
+
+def test_matches_reference_definitions(backend):
+    equity = _equity()
+    table = metrics.compute_metrics(equity)
+    for col in equity:
+        expected = _reference(equity[col])
+        for key, value in expected.items():
+            assert table.loc[col, key] == pytest.approx(value, rel=1e-9)
+    single = metrics.compute_metrics(equity[0])
+    assert single['sharpe'] == pytest.approx(table.loc[0, 'sharpe'], rel=1e-12)
+    assert isinstance(single['max_drawdown_duration'], int)
+
+
+def test_flat_equity_has_undefined_ratios(backend):
+    result = metrics.compute_metrics(pd.Series([100.0] * 10))
+    assert result['total_return'] == 0 and result['max_drawdown'] == 0
+    assert np.isnan(result['sharpe']) and np.isnan(result['calmar'])
+
+
+def test_drawdown_duration(backend):
+    result = metrics.compute_metrics(np.array([1, 2, 1.5, 1.8, 2.5, 2, 2.4, 2.4, 3.0]))
+    assert result['max_drawdown'] == pytest.approx(-0.25)
+    assert result['max_drawdown_duration'] == 3
+
+
+def test_trade_stats_from_history():
+    dates = pd.date_range('2020-01-01', periods=6)
+    price = pd.Series([10.0, 11, 12, 11, 10, 9], index=dates)
+    signals = pd.Series([1, 1, 0, -1, -1, -1], index=dates)
+    bt = Backtester(price, cash=1000, commission=0.01)
+    equity = bt.run_signals(signals, pct_risk=1.0)
+    result = Backtester.performance_metrics(equity, bt.history)
+    stats = metrics.trade_stats(bt.history)
+    # long 100 @ 10 -> 12 and short ~90.9 @ 11 still open at the end
+    assert stats['trades'] == 1
+    assert stats['avg_trade_pnl'] == pytest.approx(200 - 2 * 100 * 0.01)
+    assert stats['win_rate'] == 1 and stats['profit_factor'] == np.inf
+    assert stats['avg_holding'] == pd.Timedelta(days=2)
+    assert result['trades'] == 1
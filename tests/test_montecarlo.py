@@ -0,0 +1,126 @@
+import functools
+import numpy as np
+import pandas as pd
+import pytest
+import montecarlo
+from backtester import Backtester, PortfolioBacktester
+from strategies import sma_crossover, rsi_meanrev, market_mood
+
+
+@pytest.fixture
+def make_price(gbm_prices):
+    return functools.partial(gbm_prices, 600, mu=0.0003, sigma=0.015, start='2018-01-01')
+
+
+def test_bootstrap_paths_resample_historical_blocks(make_price):
+    prices = make_price().to_numpy()[:, None]
+    returns = np.diff(np.log(prices[:, 0]))
+    paths = montecarlo.bootstrap_paths(prices, 50, block=10, rng=0)
+    assert paths.shape == (len(prices), 1, 50)
+    np.testing.assert_array_equal(paths[0], prices[0, 0])
+    sampled = np.diff(np.log(paths[:, 0]), axis=0)
+    # every synthetic return is a historical one, in runs of 10 consecutive bars
+    first_path = np.abs(sampled[:, :1] - returns).argmin(axis=1)
+    np.testing.assert_allclose(returns[first_path], sampled[:, 0], atol=1e-12)
+    steps = np.diff(first_path)[:9]
+    assert ((steps == 1) | (steps == 1 - len(returns))).all()
+    # a single block as long as the history is just a rotation of it
+    whole = montecarlo.bootstrap_paths(prices, 3, block=len(prices), rng=1)
+    np.testing.assert_allclose(np.sort(np.diff(np.log(whole[:, 0, 0]))), np.sort(returns))
+
+
+def test_gbm_paths_match_drift_volatility_and_correlation():
+    rng = np.random.default_rng(3)
+    shocks = rng.multivariate_normal([0.0005, 0.0002], [[4e-4, 2e-4], [2e-4, 3e-4]], size=2000)
+    prices = 50 * np.exp(np.cumsum(shocks, axis=0))
+    paths = montecarlo.gbm_paths(prices, 400, rng=0)
+    returns = np.diff(np.log(paths), axis=0)
+    historical = np.diff(np.log(prices), axis=0)
+    np.testing.assert_allclose(returns.std(axis=(0, 2)), historical.std(axis=0), rtol=0.01)
+    np.testing.assert_allclose(returns.mean(axis=(0, 2)), historical.mean(axis=0), atol=2e-5)
+    correlation = np.corrcoef(returns[:, 0].ravel(), returns[:, 1].ravel())[0, 1]
+    assert correlation == pytest.approx(np.corrcoef(historical.T)[0, 1], abs=0.01)
+
+
+def test_path_signals_match_single_runs(make_price):
+    paths = np.column_stack([make_price(seed).to_numpy() for seed in range(4)])
+    grid = sma_crossover.generate_signals_paths(paths, 10, 30)
+    rsi = rsi_meanrev.generate_signals_paths(paths, 35, 65, 7)
+    pairs = market_mood.generate_pairs_signals_paths(paths, paths[:, ::-1], 15)
+    for j in range(paths.shape[1]):
+        price = pd.Series(paths[:, j])
+        np.testing.assert_array_equal(grid[:, j], sma_crossover.generate_signals(price, 10, 30))
+        np.testing.assert_array_equal(rsi[:, j], rsi_meanrev.generate_signals(price, 35, 65, 7))
+        np.testing.assert_array_equal(pairs[:, j], market_mood.generate_pairs_signals(
+            price, pd.Series(paths[:, -1 - j]), 15)['pos_a'])
+
+
+def test_backtest_paths_match_the_backtesters(make_price):
+    price, other = make_price(0), make_price(1) * 0.7
+    equity = montecarlo.backtest_paths(price.to_numpy()[:, None, None], 'rsi_meanrev', {'period': 7},
+                                       commission=0.01)[:, 0]
+    expected = Backtester(price, commission=0.01).run_signals(rsi_meanrev.generate_signals(price, period=7))
+    np.testing.assert_array_equal(equity, expected)
+
+    legs = np.stack([price.to_numpy(), other.to_numpy()], axis=1)[:, :, None]
+    equity = montecarlo.backtest_paths(legs, 'market_mood', {'window': 15}, commission=0.01)[:, 0]
+    dfpos = market_mood.generate_pairs_signals(price, other, window=15)
+    expected = PortfolioBacktester(pd.DataFrame({'a': price, 'b': other}), commission=0.01).run_signals(
+        dfpos.set_axis(['a', 'b'], axis=1))
+    np.testing.assert_array_equal(equity, expected)
+
+
+@pytest.mark.parametrize('method', montecarlo.METHODS)
+def test_run_montecarlo_intervals(method, make_price):
+    price = make_price(2)
+    paths, summary = montecarlo.run_montecarlo(price, 'sma_crossover', {'short_window': 10}, method=method,
+                                               n_paths=200, batch_size=64, max_workers=1)
+    assert len(paths) == 200 and list(paths.columns) == list(summary.index)
+    assert (summary['p5'] <= summary['p50']).all() and (summary['p50'] <= summary['p95']).all()
+    assert paths['total_return'].nunique() > 150
+    actual = Backtester.performance_metrics(
+        Backtester(price).run_signals(sma_crossover.generate_signals(price, short_window=10)))
+    assert summary.loc['sharpe', 'actual'] == actual['sharpe']
+    # the same seed gives the same paths
+    again, _ = montecarlo.run_montecarlo(price, 'sma_crossover', {'short_window': 10}, method=method,
+                                         n_paths=200, batch_size=64, max_workers=1)
+    pd.testing.assert_frame_equal(paths, again)
+
+
+def test_results_do_not_depend_on_worker_count(make_price):
+    pair = (make_price(0), make_price(1))
+    kwargs = dict(n_paths=40, batch_size=10, seed=7)
+    inline, _ = montecarlo.run_montecarlo(pair, 'market_mood', max_workers=1, **kwargs)
+    pooled, _ = montecarlo.run_montecarlo(pair, 'market_mood', max_workers=2, **kwargs)
+    pd.testing.assert_frame_equal(inline, pooled)
+
+
+def test_shuffle_trades(make_price):
+    price = make_price(4)
+    rng = np.random.default_rng(4)
+    # long, short and flat spells, so trades close
+    signals = pd.Series(rng.choice([-1.0, 0.0, 1.0], len(price)), index=price.index).where(
+        rng.random(len(price)) < 0.05).ffill().fillna(0)
+    bt = Backtester(price, commission=0.01)
+    bt.run_signals(signals)
+    trips = bt.history.round_trips()
+    assert len(trips) > 5
+    paths, summary = montecarlo.shuffle_trades(bt.history, n_paths=300)
+    # reordering trades keeps the final PnL and moves the drawdown
+    np.testing.assert_allclose(paths['total_return'], trips['pnl'].sum() / 100000)
+    assert paths['max_drawdown'].nunique() > 10
+    assert summary.loc['max_drawdown', 'p5'] <= summary.loc['max_drawdown', 'actual']
+    resampled, _ = montecarlo.shuffle_trades(trips, n_paths=300, replace=True)
+    assert resampled['total_return'].nunique() > 10
+
+
+def test_validation(make_price):
+    price = make_price()
+    with pytest.raises(ValueError, match='unknown strategy'):
+        montecarlo.run_montecarlo(price, 'nope')
+    with pytest.raises(ValueError, match='method'):
+        montecarlo.run_montecarlo(price, 'sma_crossover', method='garch')
+    empty = Backtester(price)
+    empty.run_signals(pd.Series(0, index=price.index))
+    with pytest.raises(ValueError, match='no closed trades'):
+        montecarlo.shuffle_trades(empty.history)
@@ -0,0 +1,82 @@
+import functools
+import numpy as np
+import pandas as pd
+import pytest
+import pipeline
+import price_cache
+import results
+from backtester import Backtester, PortfolioBacktester
+from execution import ExecutionModel, Percent
+from strategies import sma_crossover, market_mood
+
+
+@pytest.fixture
+def counted(tmp_path, gbm_prices):
+    rng = np.random.default_rng(0)
+    frames = {s: gbm_prices(500, rng, sigma=0.02, freq='D').to_frame('close') for s in ['AAA', 'BBB']}
+    previous = price_cache._default_cache
+    price_cache.set_default_cache(price_cache.PriceCache(str(tmp_path), source=price_cache.FrameSource(frames)))
+    previous_store = results._default_store, results._default_set
+    results.set_default_store(results.ResultStore(str(tmp_path / 'results')))
+    calls = []
+
+    def counting_cache(fn):
+        @functools.lru_cache(maxsize=None)
+        def wrapper(*args):
+            calls.append((fn.__name__,) + args)
+            return fn(*args)
+        return wrapper
+
+    pipeline.use_cache(counting_cache)
+    yield calls
+    pipeline.use_cache(functools.lru_cache(maxsize=pipeline.DEFAULT_MAX_ENTRIES))
+    price_cache.set_default_cache(previous)
+    results._default_store, results._default_set = previous_store
+
+
+def test_backtest_matches_direct_run(counted):
+    equity, metrics = pipeline.backtest('SMA Crossover', ('AAA',), '2020-01-01', '2021-06-01', (10, 30), 50000, 0.01)
+    price = pipeline.prices('AAA', '2020-01-01', '2021-06-01')
+    expected = Backtester(price, cash=50000).run_signals(sma_crossover.generate_signals(price, 10, 30),
+                                                         execution=ExecutionModel(commission=Percent(0.01)))
+    pd.testing.assert_series_equal(equity, expected)
+    assert metrics == Backtester.performance_metrics(expected)
+
+
+def test_pairs_backtest_matches_direct_run(counted):
+    equity, _ = pipeline.backtest('Market Mood Detector', ('AAA', 'BBB'), '2020-01-01', '2021-06-01',
+                                  (15, 1.5, 0.5), 100000, 0.0)
+    a, b = (pipeline.prices(s, '2020-01-01', '2021-06-01') for s in ('AAA', 'BBB'))
+    dfpos = market_mood.generate_pairs_signals(a, b, 15, 1.5, 0.5)
+    prices = pd.DataFrame({'a': a, 'b': b}).reindex(dfpos.index)
+    expected = PortfolioBacktester(prices).run_signals(dfpos.set_axis(['a', 'b'], axis=1))
+    pd.testing.assert_series_equal(equity, expected)
+
+
+def test_changing_one_parameter_only_recomputes_dependent_stages(counted):
+    args = ('AAA',), '2020-01-01', '2021-06-01'
+    pipeline.backtest('SMA Crossover', *args, (10, 30), 100000, 0.0)
+    counted.clear()
+    pipeline.backtest('SMA Crossover', *args, (10, 40), 100000, 0.0)
+    assert sorted(c[0] for c in counted) == ['backtest', 'positions', 'sma']
+    assert ('sma', 'AAA', '2020-01-01', '2021-06-01', 40) in counted
+    counted.clear()
+    # a commission change reuses the positions
+    pipeline.backtest('SMA Crossover', *args, (10, 40), 100000, 0.01)
+    assert [c[0] for c in counted] == ['backtest']
+
+
+def test_backtests_are_served_from_the_result_store(counted):
+    args = ('AAA',), '2020-01-01', '2021-06-01', (10, 30), 100000, 0.01
+    equity, metrics = pipeline.backtest('SMA Crossover', *args)
+    # a fresh process: empty stage caches, same store
+    calls = []
+    pipeline.use_cache(lambda fn: lambda *a: calls.append(fn.__name__) or fn(*a))
+    again, stored = pipeline.backtest('SMA Crossover', *args)
+    assert 'positions' not in calls
+    pd.testing.assert_series_equal(again, equity)
+    assert stored == metrics
+    runs = results.default_store().query(strategy='SMA Crossover')
+    assert len(runs) == 1 and runs['params'].iloc[0] == (10, 30) and runs['sharpe'].iloc[0] == metrics['sharpe']
+    with pytest.raises(ValueError, match='unknown strategy'):
+        pipeline.backtest('Nope', *args)
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+import precision
+import results
+from backtester import Backtester, PortfolioBacktester, _signal_array
+from execution import ExecutionModel, Percent
+from strategies import sma_crossover, rsi_meanrev, market_mood
+
+
+@pytest.fixture
+def case(gbm_prices):
+    def make(seed=0, n=5000):
+        """Prices and sparse -1/0/1 int8 signals."""
+        rng = np.random.default_rng(seed)
+        price = gbm_prices(n, rng, start='2000-01-01', freq='D')
+        signals = pd.Series(rng.choice([-1, 0, 1], n), index=price.index).where(rng.random(n) < 0.05)
+        return price, signals.ffill().fillna(0).astype(np.int8)
+    return make
+
+
+def test_mode_switching():
+    assert precision.mode() == 'float64' and precision.signal_dtype() == np.int64
+    with precision.using('float32'):
+        assert precision.float_dtype() == np.float32 and precision.signal_dtype() == np.int8
+        with pytest.raises(ValueError, match='unknown precision'):
+            precision.set_mode('float16')
+    assert precision.mode() == 'float64'
+
+
+def test_float32_positions_match_and_are_int8(case):
+    price, _ = case()
+    other = price * 1.1 + np.sin(np.arange(len(price)))
+    full = [sma_crossover.generate_signals(price), rsi_meanrev.generate_signals(price),
+            market_mood.generate_pairs_signals(price, other),
+            sma_crossover.generate_signals_grid(price, [(5, 20), (10, 50)])]
+    with precision.using('float32'):
+        reduced = [sma_crossover.generate_signals(price), rsi_meanrev.generate_signals(price),
+                   market_mood.generate_pairs_signals(price, other),
+                   sma_crossover.generate_signals_grid(price, [(5, 20), (10, 50)])]
+    for a, b in zip(full, reduced):
+        assert b.to_numpy().dtype == np.int8
+        np.testing.assert_array_equal(a.to_numpy(), b.to_numpy())
+
+
+@pytest.mark.parametrize('execution', [None, ExecutionModel(commission=Percent(0.001))])
+def test_float32_backtest_within_documented_bound(execution, case):
+    price, signals = case(1)
+    bt = Backtester(price, commission=0.01)
+    full = bt.run_signals(signals, execution=execution)
+    trades = bt.history.to_frame()
+    with precision.using('float32'):
+        bt = Backtester(price, commission=0.01)
+        reduced = bt.run_signals(signals, execution=execution)
+    assert reduced.dtype == np.float32
+    pd.testing.assert_index_equal(reduced.index, full.index)
+    # same trades, at float32 prices
+    pd.testing.assert_series_equal(bt.history.to_frame()['time'], trades['time'])
+    np.testing.assert_allclose(bt.history.to_frame()['position'], trades['position'], rtol=1e-6)
+    bound = (4 * len(trades) + 2) * 2.0 ** -24 * full.abs().max()
+    assert np.abs(reduced.to_numpy(dtype=float) - full.to_numpy()).max() <= bound
+    assert Backtester.performance_metrics(reduced)['sharpe'] == pytest.approx(
+        Backtester.performance_metrics(full)['sharpe'], rel=1e-3)
+
+
+def test_float32_portfolio_and_matrix(case):
+    price, signals = case(2)
+    prices = pd.DataFrame({'a': price, 'b': price[::-1].to_numpy()}, index=price.index)
+    legs = pd.DataFrame({'a': signals, 'b': -signals})
+    grid = pd.DataFrame({'x': signals, 'y': signals.shift(3, fill_value=0)})
+    full = PortfolioBacktester(prices).run_signals(legs), Backtester(price).run_signals_matrix(grid)
+    with precision.using('float32'):
+        reduced = PortfolioBacktester(prices).run_signals(legs), Backtester(price).run_signals_matrix(grid)
+    for a, b in zip(full, reduced):
+        assert b.to_numpy().dtype == np.float32
+        np.testing.assert_allclose(b.to_numpy(), a.to_numpy(), rtol=1e-5)
+
+
+def test_signal_arrays_are_not_copied(case):
+    price, signals = case(3, n=100)
+    values = _signal_array(signals, price.index, np.dtype(np.float64))
+    assert values.dtype == np.int8 and np.shares_memory(values, signals.to_numpy())
+    # misaligned or missing signals are aligned and filled
+    values = _signal_array(signals.iloc[10:].where(signals.iloc[10:] != 0), price.index, np.dtype(np.float32))
+    assert values.dtype == np.float32 and not np.isnan(values).any() and (values[:10] == 0).all()
+    # float64 signals don't widen float32 runs
+    assert _signal_array(signals.astype(float), price.index, np.dtype(np.float32)).dtype == np.float32
+
+
+def test_result_keys_depend_on_precision(case):
+    price, _ = case(4, n=100)
+    key = results.run_key(price, sma_crossover.generate_signals, {}, {'cash': 100000})
+    with precision.using('float32'):
+        assert results.run_key(price, sma_crossover.generate_signals, {}, {'cash': 100000}) != key
@@ -0,0 +1,294 @@
+import multiprocessing
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pytest
+import price_cache
+from price_cache import PriceCache, PriceSource, FrameSource, CsvSource, ThrottledSource, TokenBucket, standardize_columns
+
+
+class CountingSource(FrameSource):
+    def __init__(self, frames):
+        super().__init__(frames)
+        self.calls = []
+
+    def fetch(self, symbol, start, end, interval='1d'):
+        self.calls.append((symbol, start, end))
+        return super().fetch(symbol, start, end, interval)
+
+
+@pytest.fixture
+def make_bars(gbm_prices):
+    def make(n=300, seed=0):
+        rng = np.random.default_rng(seed)
+        close = gbm_prices(n, rng).rename_axis('Date')
+        return pd.DataFrame({'close': close, 'open': close, 'volume': rng.integers(1, 1000, n)})
+    return make
+
+
+def test_get_and_reload(tmp_path, make_bars):
+    bars = make_bars()
+    source = CountingSource({'QQQ': bars})
+    cache = PriceCache(str(tmp_path), source=source)
+    df = cache.get('QQQ', '2020-02-01', '2020-06-01')
+    expected = bars[(bars.index >= '2020-02-01') & (bars.index < '2020-06-01')]
+    pd.testing.assert_frame_equal(df, expected, check_freq=False)
+    # a second cache on the same directory is served from disk
+    again = PriceCache(str(tmp_path), source=source).get('QQQ', '2020-03-01', '2020-04-01')
+    assert len(source.calls) == 1
+    assert again.index.min() >= pd.Timestamp('2020-03-01')
+    assert isinstance(cache.load('QQQ')['close'].to_numpy(), np.ndarray)
+
+
+def test_incremental_top_up_fetches_only_missing_ranges(tmp_path, make_bars):
+    bars = make_bars()
+    source = CountingSource({'QQQ': bars})
+    cache = PriceCache(str(tmp_path), source=source)
+    cache.get('QQQ', '2020-03-01', '2020-05-01')
+    df = cache.get('QQQ', '2020-02-01', '2020-07-01')
+    assert source.calls[1:] == [
+        ('QQQ', pd.Timestamp('2020-02-01'), pd.Timestamp('2020-03-01')),
+        ('QQQ', pd.Timestamp('2020-05-01'), pd.Timestamp('2020-07-01')),
+    ]
+    expected = bars[(bars.index >= '2020-02-01') & (bars.index < '2020-07-01')]
+    pd.testing.assert_frame_equal(df, expected, check_freq=False)
+    cache.get('QQQ', '2020-02-15', '2020-06-15')
+    assert len(source.calls) == 3
+
+
+class EmptyOnceSource(CountingSource):
+    """Returns no bars for the first ``failures`` fetches, like a failed download."""
+
+    def __init__(self, frames, failures=1):
+        super().__init__(frames)
+        self.failures = failures
+
+    def fetch(self, symbol, start, end, interval='1d'):
+        df = super().fetch(symbol, start, end, interval)
+        if self.failures:
+            self.failures -= 1
+            return df.iloc[:0]
+        return df
+
+
+def test_empty_fetches_and_future_ranges_are_not_cached(tmp_path, make_bars):
+    bars = make_bars()
+    source = EmptyOnceSource({'QQQ': bars})
+    cache = PriceCache(str(tmp_path), source=source)
+    assert cache.get('QQQ', '2020-02-01', '2020-06-01').empty
+    assert cache.load('QQQ') is None
+    # the failed range is fetched again, and the bars are cached this time
+    df = cache.get('QQQ', '2020-02-01', '2020-06-01')
+    expected = bars[(bars.index >= '2020-02-01') & (bars.index < '2020-06-01')]
+    pd.testing.assert_frame_equal(df, expected, check_freq=False)
+    cache.get('QQQ', '2020-03-01', '2020-05-01')
+    assert len(source.calls) == 2
+    # a failed top-up leaves the cached range as it was
+    source.failures = 1
+    cache.get('QQQ', '2020-02-01', '2020-08-01')
+    cache.get('QQQ', '2020-02-01', '2020-08-01')
+    assert source.calls[2:] == [('QQQ', pd.Timestamp('2020-06-01'), pd.Timestamp('2020-08-01'))] * 2
+    # coverage stops at today, so bars that don't exist yet are asked for later
+    future = pd.Timestamp.now().normalize() + pd.Timedelta(days=30)
+    live = CountingSource({'NOW': make_bars().set_axis(pd.date_range(end=pd.Timestamp.now().normalize(), periods=300,
+                                                                 freq='D', name='Date'))})
+    cache = PriceCache(str(tmp_path), source=live)
+    cache.get('NOW', '2000-01-01', future)
+    cache.get('NOW', '2000-01-01', future)
+    assert live.calls[1][1] == pd.Timestamp.now().normalize() + pd.Timedelta(1, 'ns')
+
+
+def test_offline_mode(tmp_path, make_bars):
+    bars = make_bars()
+    PriceCache(str(tmp_path), source=FrameSource({'QQQ': bars})).get('QQQ', '2020-01-01', '2020-06-01')
+    offline = PriceCache(str(tmp_path), source=CountingSource({}), offline=True)
+    # partially cached ranges return what is cached without touching the source
+    df = offline.get('QQQ', '2020-05-01', '2020-12-01')
+    assert df.index.max() < pd.Timestamp('2020-06-01')
+    assert offline.source.calls == []
+    with pytest.raises(LookupError):
+        offline.get('SPY', '2020-01-01', '2020-06-01')
+
+
+def test_lru_eviction(tmp_path, make_bars):
+    frames = {s: make_bars(seed=i) for i, s in enumerate(['A', 'B', 'C'])}
+    cache = PriceCache(str(tmp_path), source=FrameSource(frames))
+    cache.get('A', '2020-01-01', '2021-01-01')
+    entry = cache.size()
+    cache.max_bytes = int(entry * 2.5)
+    cache.get('B', '2020-01-01', '2021-01-01')
+    cache.load('A')  # touch A so B is the least recently used
+    cache.get('C', '2020-01-01', '2021-01-01')
+    assert cache.load('B') is None
+    assert cache.load('A') is not None and cache.load('C') is not None
+    assert cache.size() <= cache.max_bytes
+
+
+def test_tz_aware_index_round_trip(tmp_path, make_bars):
+    bars = make_bars()
+    bars.index = pd.date_range('2020-01-01 09:30', periods=len(bars), freq='min', tz='America/New_York')
+    cache = PriceCache(str(tmp_path), source=FrameSource({'QQQ': bars}))
+    cache.get('QQQ', '2020-01-01', '2020-01-02', interval='1m')
+    df = PriceCache(str(tmp_path), source=CountingSource({}), offline=True).get(
+        'QQQ', '2020-01-01', '2020-01-02', interval='1m')
+    pd.testing.assert_frame_equal(df, bars, check_freq=False)
+
+
+def test_csv_source(tmp_path, make_bars):
+    raw = make_bars().rename(columns={'close': 'Close', 'open': 'Open', 'volume': 'Volume'})
+    raw.to_csv(tmp_path / 'SPY.csv')
+    df = CsvSource(str(tmp_path)).fetch('SPY', pd.Timestamp('2020-01-01'), pd.Timestamp('2020-02-01'))
+    assert list(df.columns) == ['close', 'open', 'volume']
+    assert standardize_columns(raw.copy()).shape == raw.shape
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_token_bucket_limits_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=clock, sleep=clock.sleep)
+    for _ in range(7):
+        bucket.acquire()
+    # a burst of 3, then one token every half second
+    assert clock.now == pytest.approx(2.0)
+
+
+class FlakySource(PriceSource):
+    def __init__(self, frames, failures, error=ConnectionError):
+        self.frames = FrameSource(frames)
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def fetch(self, symbol, start, end, interval='1d'):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error('temporarily unavailable')
+        return self.frames.fetch(symbol, start, end, interval)
+
+
+def test_throttled_source_retries_with_backoff(make_bars):
+    clock = FakeClock()
+    source = FlakySource({'QQQ': make_bars()}, failures=2)
+    throttled = ThrottledSource(source, rate=100, retries=3, backoff=1.0, sleep=clock.sleep)
+    df = throttled.fetch('QQQ', pd.Timestamp('2020-01-01'), pd.Timestamp('2020-03-01'))
+    assert source.calls == 3 and len(df) > 0
+    # jittered exponential backoff: [0.5, 1] then [1, 2] seconds
+    assert 0.5 <= clock.sleeps[0] <= 1.0 and 1.0 <= clock.sleeps[1] <= 2.0
+
+    with pytest.raises(ConnectionError):
+        ThrottledSource(FlakySource({}, failures=10), retries=2, sleep=clock.sleep).fetch('QQQ', None, None)
+    missing = FlakySource({}, failures=0)
+    with pytest.raises(LookupError):
+        ThrottledSource(missing, retries=5, sleep=clock.sleep).fetch('QQQ', None, None)
+    assert missing.calls == 1
+
+
+class SlowSource(CountingSource):
+    """Records how many fetches overlap."""
+
+    def __init__(self, frames, delay=0.05):
+        super().__init__(frames)
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def fetch(self, symbol, start, end, interval='1d'):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        return super().fetch(symbol, start, end, interval)
+
+
+def test_get_many_fetches_concurrently_and_coalesces(tmp_path, make_bars):
+    frames = {s: make_bars(seed=i) for i, s in enumerate(['A', 'B', 'C', 'D', 'E', 'F'])}
+    source = SlowSource(frames)
+    cache = PriceCache(str(tmp_path), source=source)
+    requests = [(s, '2020-02-01', '2020-06-01') for s in frames] + [('A', '2020-01-01', '2020-03-01')]
+    results = cache.get_many(requests, max_workers=3)
+    # the two 'A' requests share one fetch over the union of their ranges
+    assert sorted(c[0] for c in source.calls) == sorted(frames)
+    assert ('A', pd.Timestamp('2020-01-01'), pd.Timestamp('2020-06-01')) in source.calls
+    assert source.peak == 3
+    for (symbol, start, end), df in zip(requests, results):
+        bars = frames[symbol]
+        pd.testing.assert_frame_equal(df, bars[(bars.index >= start) & (bars.index < end)], check_freq=False)
+
+
+def test_concurrent_gets_for_one_symbol_fetch_once(tmp_path, make_bars):
+    source = SlowSource({'QQQ': make_bars()})
+    cache = PriceCache(str(tmp_path), source=source)
+    threads = [threading.Thread(target=cache.get, args=('QQQ', '2020-02-01', '2020-06-01')) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(source.calls) == 1
+
+
+
+class LoggedSource(FrameSource):
+    """Appends each fetch to a file, so fetches in other processes are seen too."""
+
+    def __init__(self, frames, log, delay=0.2):
+        super().__init__(frames)
+        self.log = log
+        self.delay = delay
+
+    def fetch(self, symbol, start, end, interval='1d'):
+        with open(self.log, 'a') as f:
+            f.write(f'{os.getpid()} {start.date()} {end.date()}\n')
+        time.sleep(self.delay)
+        return super().fetch(symbol, start, end, interval)
+
+
+@pytest.mark.skipif(price_cache.fcntl is None, reason='entries are only locked across processes with fcntl')
+def test_processes_fill_one_entry_in_turn(tmp_path, make_bars):
+    bars = make_bars()
+    log = str(tmp_path / 'fetches.log')
+    root = str(tmp_path / 'cache')
+    # two workers filling overlapping ranges of one symbol: unlocked, both
+    # would fetch everything and the last to store would drop the other's bars
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=PriceCache(root, source=LoggedSource({'QQQ': bars}, log)).get,
+                               args=('QQQ', start, end))
+               for start, end in [('2020-02-01', '2020-06-01'), ('2020-05-01', '2020-09-01')]]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(30)
+    assert [w.exitcode for w in workers] == [0, 0]
+    with open(log) as f:
+        fetches = f.read().splitlines()
+    # the second worker only topped up what the first hadn't fetched
+    assert len(fetches) == 2 and len({line.split()[0] for line in fetches}) == 2
+    cache = PriceCache(root, source=FrameSource({}), offline=True)
+    expected = bars.loc['2020-02-01':'2020-08-31']
+    pd.testing.assert_frame_equal(cache.get('QQQ', '2020-02-01', '2020-09-01'), expected, check_dtype=False,
+                                  check_freq=False)
+    assert os.path.exists(os.path.join(root, 'QQQ', '1d.lock')) and len(cache._entries()) == 1
+
+def test_get_many_reports_failures(tmp_path, make_bars):
+    cache = PriceCache(str(tmp_path), source=FrameSource({'QQQ': make_bars()}))
+    ok, missing = cache.get_many([('QQQ', '2020-02-01', '2020-03-01'), ('NOPE', '2020-02-01', '2020-03-01')],
+                                 return_exceptions=True)
+    assert len(ok) > 0 and isinstance(missing, LookupError)
+    with pytest.raises(LookupError):
+        cache.get_many([('NOPE', '2020-02-01', '2020-03-01')])
@@ -0,0 +1,98 @@
+import pstats
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+import profiling
+from backtester import Backtester
+from strategies import sma_crossover
+
+
+@pytest.fixture(autouse=True)
+def clean():
+    profiling.reset()
+    yield
+    profiling.disable()
+    profiling.reset()
+
+
+@profiling.stage('outer')
+def _outer(values):
+    return _inner(values) * 2
+
+
+@profiling.stage('inner')
+def _inner(values):
+    return np.cumsum(values)
+
+
+def test_disabled_records_nothing():
+    _outer(np.ones(10))
+    assert profiling.format_report() == 'no stages recorded'
+    assert profiling.folded() == ''
+
+
+def test_enabled_records_calls_rows_and_nesting():
+    profiling.enable()
+    for _ in range(3):
+        _outer(np.ones(50))
+    report = profiling.report()
+    assert report.loc['outer', 'calls'] == 3 and report.loc['inner', 'calls'] == 3
+    assert report.loc['inner', 'rows'] == 150
+    assert report.loc['outer', 'seconds'] >= report.loc['inner', 'seconds']
+    stacks = dict(line.rsplit(' ', 1) for line in profiling.folded().splitlines())
+    assert set(stacks) == {'outer', 'outer;inner'}
+
+
+def test_exceptions_still_close_the_stage():
+    @profiling.stage('boom')
+    def boom():
+        raise ValueError
+    profiling.enable()
+    with pytest.raises(ValueError):
+        boom()
+    _outer(np.ones(3))
+    assert set(profiling.folded().split()[::2]) == {'boom', 'outer', 'outer;inner'}
+
+
+def test_profile_context_traces_memory_and_dumps_cprofile(tmp_path):
+    price = pd.Series(np.linspace(100, 120, 500), index=pd.date_range('2020-01-01', periods=500))
+    with profiling.profile(str(tmp_path / 'run.prof'), trace_memory=True):
+        signals = sma_crossover.generate_signals(price, 5, 20)
+        Backtester.performance_metrics(Backtester(price).run_signals(signals))
+    assert not profiling.enabled()
+    report = profiling.report()
+    assert {'sma_crossover.generate_signals', 'run_signals', 'compute_metrics'} <= set(report.index)
+    assert (report['peak_bytes'] > 0).all()
+    stats = pstats.Stats(str(tmp_path / 'run.prof'))
+    assert any(fn[2] == 'run_signals' for fn in stats.stats)
+
+
+def test_concurrent_profiles_are_separate():
+    # two overlapping runs on their own threads, as in two Streamlit sessions
+    started, finished = threading.Barrier(2), threading.Event()
+    runs = {}
+
+    def session(name, stage, calls, hold):
+        with profiling.profile() as run:
+            started.wait()
+            for _ in range(calls):
+                stage(np.ones(10))
+            if hold:
+                finished.wait()
+            else:
+                finished.set()
+            # the other run finishing leaves this one recording
+            stage(np.ones(10))
+        runs[name] = run
+
+    threads = [threading.Thread(target=session, args=('a', _outer, 3, True)),
+               threading.Thread(target=session, args=('b', _inner, 5, False))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert set(runs['a'].stats) == {'outer', 'inner'} and runs['a'].stats['outer']['calls'] == 4
+    assert set(runs['b'].stats) == {'inner'} and runs['b'].stats['inner']['calls'] == 6
+    # neither leaks into this thread
+    assert not profiling.enabled() and profiling.format_report() == 'no stages recorded'
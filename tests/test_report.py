@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+import report
+import utils
+
+
+@pytest.fixture
+def make_equity(gbm_prices):
+    def make(n=50_000, seed=0):
+        return gbm_prices(n, seed, s0=100000.0, sigma=1e-3, start='2015-01-01', freq='min')
+    return make
+
+
+def test_lttb_keeps_endpoints_and_extremes(make_equity):
+    y = make_equity().to_numpy()
+    x = np.arange(len(y), dtype=float)
+    keep = report.lttb(x, y, 500)
+    assert len(keep) == 500
+    assert keep[0] == 0 and keep[-1] == len(y) - 1
+    assert (np.diff(keep) > 0).all()
+    assert y.argmin() in keep and y.argmax() in keep
+    # short inputs pass through untouched
+    np.testing.assert_array_equal(report.lttb(x[:10], y[:10], 500), np.arange(10))
+    with pytest.raises(ValueError):
+        report.lttb(x, y, 2)
+
+
+def test_lttb_picks_spikes_and_skips_nans():
+    y = np.zeros(1000)
+    y[[137, 555]] = [5.0, -3.0]
+    y[300:320] = np.nan  # shorter than a bucket
+    keep = report.lttb(np.arange(1000.0), y, 20)
+    assert {137, 555} <= set(keep)
+    assert not np.isnan(y[keep]).any()
+
+
+def test_downsample_uses_timestamps_as_x(make_equity):
+    equity = make_equity(10_000)
+    line = report.downsample(equity, 300)
+    assert len(line) == 300
+    assert line.index.is_monotonic_increasing
+    assert line.max() == equity.max() and line.min() == equity.min()
+    assert report.downsample(equity.iloc[:100], 300) is not None
+
+
+def test_renderer_reuses_figures_outside_pyplot(tmp_path, make_equity):
+    plt = pytest.importorskip('matplotlib.pyplot')
+    equity = make_equity()
+    with report.Renderer(dpi=50) as renderer:
+        first = renderer.equity(equity, 'a', path=str(tmp_path / 'a.png'))
+        second = renderer.equity(equity * 2, 'b', path=str(tmp_path / 'b.png'))
+        comparison = renderer.comparison({'a': equity, 'b': equity * 2})
+        assert first.result().startswith(b'\x89PNG') and comparison.result().startswith(b'\x89PNG')
+        second.result()
+        assert len(renderer._figures._figures) == 2
+    assert (tmp_path / 'a.png').read_bytes() == first.result()
+    assert plt.get_fignums() == []
+
+
+def test_html_report(tmp_path, make_equity):
+    pytest.importorskip('matplotlib')
+    results = {f'run {i}': make_equity(2000, i) for i in range(3)}
+    metrics = pd.DataFrame({name: {'sharpe': i / 10} for i, name in enumerate(results)}).T
+    path = report.write_html(str(tmp_path / 'out' / 'report.html'), results, metrics, title='Batch <1>')
+    page = open(path, encoding='utf-8').read()
+    assert page.count('data:image/png;base64,') == 2
+    assert 'Batch &lt;1&gt;' in page and 'run 2' in page and 'Equity Curves (3 of 3)' in page
+
+
+def test_utils_plots_go_to_output_dir(tmp_path, monkeypatch, make_equity):
+    pytest.importorskip('matplotlib')
+    monkeypatch.setattr(utils, 'OUTPUT_DIR', str(tmp_path))
+    equity = make_equity(3000)
+    utils.plot_equity(equity, 'My Run')
+    with report.Renderer(dpi=50) as renderer:
+        utils.compare_results({'a': equity}, renderer).result()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['equity_comparison.png', 'equity_my_run.png']
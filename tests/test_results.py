@@ -0,0 +1,123 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+import batch
+import results
+from backtester import Backtester
+from strategies import sma_crossover, rsi_meanrev
+
+
+@pytest.fixture
+def make_price(gbm_prices):
+    return functools.partial(gbm_prices, 300, sigma=0.02, start='2021-01-01', freq='D', name='close')
+
+
+def _run(price, short_window=10):
+    bt = Backtester(price, commission=0.01)
+    equity = bt.run_signals(sma_crossover.generate_signals(price, short_window=short_window))
+    return equity, bt.history, Backtester.performance_metrics(equity)
+
+
+def test_fingerprint_and_run_key(make_price):
+    price = make_price()
+    assert results.fingerprint(price) == results.fingerprint(price.rename('other').copy())
+    changed = price.copy()
+    changed.iloc[100] += 1e-9
+    assert results.fingerprint(changed) != results.fingerprint(price)
+    assert results.fingerprint(price.tz_localize('UTC')) != results.fingerprint(price)
+    assert results.fingerprint(price.to_numpy()) == results.fingerprint(price.to_numpy().copy())
+
+    key = results.run_key(price, sma_crossover.generate_signals, {'short_window': 10}, {'cash': 100000})
+    assert key == results.run_key(results.fingerprint(price), sma_crossover.generate_signals,
+                                  {'short_window': 10}, {'cash': 100000})
+    for other in [results.run_key(changed, sma_crossover.generate_signals, {'short_window': 10}, {'cash': 100000}),
+                  results.run_key(price, rsi_meanrev.generate_signals, {'short_window': 10}, {'cash': 100000}),
+                  results.run_key(price, sma_crossover.generate_signals, {'short_window': 11}, {'cash': 100000}),
+                  results.run_key(price, sma_crossover.generate_signals, {'short_window': 10}, {'cash': 1})]:
+        assert other != key
+    assert results.code_token(sma_crossover).startswith('strategies.sma_crossover@')
+
+
+@pytest.mark.parametrize('tz', [None, 'America/New_York'])
+def test_put_get_round_trip(tmp_path, tz, make_price):
+    store = results.ResultStore(str(tmp_path))
+    price = make_price(1, tz=tz)
+    rng = np.random.default_rng(1)
+    # long, short and flat spells, so trades close
+    signals = pd.Series(rng.choice([-1.0, 0.0, 1.0], len(price)), index=price.index).where(
+        rng.random(len(price)) < 0.1).ffill().fillna(0)
+    bt = Backtester(price, commission=0.01)
+    equity = bt.run_signals(signals)
+    history, metrics = bt.history, Backtester.performance_metrics(equity)
+    assert len(history.round_trips()) > 3
+    assert store.get('ab' * 32) is None
+    assert store.put('ab' * 32, equity, history, metrics, info={'symbols': ('QQQ',)})
+    assert not store.put('ab' * 32, equity * 2, history, metrics)
+    for mmap in (True, False):
+        stored, ledger, stored_metrics = store.get('ab' * 32, mmap=mmap)
+        pd.testing.assert_series_equal(stored, equity)
+        assert stored_metrics == metrics
+        pd.testing.assert_frame_equal(ledger.round_trips(), history.round_trips())
+        pd.testing.assert_frame_equal(ledger.to_frame(), history.to_frame())
+    assert store.put('cd' * 32, equity)
+    assert store.get('cd' * 32)[1] is None
+
+
+def test_memoize_and_query(tmp_path, make_price):
+    store = results.ResultStore(str(tmp_path))
+    price = make_price(2)
+    calls = []
+
+    def compute(window):
+        calls.append(window)
+        return _run(price, window)
+
+    for window in (5, 10, 15, 10):
+        results.memoize(price, sma_crossover.generate_signals, {'short_window': window}, {'cash': 100000},
+                        lambda: compute(window), info={'symbol': 'AAA', 'params': {'short_window': window}},
+                        store=store)
+    assert calls == [5, 10, 15]
+    # a new process sees the same runs
+    reopened = results.ResultStore(str(tmp_path))
+    equity, _, metrics = results.memoize(price, sma_crossover.generate_signals, {'short_window': 15},
+                                         {'cash': 100000}, lambda: compute(-1), store=reopened)
+    assert calls == [5, 10, 15] and metrics == _run(price, 15)[2]
+
+    table = reopened.query(symbol='AAA')
+    assert len(table) == 3 and sorted(table['params.short_window']) == [5, 10, 15]
+    assert (table['trades'] > 0).all() and table['sharpe'].notna().all()
+    assert len(reopened.query(**{'params.short_window': 10})) == 1
+    assert reopened.query(symbol='BBB').empty and reopened.query(nope=1).empty
+    curves = reopened.equity_curves(table.index)
+    assert curves.shape == (len(price), 3)
+    with pytest.raises(LookupError):
+        reopened.equity_curves(['00' * 32])
+
+    (tmp_path / results.INDEX_FILE).unlink()
+    assert reopened.query().empty
+    assert reopened.rebuild_index() == 3
+    pd.testing.assert_frame_equal(reopened.query().sort_index(), table.sort_index())
+
+
+def test_concurrent_writers(tmp_path, make_price):
+    store = results.ResultStore(str(tmp_path))
+    equity, history, metrics = _run(make_price(3))
+    with ThreadPoolExecutor(8) as pool:
+        won = list(pool.map(lambda _: store.put('ef' * 32, equity, history, metrics), range(16)))
+    assert sum(won) == 1 and len(store.query()) == 1
+
+    # worker processes racing on the same runs
+    prices = {'AAA': make_price(4), 'BBB': make_price(5)}
+    jobs = [(s, 'sma_crossover', {'short_window': w}) for s in prices for w in (5, 10)] * 4
+    table = batch.run_batch(jobs, prices=prices, max_workers=3, results_dir=str(tmp_path))
+    assert table['error'].isna().all()
+    assert table['key'].nunique() == 4
+    stored = store.query()
+    assert len(stored) == 5 and set(table['key']) <= set(stored.index)
+    again = batch.run_batch(jobs[:4], prices=prices, max_workers=1, results_dir=str(tmp_path))
+    sharpe = table.drop_duplicates('key').set_index('key')['sharpe']
+    assert (again.set_index('key')['sharpe'] == sharpe[again['key']]).all()
+    assert not list((tmp_path / 'tmp').iterdir())
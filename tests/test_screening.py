@@ -0,0 +1,109 @@
+import functools
+import numpy as np
+import pandas as pd
+import pytest
+import screening
+from backtester import PortfolioBacktester
+from strategies import market_mood
+
+
+@pytest.fixture
+def universe(gbm_prices):
+    def make(n=400, seed=0):
+        """Two cointegrated pairs (A/B and C/D) and two independent random walks."""
+        rng = np.random.default_rng(seed)
+        walk = functools.partial(gbm_prices, n, rng, sigma=0.02, start='2019-01-01')
+        base, other = walk(s0=50.0).to_numpy(), walk(s0=80.0)
+        noise = np.zeros(n)
+        for t in range(1, n):
+            noise[t] = 0.7 * noise[t - 1] + rng.normal(0, 0.5)
+        return pd.DataFrame({
+            'A': 1.5 * base + 10 + noise,
+            'B': base,
+            'C': other,
+            'D': 0.8 * other - 5 + rng.normal(0, 0.4, n),
+            'E': walk(s0=60.0),
+            'F': walk(s0=70.0),
+        }, index=other.index)
+    return make
+
+
+def _engle_granger(a, b):
+    """Hedge ratio, t-stat and half-life of one pair from explicit regressions."""
+    X = np.column_stack([np.ones(len(b)), b])
+    beta = np.linalg.lstsq(X, a, rcond=None)[0][1]
+    e = a - X @ np.linalg.lstsq(X, a, rcond=None)[0]
+    y, x = np.diff(e), e[:-1]
+    gamma = (x @ y) / (x @ x)
+    resid = y - gamma * x
+    se = np.sqrt(resid @ resid / (len(y) - 1) / (x @ x))
+    with np.errstate(invalid='ignore'):
+        return beta, gamma / se, -np.log(2) / np.log1p(gamma)
+
+
+def test_align_prices():
+    weekdays = pd.Series([1.0, 2.0, 3.0], index=pd.to_datetime(['2024-01-05', '2024-01-08', '2024-01-09']))
+    daily = pd.Series(np.arange(10.0, 16.0), index=pd.date_range('2024-01-04', periods=6))
+    inner = screening.align_prices({'SPY': weekdays, 'BTC': daily})
+    assert list(inner.index) == list(weekdays.index)
+    # the union calendar keeps the weekend and carries Friday's close, but not the bar before SPY's first
+    filled = screening.align_prices({'SPY': weekdays, 'BTC': daily}, how='ffill')
+    assert list(filled.index) == list(daily.index[1:])
+    assert list(filled['SPY']) == [1.0, 1.0, 1.0, 2.0, 3.0]
+    limited = screening.align_prices({'SPY': weekdays, 'BTC': daily}, how='ffill', limit=1)
+    assert pd.Timestamp('2024-01-07') not in limited.index
+    short = pd.Series([5.0], index=[pd.Timestamp('2024-01-09')])
+    assert len(screening.align_prices({'SPY': weekdays, 'BTC': daily, 'NEW': short})) == 1
+    assert list(screening.align_prices({'SPY': weekdays, 'BTC': daily, 'NEW': short},
+                                       min_coverage=0.5).columns) == ['SPY', 'BTC']
+    with pytest.raises(ValueError, match='how'):
+        screening.align_prices({'SPY': weekdays}, how='union')
+
+
+@pytest.mark.parametrize('block_rows, max_workers', [(64, 1), (2, 3)])
+def test_screen_pairs_match_explicit_regressions(block_rows, max_workers, universe):
+    prices = universe()
+    pairs = screening.screen_pairs(prices, block_rows=block_rows, max_workers=max_workers)
+    assert len(pairs) == 15 and list(pairs.columns) == screening.COLUMNS
+    assert (np.diff(pairs['tstat']) >= 0).all()
+    assert {tuple(sorted(p)) for p in pairs[['a', 'b']].head(2).to_numpy()} == {('A', 'B'), ('C', 'D')}
+    for row in pairs.itertuples():
+        a, b = prices[row.a].to_numpy(), prices[row.b].to_numpy()
+        beta, tstat, half_life = _engle_granger(a, b)
+        assert row.hedge_ratio == pytest.approx(beta, rel=1e-8)
+        assert row.tstat == pytest.approx(tstat, rel=1e-6)
+        # the kept direction is the more negative one
+        assert row.tstat <= _engle_granger(b, a)[1] + 1e-9
+        assert row.correlation == pytest.approx(np.corrcoef(a, b)[0, 1])
+        if tstat < 0:
+            assert row.half_life == pytest.approx(half_life, rel=1e-6, nan_ok=True)
+    assert pairs['level'].iloc[0] == 0.01 and np.isnan(pairs['level'].iloc[-1])
+    # keeping only the best doesn't change them
+    pd.testing.assert_frame_equal(screening.screen_pairs(prices, top=4, block_rows=block_rows,
+                                                         max_workers=max_workers), pairs.head(4))
+
+
+def test_screen_pairs_validation(universe):
+    prices = universe(50)
+    gap = prices.copy()
+    gap.iloc[3, 2] = np.nan
+    with pytest.raises(ValueError, match='missing'):
+        screening.screen_pairs(gap)
+    assert screening.screen_pairs(prices[['A']]).empty
+
+
+def test_backtest_pairs_match_portfolio_backtester(universe):
+    prices = universe()
+    pairs = screening.screen_pairs(prices, top=3)
+    equity, table = screening.backtest_pairs(prices, pairs, window=15, commission=0.01)
+    assert list(equity.columns) == list(table.index) == screening.pair_labels(pairs)
+    for row, label in zip(pairs.itertuples(), equity.columns):
+        a, b = prices[row.a], prices[row.b]
+        dfpos = market_mood.generate_pairs_signals(a, b, window=15, hedge_ratio=row.hedge_ratio)
+        expected = PortfolioBacktester(pd.DataFrame({'a': a, 'b': b}), commission=0.01).run_signals(
+            dfpos.set_axis(['a', 'b'], axis=1))
+        np.testing.assert_array_equal(equity[label].to_numpy(), expected.to_numpy())
+    # the default hedge ratio is the plain price difference
+    a, b = prices['A'], prices['B']
+    np.testing.assert_array_equal(market_mood.generate_pairs_signals(a, b)['pos_a'],
+                                  market_mood.positions_from_zscore(market_mood.zscore(a - b, 20), 2.0, 0.5))
@@ -0,0 +1,173 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+import batch
+import compute
+import price_cache
+import results
+import service
+
+
+@pytest.fixture
+def frames(tmp_path, gbm_prices):
+    rng = np.random.default_rng(0)
+    frames = {s: gbm_prices(400, rng, sigma=0.02, freq='D').to_frame('close') for s in ['AAA', 'BBB']}
+    previous = price_cache._default_cache, (results._default_store, results._default_set)
+    price_cache.set_default_cache(price_cache.PriceCache(str(tmp_path / 'prices'),
+                                                         source=price_cache.FrameSource(frames)))
+    results.set_default_store(results.ResultStore(str(tmp_path / 'results')))
+    yield frames
+    price_cache.set_default_cache(previous[0])
+    results._default_store, results._default_set = previous[1]
+
+
+@pytest.fixture
+def gated():
+    """A one-thread service whose worker is held until ``gate.set()``."""
+    gate = threading.Event()
+    executor = ThreadPoolExecutor(1)
+    executor.submit(gate.wait)
+    svc = service.BacktestService(executor=executor)
+    yield svc, gate
+    gate.set()
+    svc.close()
+
+
+RUNS = [service.spec('sma_crossover', ['AAA'], '2020-01-01', '2021-01-01', (10, 30), commission=0.01),
+        service.spec('market_mood', ['AAA', 'BBB'], '2020-01-01', '2021-01-01')]
+
+
+def test_jobs_are_queued_deduplicated_and_match_compute(frames, gated):
+    svc, gate = gated
+    job = svc.submit(RUNS)
+    assert svc.status(job)['status'] == 'queued' and svc.status(job)['total'] == 2
+    # an identical request joins the queued job, a different one doesn't
+    assert svc.submit([dict(r) for r in RUNS]) == job
+    other = svc.submit(RUNS[:1])
+    assert other != job
+    with pytest.raises(ValueError, match='queued'):
+        svc.result(job)
+    gate.set()
+    outputs = service.wait(svc, job, poll=0.01, timeout=30)
+    assert svc.status(job)['done'] == 2 and svc.status(job)['status'] == 'done'
+    equity, metrics = compute.run('sma_crossover', ['AAA'], '2020-01-01', '2021-01-01', (10, 30), commission=0.01)
+    pd.testing.assert_series_equal(outputs[0][0], equity)
+    assert outputs[0][1] == metrics
+    assert outputs[1][1] == compute.run('market_mood', ['AAA', 'BBB'], '2020-01-01', '2021-01-01')[1]
+    # once finished, the same request is a new job
+    assert svc.submit(RUNS) != job
+    assert {j['id'] for j in svc.jobs()} >= {job, other}
+
+
+def test_cancel_and_failures(frames, gated):
+    svc, gate = gated
+    seen = []
+    job = svc.submit(RUNS)
+    assert svc.cancel(job)['status'] == 'cancelled'
+    with pytest.raises(ValueError, match='cancelled'):
+        service.wait(svc, job, poll=0.01, progress=seen.append)
+    assert seen[-1]['status'] == 'cancelled'
+    failing = svc.submit([service.spec('sma_crossover', ['ZZZ'])] + RUNS)
+    gate.set()
+    with pytest.raises(ValueError, match='failed: LookupError'):
+        service.wait(svc, failing, poll=0.01, timeout=30)
+    with pytest.raises(ValueError, match='unknown strategy'):
+        svc.submit([service.spec('nope', ['AAA'])])
+    with pytest.raises(ValueError, match='2 symbol'):
+        svc.submit([service.spec('market_mood', ['AAA'])])
+    with pytest.raises(ValueError, match='takes 2 parameters, got 3'):
+        svc.submit([service.spec('sma_crossover', ['AAA'], params=(10, 30, 5))])
+    with pytest.raises(ValueError, match='must be an integer, got 2.7'):
+        svc.submit([service.spec('sma_crossover', ['AAA'], params=(2.7, 30))])
+    for bad in (float('inf'), float('nan')):
+        with pytest.raises(ValueError, match='parameter 2 must be finite'):
+            svc.submit([service.spec('market_mood', ['AAA', 'BBB'], params=(20, bad, 0.5))])
+    # integral floats (JSON numbers, CLI values) are fine
+    assert svc.submit([service.spec('sma_crossover', ['AAA'], params=(10.0, 30))])
+    with pytest.raises(ValueError, match='at least one run'):
+        svc.submit([])
+    with pytest.raises(LookupError):
+        svc.status('missing')
+
+
+def test_http_api(frames, gated):
+    svc, gate = gated
+    server = service.serve(port=0, service=svc)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        client = service.ServiceClient(f'http://127.0.0.1:{server.server_address[1]}')
+        job = client.submit(RUNS)
+        assert client.submit(RUNS) == job and client.status(job)['status'] == 'queued'
+        cancelled = client.submit(RUNS[1:])
+        assert client.cancel(cancelled)['status'] == 'cancelled'
+        gate.set()
+        outputs = service.wait(client, job, poll=0.01, timeout=30)
+        local = svc.result(job)
+        for (equity, metrics), (expected, expected_metrics) in zip(outputs, local):
+            pd.testing.assert_series_equal(equity, expected, check_freq=False)
+            assert metrics == expected_metrics
+        small = client.result(job, points=50)
+        assert len(small[0][0]) <= 51 and small[0][0].iloc[-1] == local[0][0].iloc[-1]
+        assert {j['id'] for j in client.jobs()} == {job, cancelled}
+        with pytest.raises(LookupError):
+            client.status('missing')
+        with pytest.raises(ValueError, match='unknown strategy'):
+            client.submit([service.spec('nope', ['AAA'])])
+        # a 400 with the parameter error, not a 500 from int(inf)
+        with pytest.raises(ValueError, match='must be finite'):
+            client.submit([service.spec('sma_crossover', ['AAA'], params=(float('inf'), 30))])
+        with pytest.raises(ValueError, match='is cancelled'):
+            client.result(cancelled)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_batch_client(frames):
+    svc = service.BacktestService(executor=ThreadPoolExecutor(2))
+    server = service.serve(port=0, service=svc)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        jobs = [('AAA', 'sma_crossover', {'short_window': 10, 'long_window': 30}), ('AAA', 'rsi_meanrev', {}),
+                (('AAA', 'BBB'), 'market_mood', {'entry_z': 1.5}), ('ZZZ', 'sma_crossover', {}),
+                ('AAA', 'sma_crossover', {'nope': 1})]
+        rows = {(r['symbol'], r['strategy'], r['params']): r
+                for r in batch.iter_service(jobs, f'http://127.0.0.1:{server.server_address[1]}', '2020-01-01',
+                                            '2021-01-01', commission=0.01, equity_points=50, poll=0.01)}
+    finally:
+        server.shutdown()
+        server.server_close()
+        svc.close()
+    assert len(rows) == 5
+    sma = rows[('AAA', 'sma_crossover', repr(jobs[0][2]))]
+    expected = compute.run('sma_crossover', ['AAA'], '2020-01-01', '2021-01-01', (10, 30), commission=0.01)[1]
+    assert sma['error'] is None and sma['sharpe'] == expected['sharpe'] and len(sma['equity']) <= 51
+    mood = rows[('AAA/BBB', 'market_mood', repr(jobs[2][2]))]
+    assert mood['sharpe'] == compute.run('market_mood', ['AAA', 'BBB'], '2020-01-01', '2021-01-01', (20, 1.5, 0.5),
+                                         commission=0.01)[1]['sharpe']
+    assert rows[('ZZZ', 'sma_crossover', '{}')]['error'].startswith('LookupError')
+    assert 'nope' in rows[('AAA', 'sma_crossover', "{'nope': 1}")]['error']
+
+
+
+def test_batch_cli_rejects_per_share_commission_with_service(capsys):
+    with pytest.raises(SystemExit):
+        batch.main(['--symbols', 'AAA', '--service', 'http://127.0.0.1:1', '--commission', '0.01'])
+    assert '--commission is per share' in capsys.readouterr().err
+
+def test_process_workers(frames, tmp_path, monkeypatch):
+    # spawned workers read the prices and store the results through the environment
+    for symbol in frames:
+        price_cache.default_cache().get(symbol, '2020-01-01', '2021-01-01')
+    monkeypatch.setenv('QUANT_GYM_CACHE_DIR', str(tmp_path / 'prices'))
+    monkeypatch.setenv('QUANT_GYM_OFFLINE', '1')
+    monkeypatch.setenv('QUANT_GYM_RESULTS_DIR', str(tmp_path / 'results'))
+    with service.BacktestService(max_workers=1) as svc:
+        outputs = service.wait(svc, svc.submit(RUNS), poll=0.05, timeout=120)
+    assert outputs[0][1] == compute.run('sma_crossover', ['AAA'], '2020-01-01', '2021-01-01', (10, 30),
+                                        commission=0.01)[1]
+    assert len(results.ResultStore(str(tmp_path / 'results')).query()) == 2
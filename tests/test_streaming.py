@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from backtester import Backtester, PortfolioBacktester
+from price_cache import PriceCache, FrameSource
+from strategies import sma_crossover, rsi_meanrev, market_mood
+from streaming import LiveRunner, ReplaySource
+
+
+@pytest.fixture
+def cache(tmp_path, gbm_prices):
+    rng = np.random.default_rng(3)
+    a = gbm_prices(700, rng, sigma=0.02, start='2019-01-01', freq='D').to_frame('close')
+    # B trades on weekdays only, so the pair has missing bars on weekends
+    b = gbm_prices(700, rng, s0=80.0, sigma=0.02, start='2019-01-01', freq='D').to_frame('close')
+    b = b[b.index.dayofweek < 5]
+    PriceCache(str(tmp_path), source=FrameSource({'AAA': a, 'BBB': b})).get('AAA', '2019-01-01', '2021-01-01')
+    PriceCache(str(tmp_path), source=FrameSource({'BBB': b})).get('BBB', '2019-01-01', '2021-01-01')
+    # replay works offline from the cached history
+    return PriceCache(str(tmp_path), source=FrameSource({}), offline=True)
+
+
+@pytest.mark.parametrize('module, stream, params', [
+    (sma_crossover, sma_crossover.SMACrossoverStream, {'short_window': 10, 'long_window': 30}),
+    (rsi_meanrev, rsi_meanrev.RSIStream, {'low': 35, 'high': 65, 'period': 7}),
+])
+def test_single_asset_stream_matches_batch(cache, module, stream, params):
+    runner = LiveRunner(stream(**params), cash=50000, commission=0.01)
+    equity = runner.run(ReplaySource(cache, 'AAA', '2019-01-01', '2021-01-01'))
+
+    price = cache.get('AAA', '2019-01-01', '2021-01-01')['close']
+    bt = Backtester(price, cash=50000, commission=0.01)
+    expected = bt.run_signals(module.generate_signals(price, **params))
+    np.testing.assert_array_equal(equity.to_numpy(), expected.to_numpy())
+    pd.testing.assert_frame_equal(runner.history.to_frame(), bt.history.to_frame())
+
+
+def test_pairs_stream_matches_batch(cache):
+    params = {'window': 15, 'entry_z': 1.5, 'exit_z': 0.5}
+    runner = LiveRunner(market_mood.PairsStream(**params), legs=2)
+    equity = runner.run(ReplaySource(cache, ['AAA', 'BBB'], '2019-01-01', '2021-01-01'))
+
+    a = cache.get('AAA', '2019-01-01', '2021-01-01')['close']
+    b = cache.get('BBB', '2019-01-01', '2021-01-01')['close']
+    dfpos = market_mood.generate_pairs_signals(a, b, **params)
+    prices = pd.DataFrame({'a': a, 'b': b}).reindex(dfpos.index)
+    expected = PortfolioBacktester(prices).run_signals(dfpos.set_axis(['a', 'b'], axis=1))
+    assert list(equity.index) == list(dfpos.index)
+    np.testing.assert_allclose(equity.to_numpy(), expected.to_numpy(), rtol=1e-12)
+
+
+def test_on_bar_is_incremental():
+    bt = Backtester(cash=1000)
+    assert bt.on_bar(0, 10.0, 1) == 1000
+    assert bt.on_bar(1, 12.0, 1) == pytest.approx(1020)
+    assert bt.on_bar(2, 11.0, 0) == pytest.approx(1010)
+    assert list(bt.history.to_frame()['side']) == ['enter', 'exit']
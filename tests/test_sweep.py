@@ -0,0 +1,83 @@
+import functools
+import numpy as np
+import pandas as pd
+import pytest
+from backtester import Backtester
+from ledger import Side
+from strategies import sma_crossover, rsi_meanrev, market_mood
+import sweep
+
+
+@pytest.fixture
+def make_prices(gbm_prices):
+    def make(n=600, seed=0):
+        rng = np.random.default_rng(seed)
+        walk = functools.partial(gbm_prices, n, rng, sigma=0.02, start='2018-01-01')
+        return walk(), walk(s0=90.0)
+    return make
+
+
+def test_sma_grid_matches_single(make_prices):
+    price, _ = make_prices()
+    params = sweep.param_grid([5, 10, 20], [30, 50])
+    grid = sma_crossover.generate_signals_grid(price, params)
+    for s, l in params:
+        expected = sma_crossover.generate_signals(price, s, l)
+        np.testing.assert_array_equal(grid[(s, l)].to_numpy(), expected.to_numpy())
+
+
+def test_rsi_grid_matches_single(make_prices):
+    price, _ = make_prices()
+    params = sweep.param_grid([20, 30], [70, 80], [7, 14])
+    grid = rsi_meanrev.generate_signals_grid(price, params)
+    for low, high, period in params:
+        expected = rsi_meanrev.generate_signals(price, low, high, period)
+        np.testing.assert_array_equal(grid[(low, high, period)].to_numpy(), expected.to_numpy())
+
+
+def test_pairs_grid_matches_single(make_prices):
+    a, b = make_prices()
+    params = sweep.param_grid([10, 20], [1.5, 2.0], [0.25, 0.5])
+    grid = market_mood.generate_pairs_signals_grid(a, b, params)
+    for window, entry_z, exit_z in params:
+        expected = market_mood.generate_pairs_signals(a, b, window, entry_z, exit_z)
+        np.testing.assert_array_equal(grid[(window, entry_z, exit_z)].to_numpy(), expected['pos_a'].to_numpy())
+
+
+def test_cache_is_shared_per_window(make_prices):
+    price, _ = make_prices()
+    cache = {}
+    sma_crossover.generate_signals_grid(price, sweep.param_grid([5, 10], [30, 50]), cache=cache)
+    assert sorted(cache) == [('sma', 5), ('sma', 10), ('sma', 30), ('sma', 50)]
+
+
+def test_run_signals_matrix_matches_run_signals(make_prices):
+    price, _ = make_prices()
+    positions = sma_crossover.generate_signals_grid(price, [(5, 30), (10, 50)])
+    bt = Backtester(price, cash=50000, commission=0.01)
+    equity = bt.run_signals_matrix(positions, pct_risk=0.2)
+    for col in positions:
+        expected = Backtester(price, cash=50000, commission=0.01).run_signals(positions[col], pct_risk=0.2)
+        np.testing.assert_array_equal(equity[col].to_numpy(), expected.to_numpy())
+
+
+def test_run_sweep_metrics_match_single_runs(make_prices):
+    price, _ = make_prices()
+    params = sweep.param_grid([5, 10, 20], [30, 50])
+    table = sweep.run_sweep(price, 'sma_crossover', params, commission=0.01, chunk_size=4)
+    assert list(table.index) == params
+    for s, l in params:
+        bt = Backtester(price, commission=0.01)
+        equity = bt.run_signals(sma_crossover.generate_signals(price, s, l))
+        expected = Backtester.performance_metrics(equity)
+        for k, v in expected.items():
+            assert table.loc[(s, l), k] == pytest.approx(v, rel=1e-9, nan_ok=True)
+        assert table.loc[(s, l), 'trades'] == (bt.history['side'] == Side.ENTER).sum()
+
+
+def test_run_pairs_sweep(make_prices):
+    a, b = make_prices()
+    params = sweep.param_grid([10, 20], [1.5, 2.0], [0.5])
+    table = sweep.run_pairs_sweep(a, b, params, chunk_size=3)
+    assert list(table.index) == params
+    assert np.isfinite(table['total_return']).all()
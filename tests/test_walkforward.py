@@ -0,0 +1,57 @@
+import functools
+import numpy as np
+import pandas as pd
+import pytest
+from backtester import Backtester
+from strategies import sma_crossover
+import sweep
+import walkforward
+
+
+@pytest.fixture
+def make_prices(gbm_prices):
+    def make(n=700, seed=3):
+        rng = np.random.default_rng(seed)
+        walk = functools.partial(gbm_prices, n, rng, sigma=0.02, start='2018-01-01')
+        return walk(), walk(s0=90.0)
+    return make
+
+
+def test_make_folds_rolling_and_anchored():
+    assert walkforward.make_folds(10, 4, 3) == [(0, 4, 4, 7), (3, 7, 7, 10)]
+    assert walkforward.make_folds(11, 4, 3, anchored=True) == [(0, 4, 4, 7), (0, 7, 7, 10), (0, 10, 10, 11)]
+    with pytest.raises(ValueError):
+        walkforward.make_folds(10, 1, 3)
+
+
+def test_fold_picks_best_training_params(make_prices):
+    price, _ = make_prices()
+    params = sweep.param_grid([5, 10, 20], [30, 50])
+    equity, folds = walkforward.walk_forward(price, 'sma_crossover', params, 300, 100, max_workers=1)
+
+    # indicators come from the full history, so the training window sees warmed-up signals
+    positions = sma_crossover.generate_signals_grid(price, params)
+    train = positions.iloc[:300]
+    scores = Backtester.performance_metrics_matrix(
+        Backtester(price.iloc[:300]).run_signals_matrix(train))['sharpe']
+    assert folds['params'][0] == scores.idxmax()
+    assert len(folds) == 4
+    assert equity.index.equals(price.index[300:])
+
+
+def test_stitched_equity_compounds_test_windows(make_prices):
+    price, _ = make_prices()
+    params = sweep.param_grid([5, 10], [30, 50])
+    equity, folds = walkforward.walk_forward(price, 'sma_crossover', params, 200, 150, anchored=True,
+                                             max_workers=1)
+    growth = np.prod(1 + folds['total_return'].to_numpy())
+    assert equity.iloc[-1] == pytest.approx(100000 * growth)
+
+
+def test_pool_matches_inline(make_prices):
+    a, b = make_prices()
+    params = sweep.param_grid([10, 20], [1.5, 2.0], [0.5])
+    inline, folds_inline = walkforward.walk_forward((a, b), 'market_mood', params, 250, 150, max_workers=1)
+    pooled, folds_pooled = walkforward.walk_forward((a, b), 'market_mood', params, 250, 150, max_workers=2)
+    pd.testing.assert_series_equal(inline, pooled)
+    pd.testing.assert_frame_equal(folds_inline, folds_pooled)
@@ -1,78 +1,76 @@
 # utils.py
 import os
 import pandas as pd
-import yfinance as yf
-import matplotlib.pyplot as plt
 import numpy as np
+import metrics
+import price_cache
+import profiling
+import report
 
-os.makedirs('outputs', exist_ok=True)
+OUTPUT_DIR = 'outputs'
 
-def download_data(symbol, start="2015-01-01", end="2025-01-01"):
-    df = yf.download(symbol, start=start, end=end, progress=False)
-    
-    # SIMPLIFIED: Always use the first level of MultiIndex and rename
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.get_level_values(0)
-    
-    # Standardize column names
-    column_mapping = {
-        "Adj Close": "close",
-        "Close": "close", 
-        "Open": "open",
-        "High": "high",
-        "Low": "low",
-        "Volume": "volume"
-    }
-    
-    df = df.rename(columns=column_mapping)
-    
-    # Ensure we have close price
-    if 'close' not in df.columns and len(df.columns) > 0:
-        df['close'] = df.iloc[:, 0]  # Use first column as close price
-    
-    return df
+
+def pyplot():
+    """matplotlib.pyplot, imported on first use so compute-only callers never load it."""
+    import matplotlib.pyplot as plt
+    return plt
+
+@profiling.stage('download_data')
+def download_data(symbol, start="2015-01-01", end="2025-01-01", interval="1d"):
+    """OHLCV bars for symbol, served from the local price cache (see price_cache.py)
+    and topped up from Yahoo Finance when the range isn't cached yet."""
+    return price_cache.default_cache().get(symbol, start, end, interval)
+
+@profiling.stage('download_many')
+def download_many(symbols, start="2015-01-01", end="2025-01-01", interval="1d",
+                  max_workers=price_cache.DEFAULT_FETCH_WORKERS, return_exceptions=False) -> dict:
+    """download_data for several symbols at once, fetched concurrently;
+    returns {symbol: bars}. Duplicate symbols are downloaded once. With
+    ``return_exceptions`` a symbol that fails maps to its exception."""
+    symbols = list(dict.fromkeys(symbols))
+    frames = price_cache.default_cache().get_many([(s, start, end, interval) for s in symbols], max_workers,
+                                                  return_exceptions)
+    return dict(zip(symbols, frames))
 
 def download_symbol(symbol, start="2015-01-01", end="2025-01-01"):
     return download_data(symbol, start, end)
 
-def save_plot(fig, name: str):
-    path = f'outputs/{name}'
-    fig.savefig(path, bbox_inches='tight', dpi=300)
-    plt.close(fig)
+@profiling.stage('save_plot')
+def save_plot(fig, name: str, dpi: int = report.DPI):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    path = os.path.join(OUTPUT_DIR, name)
+    fig.savefig(path, bbox_inches='tight', dpi=dpi)
+    # pyplot keeps its figures alive until closed; pooled report figures aren't registered with it
+    if getattr(fig.canvas, 'manager', None) is not None:
+        pyplot().close(fig)
+
+# figures reused by the synchronous plot helpers below (main thread only)
+_figures = report.FigurePool()
 
-def plot_equity(equity: pd.Series, title: str):
-    fig, ax = plt.subplots(figsize=(12, 6))
-    equity.plot(ax=ax, linewidth=2)
-    ax.set_title(f'Equity Curve: {title}', fontsize=14, fontweight='bold')
-    ax.set_ylabel('Equity ($)', fontsize=12)
-    ax.set_xlabel('Date', fontsize=12)
-    ax.grid(True, alpha=0.3)
-    save_plot(fig, f'equity_{title.replace(" ","_").lower()}.png')
+def plot_equity(equity: pd.Series, title: str, renderer: report.Renderer = None):
+    """Save outputs/equity_<title>.png (downsampled, see report.py). With a
+    ``renderer`` the chart is drawn in the background and its Future returned."""
+    path = os.path.join(OUTPUT_DIR, f'equity_{title.replace(" ","_").lower()}.png')
+    if renderer is not None:
+        return renderer.equity(equity, title, path)
+    report.render_png(report.draw_equity(_figures.get(report.EQUITY_SIZE), equity, title), path)
 
-def compare_results(res_dict: dict):
-    fig, ax = plt.subplots(figsize=(12, 7))
-    for k, v in res_dict.items():
-        normalized = v / v.iloc[0]  # Normalize to starting value
-        normalized.plot(ax=ax, label=k, linewidth=2)
-    
-    ax.legend(fontsize=12)
-    ax.set_title('Equity Curve Comparison (Normalized)', fontsize=14, fontweight='bold')
-    ax.set_ylabel('Normalized Equity', fontsize=12)
-    ax.set_xlabel('Date', fontsize=12)
-    ax.grid(True, alpha=0.3)
-    save_plot(fig, 'equity_comparison.png')
+def compare_results(res_dict: dict, renderer: report.Renderer = None):
+    """Save outputs/equity_comparison.png with every curve normalized to its start."""
+    path = os.path.join(OUTPUT_DIR, 'equity_comparison.png')
+    if renderer is not None:
+        return renderer.comparison(res_dict, path)
+    report.render_png(report.draw_comparison(_figures.get(report.COMPARISON_SIZE), res_dict), path)
 
 def calculate_performance_metrics(equity_curve):
-    """Calculate comprehensive performance metrics"""
-    returns = equity_curve.pct_change().fillna(0)
-    
-    metrics = {
-        'total_return': (equity_curve.iloc[-1] / equity_curve.iloc[0]) - 1,
-        'annual_return': (1 + (equity_curve.iloc[-1] / equity_curve.iloc[0]) - 1) ** (252/len(equity_curve)) - 1,
-        'annual_volatility': returns.std() * np.sqrt(252),
-        'sharpe_ratio': (returns.mean() * 252) / (returns.std() * np.sqrt(252)) if returns.std() > 0 else 0,
-        'max_drawdown': (equity_curve / equity_curve.cummax() - 1).min(),
-        'calmar_ratio': abs((returns.mean() * 252) / ((equity_curve / equity_curve.cummax() - 1).min())) if ((equity_curve / equity_curve.cummax() - 1).min()) < 0 else 0
+    """Calculate comprehensive performance metrics (same definitions as
+    Backtester.performance_metrics, see metrics.py)"""
+    m = metrics.compute_metrics(equity_curve)
+    return {
+        'total_return': m['total_return'],
+        'annual_return': m['ann_return'],
+        'annual_volatility': m['ann_vol'],
+        'sharpe_ratio': m['sharpe'],
+        'max_drawdown': m['max_drawdown'],
+        'calmar_ratio': m['calmar']
     }
-    
-    return metrics
\ No newline at end of file
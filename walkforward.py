@@ -0,0 +1,111 @@
+# walkforward.py
+"""Walk-forward optimization: pick the best parameters on each training
+window, trade them on the following test window, and stitch the test
+windows into one out-of-sample equity curve.
+
+Indicators are causal, so the positions for the whole parameter grid are
+built once over the full history (sharing one indicator cache) and every
+fold slices them; overlapping training windows never recompute anything.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import sweep
+from backtester import Backtester
+
+# worker-side copy of the grid, set by _init
+_state = {}
+
+
+def make_folds(n: int, train_size: int, test_size: int, anchored: bool = False):
+    """(train_start, train_end, test_start, test_end) bar ranges, end-exclusive.
+
+    Rolling folds keep ``train_size`` bars of history; anchored folds always
+    train from bar 0. Test windows are consecutive and never overlap.
+    """
+    if train_size < 2 or test_size < 1:
+        raise ValueError("train_size must be >= 2 and test_size >= 1")
+    folds = []
+    test_start = train_size
+    while test_start < n:
+        test_end = min(test_start + test_size, n)
+        train_start = 0 if anchored else test_start - train_size
+        folds.append((train_start, test_start, test_start, test_end))
+        test_start = test_end
+    return folds
+
+
+def _aligned(price, dates):
+    if isinstance(price, tuple):
+        return tuple(p.reindex(dates) for p in price)
+    return price.reindex(dates)
+
+
+def _init(strategy, price, positions, metric, cash, commission, pct_risk):
+    _state.update(strategy=strategy, price=price, positions=positions, metric=metric,
+                  cash=cash, commission=commission, pct_risk=pct_risk)
+
+
+def _run_fold(fold):
+    """Optimize on the training window, then trade the winner on the test window."""
+    s = _state
+    train_start, train_end, test_start, test_end = fold
+    dates = s['positions'].index
+    train = s['positions'].iloc[train_start:train_end]
+    equity = sweep.grid_equity(s['strategy'], _aligned(s['price'], dates[train_start:train_end]), train,
+                               s['cash'], s['commission'], s['pct_risk'])
+    scores = Backtester.performance_metrics_matrix(equity)[s['metric']].to_numpy()
+    best = int(np.nanargmax(scores)) if not np.isnan(scores).all() else 0
+
+    test = s['positions'].iloc[test_start:test_end, [best]]
+    oos = sweep.grid_equity(s['strategy'], _aligned(s['price'], dates[test_start:test_end]), test,
+                            s['cash'], s['commission'], s['pct_risk'])
+    return train.columns[best], scores[best], oos.iloc[:, 0]
+
+
+def walk_forward(price, strategy: str, params, train_size: int, test_size: int, anchored: bool = False,
+                 metric: str = 'sharpe', cash: float = 100000, commission: float = 0.0, pct_risk: float = 0.1,
+                 max_workers: int = None):
+    """Walk-forward optimize ``strategy`` over the parameter tuples in ``params``.
+
+    ``price`` is a close series, or a (price_a, price_b) pair for market_mood.
+    Each fold picks the parameters with the highest training ``metric`` (any
+    column of performance_metrics_matrix). Folds run over a process pool;
+    ``max_workers=1`` runs them inline.
+
+    Returns ``(equity, folds)``: the stitched out-of-sample equity curve, each
+    test window compounding on the previous one, and one row per fold with
+    its windows, chosen parameters, training score and test metrics.
+    """
+    params = [tuple(p) for p in params]
+    positions = sweep.grid_positions(strategy, price, params, cache={})
+    folds = make_folds(len(positions), train_size, test_size, anchored)
+    if not folds:
+        raise ValueError("not enough bars for a single train/test fold")
+
+    state = (strategy, price, positions, metric, cash, commission, pct_risk)
+    max_workers = max_workers or min(len(folds), os.cpu_count() or 1)
+    if max_workers == 1:
+        _init(*state)
+        results = [_run_fold(fold) for fold in folds]
+    else:
+        with ProcessPoolExecutor(max_workers, initializer=_init, initargs=state) as pool:
+            results = list(pool.map(_run_fold, folds))
+
+    dates = positions.index
+    segments = []
+    rows = []
+    scale = 1.0
+    for fold, (best, score, oos) in zip(folds, results):
+        segments.append(oos * scale)
+        scale = segments[-1].iloc[-1] / cash
+        rows.append({
+            'train_start': dates[fold[0]], 'train_end': dates[fold[1] - 1],
+            'test_start': dates[fold[2]], 'test_end': dates[fold[3] - 1],
+            'params': best, 'train_' + metric: score,
+            **Backtester.performance_metrics(oos),
+        })
+    return pd.concat(segments), pd.DataFrame(rows)